@@ -0,0 +1,163 @@
+"""Synthetic surveillance data shaped like ``tests/fixtures/fake_dataset.csv``.
+
+Rows have the fixture columns ``recording_ts, icd_code, sex, age, location``
+and are generated deterministically from a seed in chunks, so any size can be
+written without holding it in memory and every run of the benchmarks reads the
+same data.
+
+    uv run python -m benchmarks.generate 10M
+"""
+
+import argparse
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+DATA_DIR = Path(__file__).parent / "data"
+DEFINITIONS_DIR = Path(__file__).parent.parent / "tests" / "definitions" / "v1"
+CHUNK_ROWS = 1_000_000
+
+FIXTURE_CODES = ["A90", "E11", "F32", "I25", "J18", "J45", "K21", "M54", "N39", "R10"]
+LOCATIONS = [
+    "Berlin",
+    "Bochum",
+    "Bremen",
+    "Cologne",
+    "Dortmund",
+    "Dresden",
+    "Düsseldorf",
+    "Essen",
+    "Frankfurt",
+    "Hamburg",
+    "Hanover",
+    "Leipzig",
+    "Munich",
+    "Nuremberg",
+    "Stuttgart",
+]
+SEXES = ["F", "M", "D"]
+START = datetime(2023, 1, 1)
+END = datetime(2026, 1, 1)
+
+_ICD_CODE = re.compile(r"^[A-Z]\d{2,3}$")
+
+
+def parse_rows(value: str) -> int:
+    """Parse a row count such as ``100000``, ``100k``, ``10M`` or ``1B``."""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmMbB]?)", value.strip())
+    if match is None:
+        raise ValueError(f"Invalid row count: {value}")
+    number, suffix = match.groups()
+    scale = {"": 1, "k": 10**3, "m": 10**6, "b": 10**9}[suffix.lower()]
+    return int(float(number) * scale)
+
+
+def format_rows(rows: int) -> str:
+    for scale, suffix in ((10**9, "B"), (10**6, "M"), (10**3, "k")):
+        if rows >= scale and rows % scale == 0:
+            return f"{rows // scale}{suffix}"
+    return str(rows)
+
+
+def _definition_codes() -> list[str]:
+    """ICD/CID codes used by the test definitions, so filters match rows."""
+    codes = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            code = node.get("code")
+            if isinstance(code, dict):
+                value = str(code.get("code", "")).rstrip("%").upper()
+                if _ICD_CODE.match(value):
+                    codes.add(value)
+            for child in node.values():
+                walk(child)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child)
+
+    for path in DEFINITIONS_DIR.rglob("*.json"):
+        walk(json.loads(path.read_text()))
+    return sorted(codes)
+
+
+def code_vocabulary(seed: int = 0, size: int = 2_000) -> np.ndarray:
+    """Fixture and definition codes padded with random ICD-10-like codes.
+
+    About a third of the filler codes carry a subcategory (``K21.9``), so
+    wildcard and prefix criteria have something to match.
+    """
+    rng = np.random.default_rng(seed)
+    known = sorted(set(FIXTURE_CODES) | set(_definition_codes()))
+    letters = rng.choice(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"), size)
+    numbers = rng.integers(0, 100, size)
+    subcategories = rng.integers(0, 10, size)
+    with_subcategory = rng.random(size) < 0.33
+    filler = [
+        f"{letter}{number:02d}" + (f".{sub}" if dotted else "")
+        for letter, number, sub, dotted in zip(
+            letters, numbers, subcategories, with_subcategory
+        )
+    ]
+    vocabulary = list(dict.fromkeys(known + filler))[:size]
+    return np.array(vocabulary)
+
+
+def generate_chunk(rows: int, seed: int, vocabulary: np.ndarray) -> pl.DataFrame:
+    """Generate *rows* rows with a Zipf-like diagnosis code distribution."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    rng.shuffle(weights)
+    weights /= weights.sum()
+    span = int((END - START).total_seconds())
+    return pl.DataFrame(
+        {
+            "recording_ts": np.datetime64(START, "us")
+            + rng.integers(0, span, rows).astype("timedelta64[s]"),
+            "icd_code": rng.choice(vocabulary, rows, p=weights),
+            "sex": rng.choice(SEXES, rows),
+            "age": rng.integers(0, 101, rows),
+            "location": rng.choice(LOCATIONS, rows),
+        }
+    )
+
+
+def generate(rows: int, *, seed: int = 0, data_dir: Path = DATA_DIR) -> Path:
+    """Write *rows* synthetic rows as Parquet parts and return their directory.
+
+    Parts of at most one million rows are written to
+    ``<data_dir>/rows=<rows>/seed=<seed>/``. A complete dataset is reused on
+    later calls; a ``_SUCCESS`` marker distinguishes it from an interrupted one.
+    """
+    directory = data_dir / f"rows={format_rows(rows)}" / f"seed={seed}"
+    if (directory / "_SUCCESS").exists():
+        return directory
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.glob("part-*.parquet"):
+        stale.unlink()
+    vocabulary = code_vocabulary(seed)
+    for index, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        chunk = generate_chunk(
+            min(CHUNK_ROWS, rows - start), seed * 1_000_003 + index, vocabulary
+        )
+        chunk.write_parquet(directory / f"part-{index:05d}.parquet")
+    (directory / "_SUCCESS").touch()
+    return directory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", nargs="+", type=parse_rows, help="e.g. 1M 10M 100M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(generate(rows, seed=args.seed, data_dir=args.data_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Benchmark the filter engine on synthetic surveillance data.
+
+Times ``load_profile``, compilation, ``filter`` and ``label`` with every
+definition in ``tests/definitions/v1`` against datasets made by
+:mod:`benchmarks.generate`, and reports throughput and peak memory. Results
+are saved as JSON named after the commit, so two runs can be compared:
+
+    uv run python -m benchmarks.run --rows 1M 10M
+    uv run python -m benchmarks.run --rows 1M --compare benchmarks/results/<old>.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import polars as pl
+import yaml
+
+from benchmarks.generate import (
+    DATA_DIR,
+    DEFINITIONS_DIR,
+    format_rows,
+    generate,
+    parse_rows,
+)
+from opensyndrome.filter import OSDEngine, collect, load_profile
+
+ROOT = Path(__file__).parent.parent
+MAPPING_FILE = ROOT / "tests" / "fixtures" / "mapping.yaml"
+PROFILE = "fake_dataset"
+RESULTS_DIR = Path(__file__).parent / "results"
+STAGES = ("load_profile", "compile", "filter", "filter_short_circuit", "label")
+# load_profile is too fast to time once
+LOAD_PROFILE_CALLS = 1_000
+
+
+def load_definitions() -> dict[str, dict]:
+    return {
+        path.stem: json.loads(path.read_text())
+        for path in sorted(DEFINITIONS_DIR.rglob("*.json"))
+    }
+
+
+def _engine(**kwargs) -> OSDEngine:
+    profile = load_profile(yaml.safe_load(MAPPING_FILE.read_text()), PROFILE)
+    return OSDEngine(profile, skip_unresolvable=True, **kwargs)
+
+
+def _reset_peak_rss() -> None:
+    """Reset the peak resident memory of this process to its current size.
+
+    Only possible on Linux. Elsewhere the peak reported by ``getrusage`` also
+    covers whatever the process did before the stage started.
+    """
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    try:
+        status = Path("/proc/self/status").read_text()
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+    # unlike ru_maxrss, VmHWM is not inherited from the parent process
+    line = next(line for line in status.splitlines() if line.startswith("VmHWM:"))
+    return int(line.split()[1]) / 1024
+
+
+def _time_load_profile(dataset: Path, rows: int) -> tuple[int, str]:
+    mapping = MAPPING_FILE.read_text()
+    for _ in range(LOAD_PROFILE_CALLS):
+        load_profile(yaml.safe_load(mapping), PROFILE)
+    return LOAD_PROFILE_CALLS, "calls"
+
+
+def _time_compile(dataset: Path, rows: int) -> tuple[int, str]:
+    definitions = load_definitions()
+    schema = dict(pl.scan_parquet(dataset).collect_schema())
+    engine = _engine()
+    for osd_definition in definitions.values():
+        engine.compile(osd_definition, schema)
+    return len(definitions), "definitions"
+
+
+def _time_filter(
+    dataset: Path, rows: int, short_circuit: bool = False
+) -> tuple[int, str]:
+    definitions = load_definitions()
+    engine = _engine(short_circuit=short_circuit)
+    frame = pl.scan_parquet(dataset)
+    for osd_definition in definitions.values():
+        collect(engine.filter(frame, osd_definition).select(pl.len()))
+    return rows * len(definitions), "rows"
+
+
+def _time_label(dataset: Path, rows: int) -> tuple[int, str]:
+    definitions = load_definitions()
+    engine = _engine()
+    labelled = engine.label(pl.scan_parquet(dataset), definitions, fuse=True)
+    collect(labelled.select(pl.col(list(definitions)).sum()))
+    return rows, "rows"
+
+
+_STAGE_FUNCTIONS = {
+    "load_profile": _time_load_profile,
+    "compile": _time_compile,
+    "filter": _time_filter,
+    "filter_short_circuit": lambda dataset, rows: _time_filter(
+        dataset, rows, short_circuit=True
+    ),
+    "label": _time_label,
+}
+
+
+def run_stage(stage: str, dataset: str, rows: int, repeat: int) -> dict:
+    """Run one stage *repeat* times in the current process, keeping the best time.
+
+    Meant to be called in a fresh worker process, so the peak resident memory
+    it reports belongs to this stage only, plus the interpreter and imports
+    (reported as ``baseline_rss_mb``).
+    """
+    _reset_peak_rss()
+    baseline = _peak_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items, unit = _STAGE_FUNCTIONS[stage](Path(dataset), rows)
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    return {
+        "rows": rows,
+        "stage": stage,
+        "seconds": seconds,
+        "items": items,
+        "unit": unit,
+        "throughput": items / seconds,
+        "peak_rss_mb": _peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+    }
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(seed: int, repeat: int) -> dict:
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(status),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": pl.thread_pool_size(),
+        "seed": seed,
+        "repeat": repeat,
+        "definitions": len(load_definitions()),
+    }
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[dict]:
+    """Add ``ratio`` (time relative to *baseline*) and ``regression`` to results.
+
+    Only results measured on the same number of rows are compared; a stage is
+    a regression when it is more than *threshold* (e.g. ``0.1`` for 10%)
+    slower than in the baseline.
+    """
+    previous = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    for result in results:
+        old = previous.get((result["rows"], result["stage"]))
+        if old is None:
+            continue
+        result["ratio"] = result["seconds"] / old["seconds"]
+        result["regression"] = result["ratio"] > 1 + threshold
+    return results
+
+
+def format_table(results: list[dict]) -> str:
+    header = (
+        f"{'rows':>6}  {'stage':<20} {'seconds':>9} {'throughput':>22} {'peak MB':>8}"
+    )
+    if any("ratio" in r for r in results):
+        header += f"  {'vs baseline':>11}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        throughput = f"{r['throughput']:,.0f} {r['unit']}/s"
+        line = (
+            f"{format_rows(r['rows']):>6}  {r['stage']:<20} {r['seconds']:>9.3f} "
+            f"{throughput:>22} {r['peak_rss_mb']:>8.0f}"
+        )
+        if "ratio" in r:
+            line += f"  {r['ratio']:>10.2f}x"
+            if r["regression"]:
+                line += "  REGRESSION"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        nargs="+",
+        type=parse_rows,
+        default=[parse_rows("1M")],
+        help="Dataset sizes, e.g. 1M 10M 100M (default: 1M).",
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="Keep the best of N.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument(
+        "--output", type=Path, help="Results file (default: results/<commit>.json)."
+    )
+    parser.add_argument("--compare", type=Path, help="Results file to compare with.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown reported as a regression (default: 0.1 = 10%%).",
+    )
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    results = []
+    context = get_context("spawn")
+    for rows in args.rows:
+        print(f"Generating {format_rows(rows)} rows...", file=sys.stderr)
+        dataset = generate(rows, seed=args.seed, data_dir=args.data_dir)
+        for stage in args.stages:
+            print(f"Running {stage} on {format_rows(rows)} rows...", file=sys.stderr)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                future = executor.submit(
+                    run_stage, stage, str(dataset), rows, args.repeat
+                )
+                results.append(future.result())
+
+    report = {"metadata": metadata(args.seed, args.repeat), "results": results}
+    if baseline is not None:
+        compare(results, baseline, args.threshold)
+        report["baseline"] = baseline["metadata"]
+    output = args.output or RESULTS_DIR / f"{report['metadata']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    print(format_table(results))
+    print(f"\nResults written to {output}")
+    if baseline is not None:
+        print(f"Compared with {baseline['metadata']['commit']} ({args.compare})")
+        return 1 if any(r.get("regression") for r in results) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Benchmark the startup time of the CLI.
+
+Imports ``opensyndrome.cli`` in fresh interpreters with ``python -X importtime``
+and reports the best import time, the slowest imports and the wall time of
+``opensyndrome --help``. Importing the CLI must not load the heavy
+dependencies only some commands need (polars, ollama, pydantic...): the
+command exits with 1 when one is loaded, when the import takes longer than
+``--max-ms`` or, with ``--compare``, when it is slower than a previous run:
+
+    uv run python -m benchmarks.startup
+    uv run python -m benchmarks.startup --compare benchmarks/results/startup-<old>.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.run import RESULTS_DIR, ROOT, _git
+
+MODULE = "opensyndrome.cli"
+# loaded by the commands using them, never when the CLI starts
+HEAVY_MODULES = (
+    "polars",
+    "ollama",
+    "pydantic",
+    "jsonschema",
+    "pygments",
+    "requests",
+    "yaml",
+    "opensyndrome.filter",
+    "opensyndrome.converters",
+)
+_CHECK = (
+    "import json, sys; import {module}; "
+    "print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+)
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """Imports reported by ``-X importtime``, with their self and cumulative µs."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    return imports
+
+
+def time_import(module: str) -> list[dict]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def time_help() -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", f"from {MODULE} import main; main()", "--help"],
+        cwd=ROOT,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def heavy_imports(module: str) -> list[str]:
+    """Heavy modules loaded by importing *module*."""
+    result = subprocess.run(
+        [sys.executable, "-c", _CHECK.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def run(repeat: int, top: int) -> dict:
+    runs = [time_import(MODULE) for _ in range(repeat)]
+
+    def total(imports):
+        return next(i["cumulative_us"] for i in imports if i["module"] == MODULE)
+
+    best = min(runs, key=total)
+    # children are reported before their parent, after the previous top-level import
+    end = next(n for n, i in enumerate(best) if i["module"] == MODULE)
+    start = max((n for n in range(end) if best[n]["depth"] == 0), default=-1) + 1
+    top_level = [i for i in best[start:end] if i["depth"] == 1]
+    return {
+        "module": MODULE,
+        "import_ms": total(best) / 1000,
+        "help_seconds": min(time_help() for _ in range(repeat)),
+        "slowest": [
+            {"module": i["module"], "cumulative_ms": i["cumulative_us"] / 1000}
+            for i in sorted(top_level, key=lambda i: -i["cumulative_us"])[:top]
+        ],
+        "heavy_imports": heavy_imports(MODULE),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Keep the best of N.")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports shown.")
+    parser.add_argument(
+        "--max-ms", type=float, help="Fail when the import takes longer than this."
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Results file (default: results/startup-<commit>.json).",
+    )
+    parser.add_argument("--compare", type=Path, help="Results file to compare with.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown reported as a regression (default: 0.2 = 20%%).",
+    )
+    args = parser.parse_args()
+
+    result = run(args.repeat, args.top)
+    result["commit"] = _git("rev-parse", "--short", "HEAD")
+    failures = []
+    if result["heavy_imports"]:
+        failures.append(f"heavy modules imported: {', '.join(result['heavy_imports'])}")
+    if args.max_ms is not None and result["import_ms"] > args.max_ms:
+        failures.append(f"import took more than {args.max_ms:.0f} ms")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        result["ratio"] = result["import_ms"] / baseline["import_ms"]
+        if result["ratio"] > 1 + args.threshold:
+            failures.append(
+                f"import {result['ratio']:.2f}x slower than {baseline['commit']}"
+            )
+    output = args.output or RESULTS_DIR / f"startup-{result['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+
+    print(f"import {MODULE}: {result['import_ms']:.1f} ms")
+    print(f"opensyndrome --help: {result['help_seconds'] * 1000:.0f} ms")
+    print("\nslowest imports:")
+    for slow in result["slowest"]:
+        print(f"  {slow['cumulative_ms']:>8.1f} ms  {slow['module']}")
+    print(f"\nResults written to {output}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Benchmark the validation backends on the bundled definitions.
+
+Validates every definition in ``tests/definitions/v1`` with
+``validate_many`` and each backend (``jsonschema`` and ``pydantic``), reading
+the files each time as ``opensyndrome validate`` does, and reports the best
+throughput of ``--repeat`` runs and the speedup over ``jsonschema``:
+
+    uv run python -m benchmarks.validation
+    uv run python -m benchmarks.validation --copies 100 --schema-file schema.json
+
+The JSON Schema defaults to the downloaded one. When it has not been
+downloaded, the schema generated from the Pydantic models is used instead.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.generate import DEFINITIONS_DIR
+from benchmarks.run import RESULTS_DIR, _git
+from opensyndrome.artifacts import SCHEMA_DIR
+from opensyndrome.validators import BACKENDS, validate_many
+
+
+def definition_files() -> list[Path]:
+    return [
+        path
+        for path in sorted(DEFINITIONS_DIR.rglob("*.json"))
+        if path.read_bytes().strip()
+    ]
+
+
+def time_backend(backend: str, files: list[Path], schema_file: Path, repeat: int):
+    # the first run compiles the schema or models, which is not timed
+    invalid = sum(not r.valid for r in validate_many(files, schema_file, backend))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in validate_many(files, schema_file, backend):
+            pass
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    return {
+        "backend": backend,
+        "definitions": len(files),
+        "invalid": invalid,
+        "seconds": seconds,
+        "throughput": len(files) / seconds,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Keep the best of N.")
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=50,
+        help="Times each definition is validated per run (default: 50).",
+    )
+    parser.add_argument("--schema-file", type=Path, help="JSON Schema for jsonschema.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Results file (default: results/validation-<commit>.json).",
+    )
+    args = parser.parse_args()
+
+    files = definition_files() * args.copies
+    with tempfile.TemporaryDirectory() as tmp:
+        schema_file = args.schema_file or SCHEMA_DIR
+        if not schema_file.exists():
+            from opensyndrome.schema import OpenSyndromeCaseDefinitionSchema
+
+            print("Using the schema generated from the models.", file=sys.stderr)
+            schema_file = Path(tmp) / "schema.json"
+            schema = OpenSyndromeCaseDefinitionSchema.model_json_schema()
+            schema_file.write_text(json.dumps(schema))
+        results = [
+            time_backend(backend, files, schema_file, args.repeat)
+            for backend in BACKENDS
+        ]
+
+    baseline = results[0]["seconds"]
+    report = {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "schema_file": str(args.schema_file or SCHEMA_DIR),
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"validation-{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    header = f"{'backend':<12} {'seconds':>9} {'definitions/s':>15} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['backend']:<12} {result['seconds']:>9.3f} "
+            f"{result['throughput']:>15,.0f} {baseline / result['seconds']:>7.1f}x"
+        )
+    print(f"\n{len(files)} definitions per run, results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,52 +1,493 @@
+from __future__ import annotations
+import hashlib
+import io
 import json
-from pathlib import Path
-import requests
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Callable, Iterator
 
+if TYPE_CHECKING:
+    import requests
 
-OPEN_SYNDROME_VERSION = "v1"
-OPEN_SYNDROME_DIR = Path.home() / ".open_syndrome" / OPEN_SYNDROME_VERSION
-OPEN_SYNDROME_DIR.mkdir(parents=True, exist_ok=True)
+
+# both can be set to use another version, or a shared cache (e.g. on batch nodes)
+OPEN_SYNDROME_HOME = Path(
+    os.environ.get("OPEN_SYNDROME_HOME") or Path.home() / ".open_syndrome"
+)
+OPEN_SYNDROME_VERSION = os.environ.get("OPEN_SYNDROME_VERSION") or "v1"
+# folders are created when something is downloaded to them, not on import
+OPEN_SYNDROME_DIR = OPEN_SYNDROME_HOME / OPEN_SYNDROME_VERSION
 SCHEMA_DIR = OPEN_SYNDROME_DIR / "schema.json"
 DEFINITIONS_DIR = OPEN_SYNDROME_DIR / "definitions"
-DEFINITIONS_DIR.mkdir(parents=True, exist_ok=True)
 
+GITHUB_API_URL = "https://api.github.com"
+DEFINITIONS_REPO = "OpenSyndrome/definitions"
+DEFINITIONS_REF = "main"
+SCHEMA_URL = "https://raw.githubusercontent.com/OpenSyndrome/schema/{ref}/schemas/{version}/schema.json"
+SCHEMA_REF = "main"
+# files fetched at the same time from the contents API
+DOWNLOAD_WORKERS = 8
+REQUEST_TIMEOUT = 30
+
+
+@dataclass
+class DownloadManifest:
+    """What the last :func:`download_definitions` run fetched, persisted as JSON.
+
+    Attributes
+    ----------
+    tarball_etag:
+        ETag of the repository tarball, sent back to only get it if it changed.
+    listings:
+        Contents API URL → ``{"etag": ..., "items": [...]}`` of each directory
+        listing, reused when the API answers ``304 Not Modified``.
+    files:
+        Path relative to the folder of the artifact → git blob SHA of every
+        file downloaded, checked by :func:`is_complete` and used to remove
+        files deleted upstream.
+    ref:
+        Git reference (branch, tag or commit) downloaded, reused by later
+        downloads unless another one is asked for.
+    complete:
+        ``False`` while a download is in progress, so an interrupted one is
+        not taken for a complete artifact.
+    """
+
+    tarball_etag: str | None = None
+    listings: dict[str, dict] = field(default_factory=dict)
+    files: dict[str, str] = field(default_factory=dict)
+    ref: str | None = None
+    complete: bool = True
+
+    @classmethod
+    def load(cls, path: Path) -> DownloadManifest:
+        """Read a manifest; a missing or unreadable one is an incomplete download."""
+        try:
+            return cls(**json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return cls(complete=False)
+
+    def save(self, path: Path) -> None:
+        """Write the manifest to *path*, replacing it atomically."""
+        write_atomic(path, json.dumps(asdict(self), indent=2).encode())
+
+
+@dataclass(frozen=True)
+class DownloadResult:
+    """Outcome of :func:`download_definitions`.
+
+    Attributes
+    ----------
+    source:
+        ``tarball`` or ``contents`` (the GitHub contents API, file by file).
+    downloaded:
+        Files written because they were missing or differed from upstream.
+    unchanged:
+        Files already up to date, which were not fetched or not rewritten.
+    removed:
+        Previously downloaded files deleted because they were removed upstream.
+    """
+
+    source: str
+    downloaded: int
+    unchanged: int
+    removed: int
+
+
+def artifact_dir(version: str | None = None) -> Path:
+    """Folder of the schema and definitions of *version*, by default the current one."""
+    return OPEN_SYNDROME_HOME / version if version else OPEN_SYNDROME_DIR
+
+
+def _definitions_dir(version: str | None) -> Path:
+    return artifact_dir(version) / "definitions" if version else DEFINITIONS_DIR
+
+
+def _schema_path(version: str | None) -> Path:
+    return artifact_dir(version) / "schema.json" if version else SCHEMA_DIR
+
+
+def manifest_path(artifact: Path) -> Path:
+    """Manifest of *artifact*, kept next to it so it is not taken for a definition."""
+    return artifact.with_name(f"{artifact.stem}.manifest.json")
+
+
+# is_complete results by artifact: the stat of its manifest, the recorded files
+# with their stats, and the result, computed again when any stat changes
+_COMPLETE: dict[Path, tuple[tuple | None, list[Path], list[tuple | None], bool]] = {}
+_COMPLETE_LOCK = threading.Lock()
+
+
+def _stat_key(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def is_complete(artifact: Path) -> bool:
+    """Whether the downloaded *artifact* (schema file or definitions folder) is intact.
+
+    An artifact with a manifest is complete when its download finished and
+    every file it recorded is present with the recorded hash. One without a
+    manifest, copied or checked out by hand, is trusted when it is not empty.
+    Nothing is written, so a read-only cache can be checked.
+
+    The result is kept until the manifest or a recorded file changes (its
+    modification time or size), so checking an unchanged artifact again only
+    costs a stat per file.
+    """
+    manifest_stat = _stat_key(manifest_path(artifact))
+    if manifest_stat is None:
+        return artifact.is_file() or (artifact.is_dir() and any(artifact.iterdir()))
+    with _COMPLETE_LOCK:
+        cached = _COMPLETE.get(artifact)
+    if cached is not None and cached[0] == manifest_stat:
+        _, paths, stats, complete = cached
+        if [_stat_key(path) for path in paths] == stats:
+            return complete
+
+    manifest = DownloadManifest.load(manifest_path(artifact))
+    root = artifact if artifact.is_dir() else artifact.parent
+    paths = [root / relative for relative in manifest.files]
+    # taken before hashing, so a file changed meanwhile is checked again
+    stats = [_stat_key(path) for path in paths]
+    complete = manifest.complete and all(
+        _local_sha(path) == sha for path, sha in zip(paths, manifest.files.values())
+    )
+    with _COMPLETE_LOCK:
+        _COMPLETE[artifact] = (manifest_stat, paths, stats, complete)
+    return complete
+
+
+def _pinned(artifact: Path, ref: str | None) -> bool:
+    """Whether *artifact* was downloaded from *ref* (any reference when ``None``)."""
+    return ref is None or DownloadManifest.load(manifest_path(artifact)).ref == ref
+
+
+def _blob_sha(content: bytes) -> str:
+    """Git blob SHA-1 of *content*, as reported by the GitHub contents API."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def _local_sha(path: Path) -> str | None:
+    try:
+        return _blob_sha(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def _relative_path(path: str, folder: str) -> str | None:
+    """Path of a repository file relative to *folder*, if inside it."""
+    try:
+        relative = PurePosixPath(path).relative_to(folder)
+    except ValueError:
+        return None
+    if not relative.parts or ".." in relative.parts:
+        return None
+    return relative.as_posix()
+
+
+@contextmanager
+def atomic_path(path: Path, tmp_dir: Path | None = None) -> Iterator[Path]:
+    """Temporary path to write, renamed to *path* when the block completes.
 
-def download_schema():
-    schema_response = requests.get(
-        "https://raw.githubusercontent.com/OpenSyndrome/schema/refs/heads/main/schemas/"
-        f"{OPEN_SYNDROME_VERSION}/schema.json"
+    The temporary file is hidden, unique to the process and thread, so
+    concurrent writers never write to the same one, and kept in *tmp_dir*
+    (on the same file system) or next to *path*. It is removed when the
+    block raises.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = (tmp_dir or path.parent) / (
+        f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
     )
-    SCHEMA_DIR.write_text(json.dumps(schema_response.json()))
-    return SCHEMA_DIR
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
 
 
-def download_definitions(url=None, current_path=None):
-    """Download definitions from GitHub repos."""
-    if url is None:
-        url = "https://api.github.com/repos/OpenSyndrome/definitions/contents/definitions/v1?ref=main"
-    response = requests.get(url)
+def write_atomic(path: Path, content: bytes) -> None:
+    """Write *content* to *path* through :func:`atomic_path`."""
+    with atomic_path(path) as tmp:
+        tmp.write_bytes(content)
+
+
+def _session(workers: int) -> requests.Session:
+    """Session reusing up to *workers* connections per host, retrying server errors."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(
+        pool_connections=workers, pool_maxsize=workers, max_retries=retries
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _sync(
+    destination: Path,
+    remote: dict[str, str],
+    fetch: Callable[[str], bytes],
+    manifest: DownloadManifest,
+    workers: int,
+) -> tuple[int, int, int]:
+    """Make *destination* match the *remote* files (relative path → blob SHA).
+
+    Only files missing locally or whose content differs are fetched, with up to
+    *workers* concurrent calls to *fetch*. Files of a previous download that
+    are gone upstream are deleted. Returns the downloaded, unchanged and
+    removed counts.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    stale = [
+        relative
+        for relative, sha in remote.items()
+        if _local_sha(destination / relative) != sha
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for relative, content in zip(stale, executor.map(fetch, stale)):
+            write_atomic(destination / relative, content)
+    removed = [relative for relative in manifest.files if relative not in remote]
+    for relative in removed:
+        (destination / relative).unlink(missing_ok=True)
+    manifest.files = dict(remote)
+    return len(stale), len(remote) - len(stale), len(removed)
+
+
+def _download_tarball(
+    session: requests.Session,
+    api_url: str,
+    destination: Path,
+    manifest: DownloadManifest,
+    folder: str,
+) -> DownloadResult:
+    import tarfile
+
+    headers = {}
+    up_to_date = all(
+        _local_sha(destination / relative) == sha
+        for relative, sha in manifest.files.items()
+    )
+    if manifest.tarball_etag and manifest.files and up_to_date:
+        headers["If-None-Match"] = manifest.tarball_etag
+    response = session.get(
+        f"{api_url}/repos/{DEFINITIONS_REPO}/tarball/{manifest.ref}",
+        headers=headers,
+        timeout=REQUEST_TIMEOUT,
+    )
+    if response.status_code == 304:
+        return DownloadResult("tarball", 0, len(manifest.files), 0)
+    response.raise_for_status()
+
+    contents = {}
+    with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:gz") as archive:
+        for member in archive:
+            # members are stored under a "<owner>-<repo>-<commit>/" folder
+            parts = PurePosixPath(member.name).parts[1:]
+            relative = _relative_path("/".join(parts), folder) if parts else None
+            if member.isfile() and relative is not None:
+                contents[relative] = archive.extractfile(member).read()
+
+    remote = {relative: _blob_sha(content) for relative, content in contents.items()}
+    counts = _sync(destination, remote, contents.__getitem__, manifest, workers=1)
+    manifest.tarball_etag = response.headers.get("ETag")
+    return DownloadResult("tarball", *counts)
+
+
+def _list_directory(
+    session: requests.Session, url: str, manifest: DownloadManifest
+) -> list[dict]:
+    """Items of a contents API directory listing, revalidated with its ETag."""
+    cached = manifest.listings.get(url)
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
+    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304:
+        return cached["items"]
     response.raise_for_status()
+    items = [
+        {key: item.get(key) for key in ("type", "path", "url", "download_url", "sha")}
+        for item in response.json()
+    ]
+    if response.headers.get("ETag"):
+        manifest.listings[url] = {"etag": response.headers["ETag"], "items": items}
+    return items
+
+
+def _download_contents(
+    session: requests.Session,
+    api_url: str,
+    destination: Path,
+    manifest: DownloadManifest,
+    folder: str,
+    workers: int,
+) -> DownloadResult:
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = [
+        f"{api_url}/repos/{DEFINITIONS_REPO}/contents/{folder}?ref={manifest.ref}"
+    ]
+    listed = set()
+    files = {}
+    # directories of the same depth are listed concurrently
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending:
+            listed.update(pending)
+            levels = executor.map(
+                lambda url: _list_directory(session, url, manifest), pending
+            )
+            pending = []
+            for items in levels:
+                for item in items:
+                    if item["type"] == "dir":
+                        pending.append(item["url"])
+                    elif item["type"] == "file":
+                        relative = _relative_path(item["path"], folder)
+                        if relative is not None:
+                            files[relative] = item
+    # forget listings of directories removed upstream
+    manifest.listings = {
+        url: listing for url, listing in manifest.listings.items() if url in listed
+    }
+
+    def fetch(relative: str) -> bytes:
+        response = session.get(files[relative]["download_url"], timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+    remote = {relative: item["sha"] for relative, item in files.items()}
+    return DownloadResult(
+        "contents", *_sync(destination, remote, fetch, manifest, workers)
+    )
+
+
+def download_definitions(
+    destination: Path | None = None,
+    *,
+    version: str | None = None,
+    ref: str | None = None,
+    api_url: str = GITHUB_API_URL,
+    workers: int = DOWNLOAD_WORKERS,
+    tarball: bool = True,
+) -> DownloadResult:
+    """Download the definitions from GitHub, fetching only what changed.
+
+    The whole repository is first fetched as a single tarball, revalidated
+    with the ETag of the previous download so nothing is transferred when
+    the repository did not change. When the tarball cannot be fetched or
+    read, the GitHub contents API is walked instead: directory listings are
+    revalidated with their ETags and only files whose git blob SHA differs
+    from the local copy are downloaded, by *workers* concurrent requests over
+    a pooled session.
+
+    Files are written atomically. ETags, the reference and the hash of every
+    file are recorded in a manifest next to *destination* (see
+    :func:`manifest_path`), marked complete only once the download finished.
+
+    Parameters
+    ----------
+    destination:
+        Folder to download the definitions to. Defaults to the ``definitions``
+        folder of *version*.
+    version:
+        Version of the definitions (e.g. ``v1``). Defaults to
+        ``OPEN_SYNDROME_VERSION``.
+    ref:
+        Branch, tag or commit of the definitions repository to download.
+        Defaults to the one of the previous download, or ``DEFINITIONS_REF``.
+    api_url:
+        Base URL of the GitHub API.
+    workers:
+        Maximum number of concurrent requests.
+    tarball:
+        Try the tarball before the contents API.
+
+    Returns
+    -------
+    DownloadResult
+    """
+    import tarfile
+
+    import requests
+
+    destination = Path(destination or _definitions_dir(version))
+    folder = f"definitions/{version or OPEN_SYNDROME_VERSION}"
+    destination.mkdir(parents=True, exist_ok=True)
+    manifest = DownloadManifest.load(manifest_path(destination))
+    manifest.ref = ref or manifest.ref or DEFINITIONS_REF
+    manifest.complete = False
+    manifest.save(manifest_path(destination))
+    with _session(workers) as session:
+        result = None
+        if tarball:
+            try:
+                result = _download_tarball(
+                    session, api_url, destination, manifest, folder
+                )
+            except (requests.RequestException, tarfile.TarError):
+                result = None
+        if result is None:
+            result = _download_contents(
+                session, api_url, destination, manifest, folder, workers
+            )
+    manifest.complete = True
+    manifest.save(manifest_path(destination))
+    return result
+
+
+def download_schema(version: str | None = None, ref: str | None = None) -> Path:
+    """Download the JSON Schema of *version* from the *ref* of the schema repository.
+
+    The schema is checked to be JSON and written atomically; its hash and
+    reference are recorded in its manifest (see :func:`manifest_path`).
+    """
+    import requests
+
+    path = _schema_path(version)
+    manifest = DownloadManifest.load(manifest_path(path))
+    ref = ref or manifest.ref or SCHEMA_REF
+    response = requests.get(
+        SCHEMA_URL.format(ref=ref, version=version or OPEN_SYNDROME_VERSION),
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    content = json.dumps(response.json()).encode()
+    write_atomic(path, content)
+    DownloadManifest(files={path.name: _blob_sha(content)}, ref=ref).save(
+        manifest_path(path)
+    )
+    return path
 
-    for item in response.json():
-        if item["type"] == "file":
-            response_file = requests.get(item["download_url"])
-            definition_filepath = current_path / item["name"]
-            definition_filepath.write_bytes(response_file.content)
 
-        elif item["type"] == "dir":
-            print(item["path"])
-            local_dir = DEFINITIONS_DIR / Path(item["path"]).parts[-1]
-            local_dir.mkdir(parents=True, exist_ok=True)
-            download_definitions(item["url"], local_dir)
+def get_definition_dir(force=False, version=None, ref=None):
+    """Folder of the definitions of *version*, downloaded unless complete.
 
+    They are downloaded again when *force* is set, when the folder is empty
+    or its download was interrupted or corrupted (see :func:`is_complete`),
+    or when they were not downloaded from the pinned *ref*.
+    """
+    directory = _definitions_dir(version)
+    if force or not is_complete(directory) or not _pinned(directory, ref):
+        download_definitions(directory, version=version, ref=ref)
+    return directory
 
-def get_definition_dir(force=False):
-    if force or not any(DEFINITIONS_DIR.iterdir()):
-        download_definitions()
-    return DEFINITIONS_DIR
 
+def get_schema_filepath(force=False, version=None, ref=None):
+    """Path of the JSON Schema of *version*, downloaded unless complete.
 
-def get_schema_filepath(force=False):
-    if force or not SCHEMA_DIR.exists():
-        download_schema()
-    return SCHEMA_DIR
+    See :func:`get_definition_dir` for when it is downloaded again.
+    """
+    path = _schema_path(version)
+    if force or not is_complete(path) or not _pinned(path, ref):
+        download_schema(version, ref)
+    return path
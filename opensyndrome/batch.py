@@ -0,0 +1,281 @@
+from __future__ import annotations
+import csv
+import glob
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+from urllib.parse import unquote
+
+import polars as pl
+
+from opensyndrome.filter import OSDEngine, collect
+
+
+_SCANNERS: dict[str, Callable[[Path], pl.LazyFrame]] = {
+    ".parquet": pl.scan_parquet,
+    ".csv": pl.scan_csv,
+    ".ndjson": pl.scan_ndjson,
+    ".jsonl": pl.scan_ndjson,
+}
+
+
+@dataclass(frozen=True)
+class PartitionResult:
+    """Outcome of filtering a single partition file.
+
+    Attributes
+    ----------
+    path:
+        Partition file that was read.
+    rows:
+        Number of rows matching the definition.
+    seconds:
+        Wall-clock time spent on the partition.
+    output:
+        File the matching rows were written to, or ``None`` when only counting.
+    """
+
+    path: Path
+    rows: int
+    seconds: float
+    output: Path | None = None
+
+
+def hive_columns(path: str | Path, root: str | Path) -> dict[str, object]:
+    """Hive partition keys of *path*: its ``key=value`` folders below *root*.
+
+    Values are typed as Polars' hive partitioning does: integers, floats,
+    dates and datetimes are parsed, anything else is kept as a string.
+    """
+    try:
+        folders = Path(path).parent.relative_to(root).parts
+    except ValueError:
+        return {}
+    keys = dict(unquote(part).split("=", 1) for part in folders if "=" in part)
+    if not keys:
+        return {}
+    # typed by the CSV reader's inference
+    text = io.StringIO()
+    csv.writer(text).writerows([keys.keys(), keys.values()])
+    text.seek(0)
+    return pl.read_csv(text, try_parse_dates=True).row(0, named=True)
+
+
+def scan(path: str | Path, root: str | Path | None = None) -> pl.LazyFrame:
+    """Lazily scan a CSV, Parquet or NDJSON file, chosen by its extension.
+
+    With *root*, the hive partition keys of the file below it (see
+    :func:`hive_columns`) are added as columns, replacing columns of the file
+    with the same name.
+    """
+    path = Path(path)
+    scanner = _SCANNERS.get(path.suffix.lower())
+    if scanner is None:
+        raise ValueError(
+            f"Unsupported file type '{path.suffix}' for {path}. "
+            f"Valid options: {', '.join(_SCANNERS)}."
+        )
+    frame = scanner(path)
+    keys = hive_columns(path, root) if root is not None else {}
+    if keys:
+        frame = frame.with_columns(
+            pl.lit(value).alias(name) for name, value in keys.items()
+        )
+    return frame
+
+
+def find_partitions(source: str | Path) -> list[Path]:
+    """Expand *source* into the data files it refers to.
+
+    *source* may be a single file, a glob pattern (``data/*.parquet``, ``**``
+    is supported) or a directory, e.g. a hive-partitioned one
+    (``visits/date=2025-01-01/part-0.parquet``), which is searched recursively.
+    Only files with a supported extension are returned, sorted by path.
+    """
+    path = Path(source)
+    if path.is_dir():
+        candidates = path.rglob("*")
+    elif path.is_file():
+        candidates = [path]
+    else:
+        candidates = (Path(p) for p in glob.glob(str(source), recursive=True))
+    return sorted(
+        p for p in candidates if p.is_file() and p.suffix.lower() in _SCANNERS
+    )
+
+
+def scan_partitions(source: str | Path) -> pl.LazyFrame:
+    """Lazily scan all partition files of *source* as a single frame.
+
+    Partitions are concatenated in path order; columns missing from some
+    partitions are filled with nulls. The hive partition keys of each file
+    (``key=value`` folders below the directory *source*, or anywhere in the
+    paths matched by a glob pattern, as with Polars' hive partitioning) are
+    added as columns.
+    """
+    partitions = find_partitions(source)
+    if not partitions:
+        raise FileNotFoundError(f"No CSV, Parquet or NDJSON files found in {source}.")
+    root = _hive_root(source)
+    if len(partitions) == 1:
+        return scan(partitions[0], root)
+    return pl.concat([scan(path, root) for path in partitions], how="diagonal_relaxed")
+
+
+def _hive_root(source: str | Path) -> Path:
+    """Directory below which the folders of partitions are hive partition keys."""
+    path = Path(source)
+    if path.is_dir():
+        return path
+    if path.is_file():
+        return path.parent
+    return Path(path.anchor)
+
+
+def _partition_root(source: str | Path, partitions: list[Path]) -> Path:
+    """Directory that output paths of *partitions* are made relative to."""
+    if Path(source).is_dir():
+        return Path(source)
+    return Path(os.path.commonpath([p.parent for p in partitions]))
+
+
+_WRITERS: dict[str, tuple[str, str]] = {
+    ".parquet": ("sink_parquet", "write_parquet"),
+    ".csv": ("sink_csv", "write_csv"),
+}
+
+
+def write(frame: pl.LazyFrame, path: str | Path, *, streaming: bool = True) -> None:
+    """Write *frame* to a Parquet or CSV file, chosen by the extension of *path*.
+
+    With *streaming*, the query is sunk to the file batch by batch so the result
+    never has to fit in memory; otherwise it is collected first.
+    """
+    path = Path(path)
+    writer = _WRITERS.get(path.suffix.lower())
+    if writer is None:
+        raise ValueError(
+            f"Unsupported output file type '{path.suffix}' for {path}. "
+            f"Valid options: {', '.join(_WRITERS)}."
+        )
+    sink, write_eager = writer
+    if streaming:
+        getattr(frame, sink)(path)
+    else:
+        getattr(frame.collect(), write_eager)(path)
+
+
+def process_partitions(
+    source: str | Path,
+    transform: Callable[[pl.LazyFrame], pl.LazyFrame],
+    *,
+    output_dir: str | Path | None = None,
+    workers: int | None = None,
+    streaming: bool = True,
+    progress: Callable[[PartitionResult], None] | None = None,
+) -> list[PartitionResult]:
+    """Apply *transform* to every partition file of *source* concurrently.
+
+    *transform* is first applied to the first partition without collecting it,
+    which compiles the definitions into the engine cache before the workers
+    start. A thread pool is used because Polars releases the GIL while
+    executing a query, so partitions run in parallel without pickling the
+    engine or the data.
+
+    Parameters
+    ----------
+    source:
+        File, glob pattern or (hive-partitioned) directory, see
+        :func:`find_partitions`.
+    transform:
+        Builds the query for one partition, e.g. an :meth:`OSDEngine.filter`
+        call. The partition is scanned with its hive partition keys as
+        columns, as in :func:`scan_partitions`.
+    output_dir:
+        When given, the result of each partition is written as Parquet under
+        this directory, mirroring the partition's relative path (so hive
+        ``key=value`` folders are preserved). Otherwise rows are only counted.
+    workers:
+        Number of partitions processed at the same time. Defaults to the
+        :class:`~concurrent.futures.ThreadPoolExecutor` default.
+    streaming:
+        Run each partition with the streaming engine.
+    progress:
+        Called with each :class:`PartitionResult` as soon as its partition
+        finishes.
+
+    Returns
+    -------
+    list[PartitionResult]
+        One result per partition, in path order.
+    """
+    partitions = find_partitions(source)
+    if not partitions:
+        raise FileNotFoundError(f"No CSV, Parquet or NDJSON files found in {source}.")
+
+    hive_root = _hive_root(source)
+    transform(scan(partitions[0], hive_root))
+    root = _partition_root(source, partitions)
+    output_dir = Path(output_dir) if output_dir is not None else None
+
+    def run(path: Path) -> PartitionResult:
+        start = time.perf_counter()
+        result = transform(scan(path, hive_root))
+        if output_dir is None:
+            rows = collect(result.select(pl.len()), streaming=streaming).item()
+            return PartitionResult(path, rows, time.perf_counter() - start)
+        output = output_dir / path.relative_to(root).with_suffix(".parquet")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        write(result, output, streaming=streaming)
+        rows = pl.scan_parquet(output).select(pl.len()).collect().item()
+        return PartitionResult(path, rows, time.perf_counter() - start, output)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, path) for path in partitions]
+        for future in as_completed(futures):
+            result = future.result()
+            if progress is not None:
+                progress(result)
+            results.append(result)
+    return sorted(results, key=lambda result: result.path)
+
+
+def filter_partitions(
+    engine: OSDEngine,
+    source: str | Path,
+    osd_definition: dict,
+    **kwargs,
+) -> list[PartitionResult]:
+    """Filter every partition file of *source* with *osd_definition*.
+
+    The definition is compiled once and reused from the engine's compile cache
+    by all partitions sharing a schema. Keyword arguments are passed to
+    :func:`process_partitions`; :attr:`PartitionResult.rows` counts the
+    matching rows.
+    """
+    return process_partitions(
+        source, lambda frame: engine.filter(frame, osd_definition), **kwargs
+    )
+
+
+def label_partitions(
+    engine: OSDEngine,
+    source: str | Path,
+    definitions: dict[str, dict],
+    *,
+    fuse: bool = False,
+    **kwargs,
+) -> list[PartitionResult]:
+    """Label every partition file of *source* with one column per definition.
+
+    See :meth:`OSDEngine.label` for *fuse*. Keyword arguments are passed to
+    :func:`process_partitions`.
+    """
+    return process_partitions(
+        source, lambda frame: engine.label(frame, definitions, fuse=fuse), **kwargs
+    )
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
+from opensyndrome.artifacts import atomic_path
+from opensyndrome.catalog import DefinitionCatalog
+
+# a bundle is a text file with one JSON object per line (NDJSON), compressed
+# with zstd when its name ends with .zst
+BUNDLE_SUFFIXES = (".ndjson", ".ndjson.zst")
+ZSTD_LEVEL = 10
+
+
+@dataclass(frozen=True)
+class BundledDefinition:
+    """A definition read from a bundle by :func:`iter_bundle`.
+
+    Attributes
+    ----------
+    name:
+        File name of the packed definition without ``.json``, the key
+        definitions are loaded under.
+    path:
+        Path of the packed file, relative to the packed directory.
+    definition:
+        The definition itself.
+    line:
+        Line of the definition in the bundle, starting at 1.
+    """
+
+    name: str
+    path: str
+    definition: dict
+    line: int = 0
+
+
+def is_bundle(path: str | Path) -> bool:
+    """Whether *path* is named like a bundle (``.ndjson`` or ``.ndjson.zst``)."""
+    return Path(path).name.lower().endswith(BUNDLE_SUFFIXES)
+
+
+def _compressed(path: Path) -> bool:
+    return path.name.lower().endswith(".zst")
+
+
+def _open(path: Path, mode: str, compressed: bool) -> IO[str]:
+    if not compressed:
+        return open(path, mode, encoding="utf-8")
+    try:
+        # standard library from Python 3.14
+        from compression import zstd
+
+        options = {"level": ZSTD_LEVEL} if "w" in mode else {}
+    except ImportError:
+        try:
+            import zstandard as zstd
+        except ImportError:
+            raise ImportError(
+                "Reading or writing .zst bundles needs zstd support: "
+                "pip install 'opensyndrome[zstd]'."
+            ) from None
+        options = {"cctx": zstd.ZstdCompressor(level=ZSTD_LEVEL)} if "w" in mode else {}
+    return zstd.open(path, mode, encoding="utf-8", **options)
+
+
+def iter_bundle(path: str | Path) -> Iterator[BundledDefinition]:
+    """Stream the definitions of a bundle, one line at a time.
+
+    Only the current line is held in memory, so bundles of any size can be
+    read; blank lines are skipped.
+
+    Raises
+    ------
+    ValueError
+        A line is not a JSON object with a ``name`` and a ``definition``.
+        Definitions before it have already been yielded.
+    ImportError
+        The bundle is compressed and neither ``compression.zstd`` (Python
+        3.14) nor ``zstandard`` is available.
+    """
+    path = Path(path)
+    with _open(path, "rt", _compressed(path)) as lines:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield BundledDefinition(
+                    name=record["name"],
+                    path=record.get("path", f"{record['name']}.json"),
+                    definition=record["definition"],
+                    line=number,
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{number}: invalid bundle line: {e}") from e
+
+
+def write_bundle(definitions: Iterable[BundledDefinition], path: str | Path) -> int:
+    """Write *definitions* to a bundle, compressed when *path* ends with ``.zst``.
+
+    The bundle is written to a temporary file renamed over *path* once
+    complete, so readers never see a partial bundle.
+
+    Returns
+    -------
+    int
+        Number of definitions written.
+    """
+    path = Path(path)
+    count = 0
+    with atomic_path(path) as temporary:
+        with _open(temporary, "wt", _compressed(path)) as bundle:
+            for bundled in definitions:
+                record = {
+                    "name": bundled.name,
+                    "path": bundled.path,
+                    "definition": bundled.definition,
+                }
+                bundle.write(
+                    json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+                )
+                bundle.write("\n")
+                count += 1
+    return count
+
+
+def pack(directory: str | Path, path: str | Path) -> int:
+    """Write every non-empty definition under *directory* to the bundle *path*.
+
+    Definitions are read through the directory's :class:`DefinitionCatalog`
+    index and written in path order.
+
+    Returns
+    -------
+    int
+        Number of definitions packed.
+    """
+    with DefinitionCatalog(directory) as catalog:
+        return write_bundle(
+            (
+                BundledDefinition(name, relative, definition)
+                for name, relative, definition in catalog.iter_definitions()
+            ),
+            path,
+        )
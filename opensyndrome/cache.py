@@ -0,0 +1,128 @@
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from opensyndrome.artifacts import OPEN_SYNDROME_DIR
+
+CACHE_PATH = OPEN_SYNDROME_DIR / "responses.sqlite"
+# total size of the cached responses, least recently used ones are evicted
+# beyond it
+DEFAULT_MAX_BYTES = 64 * 2**20
+# bumped when the table layout changes, so older caches are dropped
+_CACHE_VERSION = 1
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL
+)
+"""
+
+
+def request_key(**request) -> str:
+    """Content address of a chat request: SHA-256 of its canonical JSON.
+
+    Every argument that changes the response (messages, model, format schema,
+    options...) must be passed, so that different requests never share a key.
+    """
+    canonical = json.dumps(
+        request, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Responses of LLM requests, stored by request key in a SQLite file.
+
+    Once the cached responses take more than *max_bytes*, the least recently
+    used ones are evicted. When the cache cannot be written (e.g. a read-only
+    home directory), it is kept in memory for the lifetime of the object.
+
+    Parameters
+    ----------
+    path:
+        SQLite file of the cache. Defaults to :data:`CACHE_PATH`.
+    max_bytes:
+        Maximum total size of the cached responses, in UTF-8 bytes.
+    """
+
+    def __init__(
+        self, path: str | Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.path = Path(path) if path else CACHE_PATH
+        self.max_bytes = max_bytes
+        self._connection: sqlite3.Connection | None = None
+
+    def __enter__(self) -> ResponseCache:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._connection = self._open(self.path)
+            except (OSError, sqlite3.Error):
+                self._connection = self._open(":memory:")
+        return self._connection
+
+    @staticmethod
+    def _open(database: str | Path) -> sqlite3.Connection:
+        connection = sqlite3.connect(database, timeout=30)
+        try:
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != _CACHE_VERSION:
+                with connection:
+                    connection.execute("DROP TABLE IF EXISTS responses")
+                    connection.execute(f"PRAGMA user_version = {_CACHE_VERSION}")
+            connection.execute(_CREATE_TABLE)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def get(self, key: str) -> str | None:
+        """The response cached under *key*, marked as just used, or ``None``."""
+        row = self.connection.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """Cache *response* under *key*, then evict beyond :attr:`max_bytes`."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode()), time.time()),
+            )
+            # most recently used first: drop what no longer fits
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "  SELECT key FROM ("
+                "    SELECT key, SUM(size) OVER ("
+                "      ORDER BY used_at DESC, rowid DESC"
+                "    ) AS total FROM responses"
+                "  ) WHERE total > ?"
+                ")",
+                (self.max_bytes,),
+            )
@@ -0,0 +1,353 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from opensyndrome.artifacts import OPEN_SYNDROME_DIR
+
+INDEX_DIR = OPEN_SYNDROME_DIR / "index"
+# indexes kept in INDEX_DIR, those of the least recently used directories
+# are deleted beyond it
+MAX_INDEXES = 32
+# bumped when the table layout changes, so older indexes are rebuilt
+_INDEX_VERSION = 1
+# a file modified this recently may change again without its mtime changing
+_RACY_NS = 2 * 10**9
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS definitions (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    title TEXT,
+    location TEXT,
+    version TEXT,
+    keywords TEXT,
+    body TEXT
+)
+"""
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """Metadata of a definition file, read from the index without parsing it.
+
+    Attributes
+    ----------
+    name:
+        File name without ``.json``, the key definitions are loaded under.
+    path:
+        Path of the file.
+    title, location, version:
+        Fields of the definition, ``None`` when missing.
+    keywords:
+        The definition's ``keywords``.
+    hash:
+        SHA-256 of the file content.
+    """
+
+    name: str
+    path: Path
+    title: str | None
+    location: str | None
+    version: str | None
+    keywords: tuple[str, ...]
+    hash: str
+
+
+@dataclass(frozen=True)
+class RefreshResult:
+    """Files (re)indexed or dropped by :meth:`DefinitionCatalog.refresh`."""
+
+    added: int
+    updated: int
+    removed: int
+    unchanged: int
+
+
+def default_index_path(root: str | Path) -> Path:
+    """Index file of the definitions under *root*, kept in :data:`INDEX_DIR`."""
+    digest = hashlib.sha256(str(Path(root).resolve()).encode()).hexdigest()
+    return INDEX_DIR / f"{digest[:16]}.sqlite"
+
+
+def prune_indexes(keep: int | None = None) -> list[Path]:
+    """Delete all but the *keep* most recently used index files of :data:`INDEX_DIR`.
+
+    *keep* defaults to :data:`MAX_INDEXES`.
+
+    Index files are touched whenever a catalog opens them, so their
+    modification time tells when their directory was last used. Files that
+    cannot be deleted are left in place.
+
+    Returns
+    -------
+    list[Path]
+        The index files deleted.
+    """
+    keep = MAX_INDEXES if keep is None else keep
+    indexes = []
+    for path in INDEX_DIR.glob("*.sqlite"):
+        try:
+            indexes.append((path.stat().st_mtime_ns, path))
+        except OSError:
+            continue
+    indexes.sort(reverse=True)
+    deleted = []
+    for _, path in indexes[keep:]:
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        deleted.append(path)
+    return deleted
+
+
+def _optional_str(value) -> str | None:
+    return None if value is None else str(value)
+
+
+class DefinitionCatalog:
+    """The definition files under a directory, indexed in a SQLite file.
+
+    The index stores, for every ``*.json`` file, its modification time, size,
+    content hash, a few fields used for listing and the definition itself, so
+    listing definitions reads no definition file and loading them reads a
+    single file. :meth:`refresh` only re-reads files whose modification time
+    or size changed since they were indexed; it runs once, on first use, per
+    catalog.
+
+    When the index cannot be written (e.g. a read-only home directory), it is
+    kept in memory for the lifetime of the catalog. Opening an index in
+    :data:`INDEX_DIR` deletes the indexes beyond :data:`MAX_INDEXES`, see
+    :func:`prune_indexes`.
+
+    Parameters
+    ----------
+    root:
+        Directory searched recursively for definitions.
+    index_path:
+        SQLite file of the index. Defaults to :func:`default_index_path`.
+    """
+
+    def __init__(self, root: str | Path, index_path: str | Path | None = None) -> None:
+        self.root = Path(root)
+        self.index_path = (
+            Path(index_path) if index_path else default_index_path(self.root)
+        )
+        self._connection: sqlite3.Connection | None = None
+        self._refreshed = False
+
+    def __enter__(self) -> DefinitionCatalog:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            try:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                self._connection = self._open(self.index_path)
+            except (OSError, sqlite3.Error):
+                self._connection = self._open(":memory:")
+            else:
+                if self.index_path.parent == INDEX_DIR:
+                    self._touch_and_prune()
+        return self._connection
+
+    def _touch_and_prune(self) -> None:
+        try:
+            os.utime(self.index_path)
+        except OSError:
+            # e.g. a shared read-only index
+            return
+        prune_indexes()
+
+    @staticmethod
+    def _open(database: str | Path) -> sqlite3.Connection:
+        connection = sqlite3.connect(database)
+        try:
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != _INDEX_VERSION:
+                with connection:
+                    connection.execute("DROP TABLE IF EXISTS definitions")
+                    connection.execute(f"PRAGMA user_version = {_INDEX_VERSION}")
+            connection.execute(_CREATE_TABLE)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def refresh(self) -> RefreshResult:
+        """Bring the index up to date with the files under :attr:`root`.
+
+        New files and files whose modification time or size changed are read
+        and parsed; files that disappeared are dropped from the index.
+
+        Raises
+        ------
+        json.JSONDecodeError
+            A file is not valid JSON; its path starts the message. The index
+            is left unchanged.
+        """
+        files = self._files()
+        indexed = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.connection.execute(
+                "SELECT path, mtime_ns, size FROM definitions"
+            )
+        }
+        now = time.time_ns()
+        rows = []
+        unchanged = 0
+        for relative, stat in files.items():
+            if indexed.get(relative) == (stat.st_mtime_ns, stat.st_size):
+                unchanged += 1
+                continue
+            # a file written within the racy window is indexed again next time,
+            # since a later write in the same mtime tick would go unnoticed
+            mtime_ns = 0 if now - stat.st_mtime_ns < _RACY_NS else stat.st_mtime_ns
+            rows.append(
+                self._row(relative, self.root / relative, mtime_ns, stat.st_size)
+            )
+        removed = [(relative,) for relative in indexed if relative not in files]
+
+        if rows or removed:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO definitions "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self.connection.executemany(
+                    "DELETE FROM definitions WHERE path = ?", removed
+                )
+        self._refreshed = True
+        added = sum(1 for row in rows if row[0] not in indexed)
+        return RefreshResult(
+            added=added,
+            updated=len(rows) - added,
+            removed=len(removed),
+            unchanged=unchanged,
+        )
+
+    def _files(self) -> dict[str, os.stat_result]:
+        """Stat of the ``*.json`` files under :attr:`root`, by relative path."""
+        files = {}
+        # plain strings and os.scandir: building a Path per file costs more
+        # than the stat itself
+        pending = [""]
+        while pending:
+            prefix = pending.pop()
+            with os.scandir(os.path.join(self.root, prefix)) as entries:
+                for entry in entries:
+                    relative = f"{prefix}{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(f"{relative}/")
+                    elif entry.name.endswith(".json") and entry.is_file():
+                        try:
+                            files[relative] = entry.stat()
+                        except FileNotFoundError:
+                            continue
+        return files
+
+    @staticmethod
+    def _row(relative: str, path: Path, mtime_ns: int, size: int) -> tuple:
+        content = path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        if not content.strip():
+            return (relative, path.stem, mtime_ns, size, digest, *[None] * 5)
+        try:
+            body = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(f"{path}: {e.msg}", e.doc, e.pos) from None
+        fields = body if isinstance(body, dict) else {}
+        return (
+            relative,
+            path.stem,
+            mtime_ns,
+            size,
+            digest,
+            _optional_str(fields.get("title")),
+            _optional_str(fields.get("location")),
+            _optional_str(fields.get("version")),
+            json.dumps(fields.get("keywords") or []),
+            json.dumps(body, separators=(",", ":")),
+        )
+
+    def _query(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        if not self._refreshed:
+            self.refresh()
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def entries(self) -> list[CatalogEntry]:
+        """Metadata of every non-empty definition file, ordered by path."""
+        rows = self._query(
+            "SELECT name, path, title, location, version, keywords, hash "
+            "FROM definitions WHERE body IS NOT NULL ORDER BY path"
+        )
+        return [
+            CatalogEntry(
+                name=name,
+                path=self.root / path,
+                title=title,
+                location=location,
+                version=version,
+                keywords=tuple(json.loads(keywords)),
+                hash=digest,
+            )
+            for name, path, title, location, version, keywords, digest in rows
+        ]
+
+    def load(self) -> dict[str, dict]:
+        """Every non-empty definition, keyed by file name without ``.json``.
+
+        Files are taken in path order, so of two files with the same name in
+        different folders the last one wins.
+        """
+        rows = self._query(
+            "SELECT name, body FROM definitions WHERE body IS NOT NULL ORDER BY path"
+        )
+        return {name: json.loads(body) for name, body in rows}
+
+    def iter_definitions(self) -> Iterator[tuple[str, str, dict]]:
+        """Name, path relative to :attr:`root` and content of every non-empty
+        definition, ordered by path.
+        """
+        rows = self._query(
+            "SELECT name, path, body FROM definitions "
+            "WHERE body IS NOT NULL ORDER BY path"
+        )
+        for name, relative, body in rows:
+            yield name, relative, json.loads(body)
+
+    def get(self, name: str) -> dict:
+        """The definition stored in ``<name>.json``.
+
+        Raises
+        ------
+        KeyError
+            No non-empty definition file has that name.
+        """
+        rows = self._query(
+            "SELECT body FROM definitions WHERE name = ? AND body IS NOT NULL "
+            "ORDER BY path DESC LIMIT 1",
+            (name,),
+        )
+        if not rows:
+            raise KeyError(f"Definition '{name}' not found in {self.root}.")
+        return json.loads(rows[0][0])
@@ -1,19 +1,21 @@
 import json
+import time
 from functools import wraps
 from pathlib import Path
 
-from pygments import highlight, lexers, formatters
-import jsonschema
 import click
-import ollama
-from ollama._types import ResponseError
 
-from opensyndrome.converters import (
-    generate_machine_readable_format,
-    generate_human_readable_format,
+from opensyndrome.artifacts import (
+    DEFINITIONS_DIR,
+    get_definition_dir,
+    get_schema_filepath,
 )
-from opensyndrome.artifacts import get_schema_filepath, get_definition_dir
-from opensyndrome.validators import validate_machine_readable_format
+from opensyndrome.bundle import BUNDLE_SUFFIXES, is_bundle, iter_bundle, pack
+from opensyndrome.catalog import DefinitionCatalog
+
+# Heavy dependencies (polars, ollama, pydantic, jsonschema, pygments...) are
+# imported by the commands using them, so that running one command does not
+# pay for the imports of all the others.
 
 
 @click.group()
@@ -22,6 +24,10 @@ def cli():
 
 
 def validate_machine_readable_format_with_style(json_or_file, schema_file=None):
+    import jsonschema
+
+    from opensyndrome.validators import validate_machine_readable_format
+
     try:
         validate_machine_readable_format(json_or_file, schema_file)
         click.echo(click.style("✅ Validation successful!", fg="green"))
@@ -36,29 +42,168 @@ def validate_machine_readable_format_with_style(json_or_file, schema_file=None):
 
 
 @cli.command("validate")
-@click.argument("json_file", type=click.Path(exists=True))
-@click.option("--schema-file", type=click.Path(exists=True))
-def validate_json(json_file, schema_file):
+@click.argument("sources", metavar="PATH...", nargs=-1, required=True)
+@click.option(
+    "--schema-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON Schema to validate against. Defaults to the downloaded schema.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["text", "jsonl", "junit"]),
+    default="text",
+    show_default=True,
+    help="Print a line per file, a JSON object per line, or a JUnit XML report.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    help="Number of processes validating files. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["jsonschema", "pydantic"]),
+    default="jsonschema",
+    show_default=True,
+    help="Validate against the JSON Schema, or with the compiled Pydantic models "
+    "generated from it (several times faster, no schema download).",
+)
+def validate_json(sources, schema_file, output_format, workers, backend):
+    """
+    Validate definitions against the JSON Schema, reporting every error.
+
+    PATH: A JSON file, a bundle (see `pack`), a directory (searched
+    recursively for *.json files) or a glob pattern (quote it). Can be
+    repeated.
+
+    Results are printed as files are validated; a summary is printed to
+    stderr. Exits with 1 when a definition is invalid.
     """
-    Validate a JSON file against a JSON Schema.
+    import jsonschema
+
+    from opensyndrome.validators import find_definitions, validate_files
+
+    if schema_file and backend != "jsonschema":
+        raise click.BadParameter(
+            "Only used by the jsonschema backend.", param_hint="--schema-file"
+        )
+    paths = find_definitions(sources)
+    if not paths:
+        raise click.BadParameter("No definitions found.", param_hint="PATH")
+
+    start = time.perf_counter()
+    results = []
+    try:
+        for result in validate_files(
+            paths, schema_file, workers=workers, backend=backend
+        ):
+            results.append(result)
+            if output_format == "text":
+                click.echo(format_validation(result))
+            elif output_format == "jsonl":
+                click.echo(json.dumps(validation_to_dict(result)))
+    except (json.JSONDecodeError, jsonschema.exceptions.SchemaError) as e:
+        raise click.ClickException(f"Invalid schema: {e}")
+    seconds = time.perf_counter() - start
+    if output_format == "junit":
+        click.echo(junit_report(results, seconds))
 
-    JSON_FILE: Path to the JSON file to validate.
-    SCHEMA_FILE: Path to the JSON Schema file. If not passed, it will use
-    the downloaded schema from GitHub repo.
+    invalid = sum(not result.valid for result in results)
+    click.echo(
+        click.style(
+            f"{len(results)} definitions, {len(results) - invalid} valid, "
+            f"{invalid} invalid in {seconds:.2f}s",
+            fg="red" if invalid else "green",
+        ),
+        err=True,
+    )
+    if invalid:
+        raise SystemExit(1)
+
+
+def validation_to_dict(result) -> dict:
+    return {
+        "source": result.source,
+        "valid": result.valid,
+        "seconds": round(result.seconds, 6),
+        "errors": [
+            {"path": e.path, "validator": e.validator, "message": e.message}
+            for e in result.errors
+        ],
+    }
+
+
+def format_validation(result) -> str:
+    if result.valid:
+        return click.style(f"✅ {result.source}", fg="green")
+    lines = [click.style(f"❌ {result.source}", fg="red")]
+    lines += [f"    {error.path}: {error.message}" for error in result.errors]
+    return "\n".join(lines)
+
+
+def junit_report(results, seconds: float) -> str:
+    """JUnit XML report of validation results, one test case per definition.
+
+    Schema violations are reported as failures, unreadable files as errors.
     """
-    validate_machine_readable_format_with_style(json_file, schema_file)
+    from xml.etree import ElementTree
+
+    def unreadable(result):
+        return result.errors[0].validator == "json"
+
+    invalid = [result for result in results if not result.valid]
+    counts = {
+        "tests": str(len(results)),
+        "failures": str(sum(not unreadable(result) for result in invalid)),
+        "errors": str(sum(unreadable(result) for result in invalid)),
+        "time": f"{seconds:.3f}",
+    }
+    suites = ElementTree.Element("testsuites", counts)
+    suite = ElementTree.SubElement(
+        suites, "testsuite", {"name": "opensyndrome validate", **counts}
+    )
+    for result in results:
+        case = ElementTree.SubElement(
+            suite,
+            "testcase",
+            classname="opensyndrome.validate",
+            name=result.source,
+            time=f"{result.seconds:.3f}",
+        )
+        if result.valid:
+            continue
+        if unreadable(result):
+            problem = ElementTree.SubElement(
+                case, "error", message=result.errors[0].message, type="JSONDecodeError"
+            )
+        else:
+            problem = ElementTree.SubElement(
+                case,
+                "failure",
+                message=f"{len(result.errors)} validation errors",
+                type="ValidationError",
+            )
+        problem.text = "\n".join(f"{e.path}: {e.message}" for e in result.errors)
+    ElementTree.indent(suites)
+    return ElementTree.tostring(suites, encoding="unicode", xml_declaration=True)
 
 
 def color_json(json_definition: dict):
+    from pygments import highlight, lexers, formatters
+
     formatted_json = json.dumps(json_definition, indent=4)
     return highlight(formatted_json, lexers.JsonLexer(), formatters.TerminalFormatter())
 
 
 def is_ollama_available():
+    import ollama
+
     try:
         ollama.list()
         return True
-    except (ConnectionError, ResponseError):
+    except (ConnectionError, ollama.ResponseError):
         return False
 
 
@@ -77,6 +222,16 @@ def check_ollama(func):
     return wrapper
 
 
+def cache_option(func):
+    return click.option(
+        "--cache/--no-cache",
+        default=True,
+        show_default=True,
+        help="Reuse the model's response to the same prompt from "
+        "~/.open_syndrome/<version>/responses.sqlite, or always run the model.",
+    )(func)
+
+
 @cli.command("convert")
 @click.option(
     "--validate", is_flag=True, help="Validate the JSON file against the schema."
@@ -110,6 +265,7 @@ def check_ollama(func):
     type=click.Path(exists=True),
     help="Path to a TXT file containing the human-readable definition.",
 )
+@cache_option
 @check_ollama
 def convert_to_json(
     validate,
@@ -118,12 +274,15 @@ def convert_to_json(
     edit,
     human_readable_definition,
     human_readable_definition_file,
+    cache,
 ):
     """
     Convert human-readable definition (TEXT) to the machine-readable format (JSON).
 
     If the --validate flag is passed, the JSON file will be validated against the schema.
     """
+    from opensyndrome.converters import generate_machine_readable_format
+
     if human_readable_definition and human_readable_definition_file:
         raise click.UsageError("Cannot use -hr and -hf at the same time.")
     if human_readable_definition_file:
@@ -131,7 +290,7 @@ def convert_to_json(
     if not human_readable_definition:
         human_readable_definition = click.edit(extension=".txt")
     machine_readable_definition = generate_machine_readable_format(
-        human_readable_definition, model, language
+        human_readable_definition, model, language, cache=cache
     )
 
     if edit:
@@ -161,11 +320,16 @@ def convert_to_json(
     help="Language used to generate the human-readable definition.",
     default="American English",
 )
+@cache_option
 @check_ollama
-def convert_to_text(json_file, model, language):
+def convert_to_text(json_file, model, language, cache):
     """Convert a machine-readable format (JSON) to a human-readable format (TEXT)."""
+    from opensyndrome.converters import generate_human_readable_format
+
     machine_readable_definition = json.loads(Path(json_file).read_text())
-    text = generate_human_readable_format(machine_readable_definition, model, language)
+    text = generate_human_readable_format(
+        machine_readable_definition, model, language, cache=cache
+    )
     click.echo(click.style(text, fg="green"))
 
 
@@ -177,12 +341,22 @@ def convert_to_text(json_file, model, language):
     default=False,
     help="Force download even if already exists.",
 )
-def download_entity(entity, force):
+@click.option(
+    "--version",
+    help="Version to download, kept apart from the others. "
+    "Defaults to $OPEN_SYNDROME_VERSION or v1.",
+)
+@click.option(
+    "--ref",
+    help="Branch, tag or commit to download and pin. "
+    "Defaults to the one pinned by the last download, or main.",
+)
+def download_entity(entity, force, version, ref):
     match entity:
         case "schema":
-            result = get_schema_filepath(force=force)
+            result = get_schema_filepath(force=force, version=version, ref=ref)
         case "definitions":
-            result = get_definition_dir(force=force)
+            result = get_definition_dir(force=force, version=version, ref=ref)
         case _:
             result = None
 
@@ -197,6 +371,490 @@ def download_entity(entity, force):
         click.echo(click.style(f"{entity} available at: {result}", fg="green"))
 
 
+def load_engine(
+    mapping_file, profile_name, skip_unresolvable=False, dictionary_max_values=None
+):
+    import yaml
+
+    from opensyndrome.filter import OSDEngine, load_profile
+
+    yaml_data = yaml.safe_load(Path(mapping_file).read_text())
+    try:
+        profile = load_profile(yaml_data or {}, profile_name)
+    except KeyError as e:
+        raise click.BadParameter(e.args[0], param_hint="--profile")
+    return OSDEngine(
+        profile,
+        skip_unresolvable=skip_unresolvable,
+        dictionary_max_values=dictionary_max_values,
+    )
+
+
+def load_definitions(paths):
+    """Load definitions from JSON files, bundles and directories, keyed by file name.
+
+    Directories are read through their :class:`DefinitionCatalog` index and
+    bundles are streamed line by line.
+    """
+    definitions = {}
+    for path in map(Path, paths):
+        if path.is_dir():
+            try:
+                with DefinitionCatalog(path) as catalog:
+                    definitions.update(catalog.load())
+            except json.JSONDecodeError as e:
+                raise click.BadParameter(
+                    f"Invalid JSON: {e}", param_hint="--definition"
+                )
+            continue
+        if is_bundle(path):
+            try:
+                for bundled in iter_bundle(path):
+                    definitions[bundled.name] = bundled.definition
+            except (ImportError, ValueError) as e:
+                raise click.BadParameter(str(e), param_hint="--definition")
+            continue
+        content = path.read_text()
+        if content.strip():
+            try:
+                definitions[path.stem] = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise click.BadParameter(
+                    f"Invalid JSON: {path}: {e}", param_hint="--definition"
+                )
+    return definitions
+
+
+def profile_options(func):
+    func = click.option(
+        "--dictionary-max-values",
+        type=click.IntRange(min=1),
+        help="Evaluate text, code and regex criteria once per distinct value on "
+        "string columns with at most this many distinct values in their first "
+        "rows. Such criteria are not pushed down into scans, so this pays off "
+        "for expensive criteria only. Off by default.",
+    )(func)
+    func = click.option(
+        "--skip-unresolvable",
+        is_flag=True,
+        help="Skip criteria that cannot be evaluated with the profile columns "
+        "(e.g. symptoms without a mapped column) instead of failing.",
+    )(func)
+    func = click.option(
+        "-p",
+        "--profile",
+        "profile_name",
+        required=True,
+        help="Name of the profile to use from the mapping file.",
+    )(func)
+    return click.option(
+        "-m",
+        "--mapping",
+        "mapping_file",
+        type=click.Path(exists=True, dir_okay=False),
+        required=True,
+        help="Mapping YAML file describing the dataset columns.",
+    )(func)
+
+
+def engine_run_options(func):
+    func = click.option(
+        "-w",
+        "--workers",
+        type=click.IntRange(min=1),
+        help="Number of partitions processed at the same time when OUTPUT is a "
+        "directory, or when counting rows.",
+    )(func)
+    func = click.option(
+        "--streaming/--in-memory",
+        default=True,
+        show_default=True,
+        help="Run with the Polars streaming engine, or collect the result in memory.",
+    )(func)
+    func = click.option(
+        "-o",
+        "--output",
+        type=click.Path(),
+        help="Output file (.parquet or .csv). Any other path is used as a directory "
+        "with one Parquet file per input partition, processed in parallel. "
+        "Required, unless counting rows with `filter --count`.",
+    )(func)
+    return click.option(
+        "-d",
+        "--definition",
+        "definition_paths",
+        type=click.Path(exists=True),
+        required=True,
+        multiple=True,
+        help="Machine-readable definition (JSON), bundle of definitions (see "
+        "`pack`) or directory of definitions. Can be repeated.",
+    )(func)
+
+
+def definition_errors():
+    """Errors raised by the engine for definitions it cannot evaluate."""
+    from opensyndrome.filter import (
+        CircularReference,
+        InvalidOperator,
+        InvalidPattern,
+        UnresolvableCriterion,
+    )
+
+    return (UnresolvableCriterion, InvalidOperator, InvalidPattern, CircularReference)
+
+
+def report_partition(result):
+    click.echo(f"{result.path}: {result.rows} rows in {result.seconds:.2f}s")
+
+
+def run_on_dataset(source, output, transform, streaming, workers):
+    from opensyndrome.batch import process_partitions, scan_partitions, write
+
+    if output is None:
+        raise click.UsageError("Missing option '-o' / '--output'.")
+    start = time.perf_counter()
+    try:
+        if Path(output).suffix.lower() in (".parquet", ".csv"):
+            write(transform(scan_partitions(source)), output, streaming=streaming)
+        else:
+            process_partitions(
+                source,
+                transform,
+                output_dir=output,
+                workers=workers,
+                streaming=streaming,
+                progress=report_partition,
+            )
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="INPUT")
+    except definition_errors() as e:
+        raise click.ClickException(f"Cannot evaluate definition: {e}")
+    click.echo(
+        click.style(
+            f"Written to {output} in {time.perf_counter() - start:.2f}s", fg="green"
+        )
+    )
+
+
+def count_on_dataset(source, transform, streaming, workers):
+    from opensyndrome.batch import process_partitions
+
+    start = time.perf_counter()
+    try:
+        results = process_partitions(
+            source,
+            transform,
+            workers=workers,
+            streaming=streaming,
+            progress=report_partition,
+        )
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="INPUT")
+    except definition_errors() as e:
+        raise click.ClickException(f"Cannot evaluate definition: {e}")
+    click.echo(
+        click.style(
+            f"{len(results)} partitions, {sum(r.rows for r in results)} matching rows "
+            f"in {time.perf_counter() - start:.2f}s",
+            fg="green",
+        )
+    )
+
+
+@cli.command("filter")
+@click.argument("source", metavar="INPUT")
+@profile_options
+@engine_run_options
+@click.option(
+    "--count",
+    is_flag=True,
+    help="Only count the matching rows of each partition, in parallel, "
+    "instead of writing them to OUTPUT.",
+)
+def filter_dataset(
+    source,
+    mapping_file,
+    profile_name,
+    skip_unresolvable,
+    dictionary_max_values,
+    definition_paths,
+    output,
+    streaming,
+    workers,
+    count,
+):
+    """
+    Keep the rows of a dataset matching at least one of the definitions.
+
+    INPUT: A CSV, Parquet or NDJSON file, a glob pattern (quote it) or a
+    directory, such as a hive-partitioned one, which is searched recursively.
+    """
+    import polars as pl
+
+    if count and output is not None:
+        raise click.UsageError("Cannot use --count and --output at the same time.")
+    engine = load_engine(
+        mapping_file, profile_name, skip_unresolvable, dictionary_max_values
+    )
+    definitions = load_definitions(definition_paths)
+    if not definitions:
+        raise click.BadParameter("No definitions found.", param_hint="--definition")
+
+    if len(definitions) == 1:
+        (osd_definition,) = definitions.values()
+
+        def transform(frame):
+            return engine.filter(frame, osd_definition)
+
+    else:
+
+        def transform(frame):
+            labels = list(definitions)
+            return (
+                engine.label(frame, definitions, fuse=True)
+                .filter(pl.any_horizontal(labels))
+                .drop(labels)
+            )
+
+    if count:
+        count_on_dataset(source, transform, streaming, workers)
+    else:
+        run_on_dataset(source, output, transform, streaming, workers)
+
+
+@cli.command("label")
+@click.argument("source", metavar="INPUT")
+@profile_options
+@engine_run_options
+@click.option(
+    "--fuse/--no-fuse",
+    default=True,
+    show_default=True,
+    help="Evaluate criteria shared by several definitions only once.",
+)
+@click.option(
+    "--watermark",
+    "watermark_column",
+    help="Only label rows whose value in this column is past the last run's, "
+    "and add them as a new Parquet part file of the OUTPUT directory.",
+)
+@click.option(
+    "--state",
+    "state_path",
+    type=click.Path(dir_okay=False),
+    help="State file of incremental runs. Defaults to OUTPUT.state.json.",
+)
+def label_dataset(
+    source,
+    mapping_file,
+    profile_name,
+    skip_unresolvable,
+    dictionary_max_values,
+    definition_paths,
+    output,
+    streaming,
+    workers,
+    fuse,
+    watermark_column,
+    state_path,
+):
+    """
+    Add one boolean column per definition to a dataset.
+
+    INPUT: A CSV, Parquet or NDJSON file, a glob pattern (quote it) or a
+    directory, such as a hive-partitioned one, which is searched recursively.
+
+    With --watermark, OUTPUT is a directory of Parquet part files. The whole
+    dataset is labelled on the first run and later runs only label new rows
+    into a new part, unless a definition or the profile changed.
+    """
+    import polars as pl
+
+    from opensyndrome.batch import scan_partitions
+    from opensyndrome.incremental import label_incremental
+
+    engine = load_engine(
+        mapping_file, profile_name, skip_unresolvable, dictionary_max_values
+    )
+    definitions = load_definitions(definition_paths)
+    if not definitions:
+        raise click.BadParameter("No definitions found.", param_hint="--definition")
+
+    if watermark_column:
+        if output is None:
+            raise click.UsageError("Missing option '-o' / '--output'.")
+        if Path(output).suffix.lower() == ".csv":
+            raise click.BadParameter(
+                "Incremental labelling writes a directory of Parquet files.",
+                param_hint="--output",
+            )
+        try:
+            result = label_incremental(
+                engine,
+                scan_partitions(source),
+                definitions,
+                output,
+                watermark_column=watermark_column,
+                state_path=state_path,
+                fuse=fuse,
+            )
+        except FileNotFoundError as e:
+            raise click.BadParameter(str(e), param_hint="INPUT")
+        except pl.exceptions.ColumnNotFoundError:
+            raise click.BadParameter(
+                f"Column '{watermark_column}' not found in INPUT.",
+                param_hint="--watermark",
+            )
+        if result.refreshed:
+            click.echo(f"Relabelled all {result.rows} rows ({result.reason}).")
+        else:
+            click.echo(f"Appended {result.rows} new rows.")
+        click.echo(f"Watermark: {result.watermark}")
+        return
+
+    run_on_dataset(
+        source,
+        output,
+        lambda frame: engine.label(frame, definitions, fuse=fuse),
+        streaming,
+        workers,
+    )
+
+
+@cli.command("explain")
+@click.argument("source", metavar="INPUT")
+@profile_options
+@click.option(
+    "-d",
+    "--definition",
+    "definition_file",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="Path to the machine-readable definition (JSON).",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+def explain_definition(
+    source,
+    mapping_file,
+    profile_name,
+    skip_unresolvable,
+    dictionary_max_values,
+    definition_file,
+    as_json,
+):
+    """
+    Report rows matched, selectivity and time of every criterion of a definition.
+
+    Each criterion, nested groups included, is evaluated on its own over the
+    whole dataset, so this is meant for diagnosing a definition. Criteria that
+    cannot be evaluated with the profile are reported as skipped.
+
+    INPUT: A CSV, Parquet or NDJSON file, a glob pattern (quote it) or a
+    directory, such as a hive-partitioned one, which is searched recursively.
+    """
+    from opensyndrome.batch import scan_partitions
+
+    engine = load_engine(
+        mapping_file, profile_name, skip_unresolvable, dictionary_max_values
+    )
+    try:
+        osd_definition = json.loads(Path(definition_file).read_text())
+    except json.JSONDecodeError as e:
+        raise click.BadParameter(
+            f"Invalid JSON: {definition_file}: {e}", param_hint="--definition"
+        )
+    try:
+        explanation = engine.explain(scan_partitions(source), osd_definition)
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="INPUT")
+    click.echo(explanation.to_json(indent=2) if as_json else explanation.format())
+
+
+@cli.command("list")
+@click.argument(
+    "directory",
+    type=click.Path(exists=True, file_okay=False),
+    default=DEFINITIONS_DIR,
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the list as JSON.")
+def list_definitions(directory, as_json):
+    """
+    List the definitions in a directory with their title, location and version.
+
+    DIRECTORY: Searched recursively for definitions. Defaults to the downloaded
+    definitions. Its index is updated with the files changed since the last run.
+    """
+    with DefinitionCatalog(directory) as catalog:
+        entries = catalog.entries()
+    if as_json:
+        click.echo(
+            json.dumps(
+                [
+                    {
+                        "name": entry.name,
+                        "path": str(entry.path),
+                        "title": entry.title,
+                        "location": entry.location,
+                        "version": entry.version,
+                        "keywords": list(entry.keywords),
+                    }
+                    for entry in entries
+                ],
+                indent=2,
+            )
+        )
+        return
+    for entry in entries:
+        details = ", ".join(filter(None, [entry.location, entry.version]))
+        line = f"{entry.name}: {entry.title}"
+        click.echo(f"{line} ({details})" if details else line)
+
+
+@cli.command("pack")
+@click.argument(
+    "directory",
+    type=click.Path(exists=True, file_okay=False),
+    default=DEFINITIONS_DIR,
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Bundle to write: .ndjson, or .ndjson.zst to compress it with zstd.",
+)
+def pack_definitions(directory, output):
+    """
+    Pack the definitions of a directory into a single bundle file.
+
+    DIRECTORY: Searched recursively for definitions. Defaults to the downloaded
+    definitions.
+
+    A bundle holds one definition per line (NDJSON). `validate`, `filter` and
+    `label` stream it through a single file instead of opening one file per
+    definition.
+    """
+    if not is_bundle(output):
+        raise click.BadParameter(
+            f"Expected a file ending with {' or '.join(BUNDLE_SUFFIXES)}.",
+            param_hint="--output",
+        )
+    start = time.perf_counter()
+    try:
+        count = pack(directory, output)
+    except json.JSONDecodeError as e:
+        raise click.ClickException(f"Invalid definition in {directory}: {e}")
+    except ImportError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        click.style(
+            f"{count} definitions packed into {output} "
+            f"in {time.perf_counter() - start:.2f}s",
+            fg="green",
+        )
+    )
+
+
 def main():
     cli()
 
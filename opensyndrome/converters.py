@@ -9,6 +9,9 @@ from dotenv import load_dotenv
 from ollama import chat
 
 from opensyndrome.artifacts import get_schema_filepath
+from opensyndrome.bundle import is_bundle, iter_bundle
+from opensyndrome.cache import ResponseCache, request_key
+from opensyndrome.catalog import DefinitionCatalog
 from opensyndrome.schema import OpenSyndromeCaseDefinitionSchema
 
 load_dotenv()
@@ -16,19 +19,20 @@ logger = logging.getLogger(__name__)
 DEFAULT_MODEL = "mistral"
 
 
-def load_examples(examples_dir: Path, random_k=None):
-    json_definitions = {}
-    for raw_json in examples_dir.glob("**/*"):
-        if not raw_json.name.endswith(".json"):
-            continue
-        if raw_json.read_text() != "":
-            content = json.loads(raw_json.read_text())
-            if content:
-                json_definitions[raw_json.stem] = content
+def load_examples(examples_dir: Path, random_k=None, seed=None):
+    """Examples for the prompt, from a directory of definitions or a bundle.
 
-    definitions = list(json_definitions.values())
+    With *random_k*, that many examples are sampled, the same ones for the
+    same *seed*.
+    """
+    if is_bundle(examples_dir):
+        loaded = {b.name: b.definition for b in iter_bundle(examples_dir)}
+    else:
+        with DefinitionCatalog(Path(examples_dir)) as catalog:
+            loaded = catalog.load()
+    definitions = [content for content in loaded.values() if content]
     if random_k:
-        definitions = random.sample(definitions, random_k)
+        definitions = random.Random(seed).sample(definitions, random_k)
     examples = "\n".join(
         f"- {json.dumps(_definition)}" for _definition in definitions if _definition
     )
@@ -129,14 +133,43 @@ def _drop_regex_pattern(node: dict):
                     _drop_regex_pattern(item)
 
 
+def _chat(prompt: str, model: str, format=None, cache=True) -> str:
+    """Content of the response of *model* to *prompt*.
+
+    Responses are cached by request in a :class:`ResponseCache`, so the same
+    prompt sent to the same model with the same format and options is only
+    run once; pass ``cache=False`` to always run it (the new response is
+    cached all the same).
+    """
+    request = {
+        "messages": [{"role": "user", "content": prompt}],
+        "model": model,
+        "format": format,
+        "options": {"temperature": 0},
+    }
+    key = request_key(**request)
+    with ResponseCache() as responses:
+        content = responses.get(key) if cache else None
+        if content is None:
+            content = chat(**request, stream=False).message.content
+            responses.put(key, model, content)
+        else:
+            logger.info(f"Using the cached response of {model}")
+    return content
+
+
 def generate_machine_readable_format(
-    human_readable_definition, model=DEFAULT_MODEL, language="American English"
+    human_readable_definition,
+    model=DEFAULT_MODEL,
+    language="American English",
+    cache=True,
 ):
     if not human_readable_definition:
         raise ValueError("Human-readable definition cannot be empty.")
 
     examples_dir = files("opensyndrome").joinpath("examples")
-    examples = load_examples(examples_dir, 3)
+    # the same examples for the same text, so that its prompt can be cached
+    examples = load_examples(examples_dir, 3, seed=human_readable_definition)
     formatted_prompt = PROMPT_TO_MACHINE_READABLE_FORMAT.format(
         examples=examples,
         human_readable_definition=human_readable_definition,
@@ -145,15 +178,9 @@ def generate_machine_readable_format(
 
     json_schema = OpenSyndromeCaseDefinitionSchema.model_json_schema()
     _drop_regex_pattern(json_schema)
-    response = chat(
-        messages=[{"role": "user", "content": formatted_prompt}],
-        model=model,
-        format=json_schema,
-        options={"temperature": 0},
-        stream=False,
-    )
+    content = _chat(formatted_prompt, model, format=json_schema, cache=cache)
 
-    machine_readable_definition = json.loads(response.message.content)
+    machine_readable_definition = json.loads(content)
     if isinstance(machine_readable_definition, list):
         if len(machine_readable_definition) > 1:
             logger.warning("More than one definition generated...")
@@ -175,7 +202,10 @@ def _exclude_metadata_fields(definition: dict):
 
 
 def generate_human_readable_format(
-    machine_readable_definition, model=DEFAULT_MODEL, language="American English"
+    machine_readable_definition,
+    model=DEFAULT_MODEL,
+    language="American English",
+    cache=True,
 ):
     if not machine_readable_definition:
         raise ValueError("Machine-readable definition cannot be empty.")
@@ -186,11 +216,4 @@ def generate_human_readable_format(
             machine_readable_definition
         ),
     )
-    response = chat(
-        messages=[{"role": "user", "content": formatted_prompt}],
-        model=model,
-        options={"temperature": 0},
-        stream=False,
-    )
-    human_readable_definition = response.message.content
-    return human_readable_definition
+    return _chat(formatted_prompt, model, cache=cache)
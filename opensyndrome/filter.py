@@ -1,6 +1,14 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import Any
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterator, NamedTuple, TypeVar
 import polars as pl
 
 from opensyndrome import schema
@@ -20,6 +28,8 @@ _DTYPE_MAP: dict[str, type[pl.DataType]] = {
     "datetime": pl.Datetime,
 }
 
+FrameT = TypeVar("FrameT", pl.DataFrame, pl.LazyFrame)
+
 _OPERATOR_MAP = {
     ">": lambda expr, val: expr > val,
     ">=": lambda expr, val: expr >= val,
@@ -38,6 +48,14 @@ class UnresolvableCriterion(Exception):
     pass
 
 
+class InvalidPattern(Exception):
+    pass
+
+
+class CircularReference(Exception):
+    pass
+
+
 @dataclass
 class ColumnSpec:
     """Typed descriptor for a single dataset column.
@@ -55,8 +73,9 @@ class ColumnSpec:
         OSD attribute name (e.g. ``"age"``, ``"sex"``). Required for
         ``demographic_criteria`` and ``diagnostic_test`` columns.
     system:
-        Coding system identifier (e.g. ``"ICD-10"``, ``"CID-10"``). Optional,
-        reserved for future use (e.g. punctuation-tolerant matching per system).
+        Coding system identifier (e.g. ``"ICD-10"``, ``"CID-10"``). Optional.
+        Only used when building the normalized code index
+        (:meth:`OSDEngine.add_code_index`), where ICD/CID codes are upper-cased.
         Not used for column selection — all ``diagnosis`` columns receive all
         code criteria regardless of system.
     """
@@ -140,6 +159,20 @@ def load_profile(yaml_data: dict, profile_name: str) -> ProfileData:
     raise KeyError(f"Profile '{profile_name}' not found in mapping.")
 
 
+def collect(
+    frame: pl.DataFrame | pl.LazyFrame, *, streaming: bool = True
+) -> pl.DataFrame:
+    """Materialize the result of :meth:`OSDEngine.filter` or :meth:`OSDEngine.label`.
+
+    Eager frames are returned as-is. Lazy frames are collected with the streaming
+    engine by default, so scans built with ``pl.scan_parquet``/``pl.scan_csv`` are
+    processed in batches with bounded memory.
+    """
+    if isinstance(frame, pl.DataFrame):
+        return frame
+    return frame.collect(engine="streaming" if streaming else "auto")
+
+
 def _cast(
     expr: pl.Expr, col_name: str, dtype_str: str, df_schema: dict[str, pl.DataType]
 ) -> pl.Expr:
@@ -178,13 +211,316 @@ def _code_to_regex(code: str) -> str:
     return f"^{code}(\\..+)?$"
 
 
+# JS regex flags (as allowed by the schema) with a Rust-regex inline equivalent;
+# ``x`` is not a JS flag but has always been accepted
+_INLINE_FLAGS = "imsx"
+# characters with a special meaning in a regex, outside of escapes
+_REGEX_METACHARACTERS = frozenset(".^$*+?{}[]()|\\")
+_ESCAPED_CHARACTER = re.compile(r"\\(.)")
+# codes without regex syntax, e.g. ``A90`` or ``U07-1``
+_PLAIN_CODE = re.compile(r"[\w-]+")
+
+
 def _apply_flags(pattern: str, flags: str) -> str:
-    """Prepend inline regex flags (e.g. ``(?i)``) to *pattern*."""
-    inline = "".join(f"(?{f})" for f in flags if f in "imsxy")
-    return f"{inline}{pattern}" if inline else pattern
+    """Translate JS-style regex *flags* into inline flags of *pattern*.
+
+    - ``i``, ``m``, ``s`` (and ``x``) become inline flags, e.g. ``(?i)``;
+    - ``y`` (sticky) anchors the match at the start of the value;
+    - ``g`` (global) and ``u`` (unicode) do not change whether a value matches,
+      as Polars regexes are always Unicode-aware, and are dropped.
+
+    Unknown flags are ignored.
+    """
+    if "y" in flags:
+        pattern = f"\\A(?:{pattern})"
+    inline = "".join(f"(?{f})" for f in dict.fromkeys(flags) if f in _INLINE_FLAGS)
+    return f"{inline}{pattern}"
+
+
+def _unescape_literal(pattern: str) -> str | None:
+    """Text matched by *pattern* if it is a plain literal, otherwise ``None``.
 
+    Escaped punctuation (``A\\.90``) counts as literal; escapes such as
+    ``\\d`` or ``\\b`` do not.
+    """
+    if any(escaped.isalnum() for escaped in _ESCAPED_CHARACTER.findall(pattern)):
+        return None
+    unescaped = _ESCAPED_CHARACTER.sub("", pattern)
+    if _REGEX_METACHARACTERS & set(unescaped):
+        return None
+    return _ESCAPED_CHARACTER.sub(r"\1", pattern)
+
+
+_LITERAL_MATCHERS: dict[str, Callable[[pl.Expr, str], pl.Expr]] = {
+    "contains": lambda values, text: values.str.contains(text, literal=True),
+    "starts_with": lambda values, text: values.str.starts_with(text),
+    "ends_with": lambda values, text: values.str.ends_with(text),
+    "equals": lambda values, text: values == text,
+}
 
-def _build_code_expr(criterion: dict, columns: list[ColumnSpec]) -> pl.Expr:
+
+@dataclass(frozen=True)
+class CompiledPattern:
+    """A validated regex pattern, ready to be passed to Polars.
+
+    Attributes
+    ----------
+    pattern:
+        Regex with its flags inlined (see :func:`_apply_flags`).
+    literal:
+        The text the pattern matches when it contains no regex syntax besides
+        ``^``/``$`` anchors and no flag changes its meaning. ``None`` otherwise.
+    match:
+        How *literal* is searched: ``contains``, ``starts_with`` (``^text``),
+        ``ends_with`` (``text$``) or ``equals`` (``^text$``). ``regex`` when
+        the pattern is not a literal.
+    """
+
+    pattern: str
+    literal: str | None = None
+    match: str = "regex"
+
+    def contains(self, values: pl.Expr) -> pl.Expr:
+        """Whether *values* contain a match, avoiding the regex engine if possible."""
+        if self.literal is None:
+            return values.str.contains(self.pattern)
+        return _LITERAL_MATCHERS[self.match](values, self.literal)
+
+
+def _is_escaped(pattern: str, index: int) -> bool:
+    """Whether the character at *index* is preceded by an odd number of backslashes."""
+    backslashes = len(pattern[:index]) - len(pattern[:index].rstrip("\\"))
+    return backslashes % 2 == 1
+
+
+def _literal_match(pattern: str, flags: str) -> tuple[str | None, str]:
+    """Split *pattern* into a literal and how it is anchored, if possible."""
+    # case-insensitive patterns stay regexes: lower-casing every value before a
+    # literal search is slower than the regex engine's own case folding
+    if set(flags) & set("ix"):
+        return None, "regex"
+    # in multi-line mode ^ and $ also match around line breaks
+    starts = ("\\A",) if "m" in flags else ("^", "\\A")
+    ends = ("\\z",) if "m" in flags else ("$", "\\z")
+    at_start = "y" in flags
+    for anchor in starts:
+        if pattern.startswith(anchor):
+            pattern, at_start = pattern[len(anchor) :], True
+            break
+    at_end = False
+    for anchor in ends:
+        # the anchor is escaped when its first character is: \$ and \\z are
+        # literals
+        start = len(pattern) - len(anchor)
+        if pattern.endswith(anchor) and not _is_escaped(pattern, start):
+            pattern, at_end = pattern[: -len(anchor)], True
+            break
+    literal = _unescape_literal(pattern)
+    if literal is None:
+        return None, "regex"
+    if at_start and at_end:
+        return literal, "equals"
+    if at_start:
+        return literal, "starts_with"
+    if at_end:
+        return literal, "ends_with"
+    return literal, "contains"
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_pattern(pattern: str, flags: str = "") -> CompiledPattern:
+    """Validate and normalize a regex *pattern* with JS-style *flags*, once.
+
+    Patterns are checked with the regex engine Polars uses, so syntax it does
+    not support (look-arounds, back-references) is reported when a definition
+    is compiled rather than when the query is collected. Results are cached,
+    so criteria sharing a pattern are only validated once.
+
+    Literal patterns, optionally anchored, are detected so they can be matched
+    with a literal search, ``starts_with``, ``ends_with`` or an equality
+    instead of the regex engine.
+
+    Raises
+    ------
+    InvalidPattern
+        If Polars cannot compile the pattern.
+    """
+    normalized = _apply_flags(pattern, flags)
+    try:
+        pl.select(pl.lit("", dtype=pl.String).str.contains(normalized))
+    except pl.exceptions.ComputeError as e:
+        reasons = [line for line in str(e).splitlines() if line.startswith("error:")]
+        reason = reasons[0].removeprefix("error:").strip() if reasons else str(e)
+        raise InvalidPattern(f"Invalid regex pattern '{pattern}': {reason}.") from None
+    literal, match = _literal_match(pattern, flags)
+    return CompiledPattern(normalized, literal, match)
+
+
+_CODE_INDEX_PREFIX = "__osd_code__"
+
+# coding systems whose codes are case-insensitive, normalized to upper case
+_UPPERCASE_CODE_SYSTEMS = ("ICD", "CID")
+
+
+def code_index_name(col_name: str) -> str:
+    """Name of the normalized code column built by :meth:`OSDEngine.add_code_index`."""
+    return f"{_CODE_INDEX_PREFIX}{col_name}"
+
+
+def _normalize_code_expr(spec: ColumnSpec) -> pl.Expr:
+    """Normalize a diagnosis column once: strip whitespace, upper-case ICD/CID codes.
+
+    The result is Categorical, so code predicates can be evaluated once per
+    distinct code instead of once per row (see :func:`_match_dictionary`).
+    """
+    expr = pl.col(spec.col_name).str.strip_chars()
+    if spec.system and spec.system.upper().startswith(_UPPERCASE_CODE_SYSTEMS):
+        expr = expr.str.to_uppercase()
+    return expr.cast(pl.Categorical).alias(code_index_name(spec.col_name))
+
+
+def _match_dictionary(
+    expr: pl.Expr, predicate: Callable[[pl.Expr], pl.Expr]
+) -> pl.Expr:
+    """Evaluate *predicate* once per distinct value of *expr* and map it back to rows."""
+    # order must be stable: the distinct values are computed for the mask and
+    # for the values it filters
+    values = expr.unique(maintain_order=True)
+    return expr.is_in(values.filter(predicate(values.cast(pl.String))).implode())
+
+
+def _match_column(
+    col_name: str,
+    predicate: Callable[[pl.Expr], pl.Expr],
+    dictionary_columns: frozenset[str] = frozenset(),
+) -> pl.Expr:
+    """Apply a string *predicate* to a column, per distinct value if it is listed
+    in *dictionary_columns*, per row otherwise."""
+    if col_name in dictionary_columns:
+        return _match_dictionary(pl.col(col_name), predicate)
+    return predicate(pl.col(col_name))
+
+
+def _match_code_column(
+    spec: ColumnSpec,
+    predicate: Callable[[pl.Expr], pl.Expr],
+    df_schema: dict[str, pl.DataType] | None,
+    dictionary_columns: frozenset[str] = frozenset(),
+) -> pl.Expr:
+    """Apply a code *predicate* to the stripped values of a diagnosis column.
+
+    Uses the pre-normalized code index column when the frame carries one.
+    """
+    index = code_index_name(spec.col_name)
+    if df_schema and index in df_schema:
+        return _match_dictionary(pl.col(index), predicate)
+    return _match_column(
+        spec.col_name,
+        lambda values: predicate(values.str.strip_chars()),
+        dictionary_columns,
+    )
+
+
+# terms folded into one bitset column, each from its own multi-pattern scan
+_TERMS_PER_SCAN = 64
+
+
+class _TermPool:
+    """Literal terms searched in each column, matched with a single scan.
+
+    A first compilation pass over all definitions registers the literal
+    ``contains`` patterns of every column (see :meth:`match`). :meth:`freeze`
+    then keeps the columns with at least *min_terms* distinct terms, and in
+    the second pass their criteria compile to a bit test on a temporary
+    column holding, for every row, the set of terms it contains. That column
+    comes from one multi-pattern (Aho-Corasick) scan of the text with
+    ``str.extract_many`` per :data:`_TERMS_PER_SCAN` terms, instead of one
+    scan per term.
+    """
+
+    prefix = "__osd_terms_"
+
+    def __init__(self, min_terms: int) -> None:
+        self.min_terms = min_terms
+        self.terms: dict[str, dict[str, int]] = {}
+        self.frozen = False
+
+    def match(self, col_name: str, pattern: CompiledPattern) -> pl.Expr | None:
+        """Bit test for *pattern* on *col_name*, or ``None`` to match it on its own."""
+        if pattern.match != "contains" or not pattern.literal:
+            return None
+        if not self.frozen:
+            terms = self.terms.setdefault(col_name, {})
+            terms.setdefault(pattern.literal, len(terms))
+            return None
+        if col_name not in self.terms:
+            return None
+        scan, bit = divmod(self.terms[col_name][pattern.literal], _TERMS_PER_SCAN)
+        return (pl.col(self._alias(col_name, scan)) & (1 << bit)) != 0
+
+    def freeze(self) -> None:
+        self.terms = {
+            col_name: terms
+            for col_name, terms in self.terms.items()
+            if len(terms) >= self.min_terms
+        }
+        self.frozen = True
+
+    def _alias(self, col_name: str, scan: int) -> str:
+        return f"{self.prefix}{list(self.terms).index(col_name)}_{scan}"
+
+    def columns(self) -> dict[str, pl.Expr]:
+        """Temporary bitset columns the compiled criteria read from."""
+        columns = {}
+        for col_name, terms in self.terms.items():
+            patterns = list(terms)
+            for scan, start in enumerate(range(0, len(patterns), _TERMS_PER_SCAN)):
+                chunk = patterns[start : start + _TERMS_PER_SCAN]
+                bits = [1 << bit for bit in range(len(chunk))]
+                # distinct matches, so that summing their bits is a bitwise OR
+                matched = pl.col(col_name).str.extract_many(chunk, overlapping=True)
+                columns[self._alias(col_name, scan)] = (
+                    matched.list.unique()
+                    .list.eval(
+                        pl.element().replace_strict(chunk, bits, return_dtype=pl.UInt64)
+                    )
+                    .list.sum()
+                )
+        return columns
+
+
+def _match_pattern(
+    col_name: str,
+    pattern: CompiledPattern,
+    dictionary_columns: frozenset[str] = frozenset(),
+    terms: _TermPool | None = None,
+) -> pl.Expr:
+    """Match *pattern* on a column, through the *terms* scan when it covers it."""
+    if terms is not None and col_name not in dictionary_columns:
+        expr = terms.match(col_name, pattern)
+        if expr is not None:
+            return expr
+    return _match_column(col_name, pattern.contains, dictionary_columns)
+
+
+def _code_predicate(code: str) -> Callable[[pl.Expr], pl.Expr]:
+    """Predicate matching a single OSD *code* on a column of codes.
+
+    A plain code followed by a trailing ``%`` wildcard (``J1%``) is matched
+    with ``starts_with``; other codes go through :func:`_code_to_regex`.
+    """
+    prefix = code[:-1]
+    if code.endswith("%") and _PLAIN_CODE.fullmatch(prefix):
+        return lambda values: values.str.starts_with(prefix)
+    return compile_pattern(_code_to_regex(code)).contains
+
+
+def _build_code_expr(
+    criterion: dict,
+    columns: list[ColumnSpec],
+    df_schema: dict[str, pl.DataType] | None = None,
+    dictionary_columns: frozenset[str] = frozenset(),
+) -> pl.Expr:
     """Build a Polars expression matching a diagnosis criterion with a ``code`` object.
 
     Applies the code pattern to **all** ``diagnosis`` columns. The ``code.system``
@@ -194,21 +530,63 @@ def _build_code_expr(criterion: dict, columns: list[ColumnSpec]) -> pl.Expr:
     to handle data quality issues like ``"A90 "``.
     """
     raw_code = criterion["code"]["code"]
-    pattern = _code_to_regex(raw_code)
+    predicate = _code_predicate(raw_code)
 
     matching_cols = [c for c in columns if c.concept == "diagnosis"]
     if not matching_cols:
         raise UnresolvableCriterion("No column mapped to concept 'diagnosis'.")
 
     exprs = [
-        pl.col(c.col_name).str.strip_chars().str.contains(pattern)
+        _match_code_column(c, predicate, df_schema, dictionary_columns)
         for c in matching_cols
     ]
     return pl.any_horizontal(exprs)
 
 
+def _build_codes_expr(
+    criteria: list[dict],
+    columns: list[ColumnSpec],
+    df_schema: dict[str, pl.DataType] | None = None,
+    dictionary_columns: frozenset[str] = frozenset(),
+) -> pl.Expr:
+    """Build one Polars expression matching *any* of several diagnosis code criteria.
+
+    Equivalent to OR-ing :func:`_build_code_expr` over *criteria*, but each
+    ``diagnosis`` column is stripped once and scanned once:
+
+    - when every code is plain (no ``%`` wildcard, no punctuation), the column is
+      looked up as a set with ``is_in`` after dropping the dot-separated sub-code
+      (``A90.1`` → ``A90``);
+    - otherwise all codes are merged into a single anchored alternation regex.
+    """
+    codes = list(dict.fromkeys(c["code"]["code"] for c in criteria))
+
+    matching_cols = [c for c in columns if c.concept == "diagnosis"]
+    if not matching_cols:
+        raise UnresolvableCriterion("No column mapped to concept 'diagnosis'.")
+
+    if all(_PLAIN_CODE.fullmatch(code) for code in codes):
+
+        def predicate(values: pl.Expr) -> pl.Expr:
+            return values.str.replace(r"\..+$", "").is_in(codes)
+
+    else:
+        predicate = compile_pattern(
+            "|".join(f"(?:{_code_to_regex(code)})" for code in codes)
+        ).contains
+
+    return pl.any_horizontal(
+        _match_code_column(c, predicate, df_schema, dictionary_columns)
+        for c in matching_cols
+    )
+
+
 def _build_text_expr(
-    criterion: dict, columns: list[ColumnSpec], concept: str
+    criterion: dict,
+    columns: list[ColumnSpec],
+    concept: str,
+    dictionary_columns: frozenset[str] = frozenset(),
+    terms: _TermPool | None = None,
 ) -> pl.Expr:
     """Build a Polars expression for free-text matching (symptom, epidemiological_history, etc.).
 
@@ -216,15 +594,18 @@ def _build_text_expr(
     Supports ``regex_flags`` (e.g. ``"i"`` for case-insensitive).
     Searches all columns mapped to the given concept and combines with OR.
     """
-    pattern = criterion.get("regex_pattern") or criterion.get("name", "")
-    pattern = _apply_flags(pattern, criterion.get("regex_flags", ""))
+    pattern = compile_pattern(
+        criterion.get("regex_pattern") or criterion.get("name", ""),
+        criterion.get("regex_flags") or "",
+    )
 
     matching_cols = [c for c in columns if c.concept == concept]
     if not matching_cols:
         raise UnresolvableCriterion(f"No column mapped to concept '{concept}'.")
 
     exprs = [
-        pl.col(c.col_name).str.contains(pattern, literal=False) for c in matching_cols
+        _match_pattern(c.col_name, pattern, dictionary_columns, terms)
+        for c in matching_cols
     ]
     return pl.any_horizontal(exprs)
 
@@ -234,6 +615,8 @@ def _build_attr_expr(
     columns: list[ColumnSpec],
     value_encodings: dict[str, dict[str, str]] | None = None,
     df_schema: dict[str, pl.DataType] | None = None,
+    dictionary_columns: frozenset[str] = frozenset(),
+    terms: _TermPool | None = None,
 ) -> pl.Expr:
     """Build a Polars expression for a demographic or diagnostic-test criterion.
 
@@ -250,11 +633,11 @@ def _build_attr_expr(
     spec = matching[0]
 
     if operator == "regex":
-        pattern = _apply_flags(
+        pattern = compile_pattern(
             criterion.get("regex_pattern") or str(value),
-            criterion.get("regex_flags", ""),
+            criterion.get("regex_flags") or "",
         )
-        return pl.col(spec.col_name).str.contains(pattern, literal=False)
+        return _match_pattern(spec.col_name, pattern, dictionary_columns, terms)
 
     if operator not in _OPERATOR_MAP:
         raise InvalidOperator(
@@ -292,44 +675,569 @@ def _combine(
     )
 
 
+@dataclass
+class _CompileContext:
+    """Options threaded through :func:`_parse_criterion` for a single compilation.
+
+    Attributes
+    ----------
+    leaf_hook:
+        Called with every leaf predicate (code, attribute or text match); its
+        return value replaces the leaf in the compiled tree.
+    dictionary_columns:
+        Columns whose string predicates are evaluated once per distinct value
+        (see :func:`_match_dictionary`) instead of once per row.
+    terms:
+        Literal terms matched together per column, see :class:`_TermPool`.
+    syndromes:
+        Resolves ``syndrome`` criteria to other definitions, see
+        :class:`_SyndromeResolver`.
+    """
+
+    leaf_hook: Callable[[pl.Expr], pl.Expr] | None = None
+    dictionary_columns: frozenset[str] = frozenset()
+    terms: _TermPool | None = None
+    syndromes: _SyndromeResolver | None = None
+
+    def leaf(self, expr: pl.Expr) -> pl.Expr:
+        return expr if self.leaf_hook is None else self.leaf_hook(expr)
+
+
 def _parse_criterion(
     criterion: dict,
     columns: list[ColumnSpec],
     value_encodings: dict[str, dict[str, str]] | None = None,
     df_schema: dict[str, pl.DataType] | None = None,
+    context: _CompileContext | None = None,
 ) -> pl.Expr:
+    context = context or _CompileContext()
     ctype = criterion.get("type")
 
     if ctype is None:
         raise UnresolvableCriterion("Criterion is missing the required 'type' field.")
 
     if ctype == "criterion":
-        sub_exprs = [
-            _parse_criterion(c, columns, value_encodings, df_schema)
-            for c in criterion.get("values", [])
-        ]
+        values = criterion.get("values", [])
         logical_operator = criterion.get("logical_operator", "AND")
+        sub_exprs = []
+        # sibling code criteria under OR are matched together, scanning each
+        # diagnosis column once instead of once per code
+        if (logical_operator or "").upper().strip() == "OR":
+            codes = [c for c in values if "code" in c and c.get("type") is not None]
+            if len(codes) > 1:
+                sub_exprs.append(
+                    context.leaf(
+                        _build_codes_expr(
+                            codes, columns, df_schema, context.dictionary_columns
+                        )
+                    )
+                )
+                merged = {id(c) for c in codes}
+                values = [c for c in values if id(c) not in merged]
+        sub_exprs += [
+            _parse_criterion(c, columns, value_encodings, df_schema, context)
+            for c in values
+        ]
         n_args = criterion.get("logical_operator_arguments")
         n = n_args[0] if n_args else None
         return _combine(sub_exprs, logical_operator, n)
 
+    if ctype == "syndrome" and context.syndromes is not None:
+        expr = context.syndromes.resolve(criterion, context)
+        if expr is not None:
+            return expr
+
     if "code" in criterion:
-        return _build_code_expr(criterion, columns)
+        return context.leaf(
+            _build_code_expr(criterion, columns, df_schema, context.dictionary_columns)
+        )
 
     # if the criterion carries attribute + operator, treat it as a measurable attribute
     # (e.g. body_temperature >= 39); otherwise match by name/regex against text columns.
     if "attribute" in criterion and "operator" in criterion:
-        return _build_attr_expr(criterion, columns, value_encodings, df_schema)
+        return context.leaf(
+            _build_attr_expr(
+                criterion,
+                columns,
+                value_encodings,
+                df_schema,
+                context.dictionary_columns,
+                context.terms,
+            )
+        )
 
     if ctype in _VALID_CONCEPTS:
-        return _build_text_expr(criterion, columns, ctype)
+        return context.leaf(
+            _build_text_expr(
+                criterion, columns, ctype, context.dictionary_columns, context.terms
+            )
+        )
 
     raise UnresolvableCriterion(f"Unknown criterion type: '{ctype}'.")
 
 
+# rows read to estimate the number of distinct values of a column
+_DICTIONARY_SAMPLE_SIZE = 100_000
+# a column whose values appear less than twice on average in the sample is
+# still revealing new values, so its cardinality cannot be bounded from it
+_DICTIONARY_MAX_SAMPLE_RATIO = 0.5
+# rows sampled to estimate predicate selectivity for short-circuit filtering
+_SELECTIVITY_SAMPLE_SIZE = 10_000
+
+
+def stable_hash(*parts: Any) -> str:
+    """Return a SHA-256 hex digest of *parts* that is stable across processes.
+
+    Dict keys are sorted and non-JSON values (e.g. Polars dtypes, dates) are
+    rendered through ``str`` so the digest only depends on content.
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _schema_fingerprint(df_schema: dict[str, pl.DataType]) -> list[tuple[str, str]]:
+    return [(name, str(dtype)) for name, dtype in df_schema.items()]
+
+
+@dataclass(eq=False)
+class CompiledDefinition:
+    """Polars expressions compiled from a single OSD definition.
+
+    Attributes
+    ----------
+    key:
+        Cache key the definition was compiled under (definition content,
+        profile and dataset schema).
+    inclusion:
+        AND of all resolvable inclusion criteria, or ``None`` if there are none.
+    exclusion:
+        AND of all resolvable exclusion criteria, or ``None`` if there are none.
+    conjuncts:
+        Resolvable inclusion criteria as separate expressions that must all
+        hold, with top-level AND groups flattened into their children.
+    """
+
+    key: str
+    inclusion: pl.Expr | None
+    exclusion: pl.Expr | None
+    conjuncts: list[pl.Expr] = field(default_factory=list)
+
+    @property
+    def predicate(self) -> pl.Expr | None:
+        """Rows matching the inclusion criteria and not the exclusion criteria.
+
+        ``None`` when the definition has no resolvable criteria at all.
+        """
+        expr = self.inclusion
+        if self.exclusion is not None:
+            negated = ~self.exclusion
+            expr = negated if expr is None else expr & negated
+        return expr
+
+    @property
+    def stages(self) -> list[pl.Expr]:
+        """Filters that together are equivalent to :attr:`predicate`.
+
+        The :attr:`conjuncts`, followed by the negated exclusion criteria.
+        """
+        stages = list(self.conjuncts)
+        if self.exclusion is not None:
+            stages.append(~self.exclusion)
+        return stages
+
+
+class _SyndromeResolver:
+    """Compiles ``syndrome`` criteria to the definition they refer to.
+
+    A criterion refers to a definition through its ``name``, which is looked up
+    among the names of *definitions* first and their ``title`` second. The
+    referenced definition is compiled with the context of the referring one;
+    its predicate is inlined, or with *shared* becomes a temporary column
+    (see :meth:`stages`) computed once however many criteria refer to it.
+
+    Parameters
+    ----------
+    definitions:
+        Definitions that can be referred to, by name.
+    compile_predicate:
+        Compiles a definition into its predicate, ``None`` when it has no
+        resolvable criteria.
+    shared:
+        Resolve references to temporary columns instead of expressions.
+    """
+
+    prefix = "__osd_syndrome_"
+
+    def __init__(
+        self,
+        definitions: dict[str, dict],
+        compile_predicate: Callable[[dict, _CompileContext], pl.Expr | None],
+        *,
+        shared: bool = False,
+    ) -> None:
+        self.definitions = definitions
+        self.compile_predicate = compile_predicate
+        self.shared = shared
+        self.titles: dict[str, str] = {}
+        for name, osd_def in definitions.items():
+            self.titles.setdefault(osd_def.get("title"), name)
+        self.resolved: dict[str, pl.Expr] = {}
+        self.columns: dict[str, pl.Expr] = {}
+        self._stack: list[str] = []
+
+    def lookup(self, criterion: dict) -> str | None:
+        """Name of the definition *criterion* refers to, ``None`` if unknown."""
+        name = criterion.get("name")
+        if name in self.definitions:
+            return name
+        return self.titles.get(name)
+
+    @contextmanager
+    def compiling(self, name: str) -> Iterator[None]:
+        """Mark definition *name* as being compiled, to detect cycles."""
+        if name in self._stack:
+            cycle = self._stack[self._stack.index(name) :] + [name]
+            raise CircularReference(
+                f"Syndrome definitions refer to each other: {' -> '.join(cycle)}."
+            )
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+
+    def resolve(self, criterion: dict, context: _CompileContext) -> pl.Expr | None:
+        """Predicate of the definition *criterion* refers to, ``None`` if unknown."""
+        name = self.lookup(criterion)
+        if name is None:
+            return None
+        if name in self.resolved:
+            return self.resolved[name]
+        with self.compiling(name):
+            expr = self.compile_predicate(self.definitions[name], context)
+        if expr is None:
+            raise UnresolvableCriterion(
+                f"Syndrome '{name}' has no resolvable criteria."
+            )
+        if self.shared:
+            alias = f"{self.prefix}{len(self.columns)}"
+            self.columns[alias] = expr
+            expr = pl.col(alias)
+        self.resolved[name] = expr
+        return expr
+
+    def stages(self, referenced: set[str]) -> list[dict[str, pl.Expr]]:
+        """Shared columns needed by *referenced* columns, in evaluation order.
+
+        Columns of a stage only read columns of earlier stages. *referenced* is
+        updated with every column read, directly or not.
+        """
+        needed = [alias for alias in self.columns if alias in referenced]
+        while needed:
+            for col in self.columns[needed.pop()].meta.root_names():
+                if col not in referenced:
+                    referenced.add(col)
+                    if col in self.columns:
+                        needed.append(col)
+        levels: dict[str, int] = {}
+        stages: list[dict[str, pl.Expr]] = []
+        # a definition is added after the ones it refers to
+        for alias, expr in self.columns.items():
+            if alias not in referenced:
+                continue
+            level = max(
+                (levels[col] + 1 for col in expr.meta.root_names() if col in levels),
+                default=0,
+            )
+            levels[alias] = level
+            if level == len(stages):
+                stages.append({})
+            stages[level][alias] = expr
+        return stages
+
+
+class _LeafPool:
+    """Leaf hook that replaces identical leaf predicates by one shared column.
+
+    Leaves are compared through their serialized expression, so two criteria
+    compiling to the same Polars expression (e.g. ``age >= 65`` in several
+    definitions) share a single temporary column.
+    """
+
+    prefix = "__osd_leaf_"
+
+    def __init__(self) -> None:
+        self.leaves: dict[str, tuple[str, pl.Expr]] = {}
+        self.total = 0
+
+    def __call__(self, expr: pl.Expr) -> pl.Expr:
+        self.total += 1
+        key = expr.meta.serialize(format="json")
+        if key not in self.leaves:
+            self.leaves[key] = (f"{self.prefix}{len(self.leaves)}", expr)
+        return pl.col(self.leaves[key][0])
+
+
+@dataclass(frozen=True)
+class FusionReport:
+    """Leaf deduplication statistics of a fused :meth:`OSDEngine.label` run.
+
+    Attributes
+    ----------
+    total_leaves:
+        Leaf predicates found across all definitions.
+    unique_leaves:
+        Distinct leaf predicates actually evaluated.
+    scanned_terms:
+        Literal terms matched through multi-pattern scans instead of one scan
+        each (see ``multi_pattern_threshold`` of :class:`OSDEngine`).
+    """
+
+    total_leaves: int
+    unique_leaves: int
+    scanned_terms: int = 0
+
+    @property
+    def deduplicated(self) -> int:
+        """Number of leaf evaluations saved by sharing identical predicates."""
+        return self.total_leaves - self.unique_leaves
+
+
+@dataclass(eq=False)
+class FusedLabels:
+    """Label expressions for several definitions sharing their leaf predicates.
+
+    Attributes
+    ----------
+    key:
+        Cache key the definitions were compiled under.
+    terms:
+        Temporary column name → bitset of the literal terms found in a text
+        column, computed before the leaves that read from it.
+    syndromes:
+        Stages of temporary columns holding the definitions referred to by
+        ``syndrome`` criteria, computed after the leaves they read from.
+    leaves:
+        Temporary column name → leaf predicate, each evaluated once.
+    labels:
+        Definition name → boolean expression reading from the leaf columns.
+    report:
+        Deduplication statistics.
+    """
+
+    key: str
+    leaves: dict[str, pl.Expr]
+    labels: dict[str, pl.Expr]
+    report: FusionReport
+    terms: dict[str, pl.Expr] = field(default_factory=dict)
+    syndromes: list[dict[str, pl.Expr]] = field(default_factory=list)
+
+
+def _describe_criterion(criterion: dict) -> str:
+    """Short human-readable description of a criterion for :meth:`OSDEngine.explain`."""
+    name = criterion.get("name")
+    if criterion.get("type") == "criterion":
+        values = criterion.get("values", [])
+        operator = (criterion.get("logical_operator") or "AND").upper().strip()
+        n_args = criterion.get("logical_operator_arguments")
+        if operator == "AT_LEAST" and n_args:
+            operator = f"AT_LEAST {n_args[0]}"
+        detail = f"{operator} of {len(values)}"
+    elif isinstance(criterion.get("code"), dict):
+        code = criterion["code"]
+        detail = f"{code.get('system', '')} {code.get('code', '')}".strip()
+    elif "attribute" in criterion and "operator" in criterion:
+        value = criterion.get("regex_pattern") or criterion.get("value")
+        detail = f"{criterion['attribute']} {criterion['operator']} {value}"
+    elif criterion.get("regex_pattern"):
+        detail = f"/{criterion['regex_pattern']}/{criterion.get('regex_flags', '')}"
+    else:
+        detail = None
+    if name and detail:
+        return f"{name} ({detail})"
+    return name or detail or ""
+
+
+@dataclass(eq=False)
+class ExplainNode:
+    """Evaluation statistics of one node of a definition's criteria tree.
+
+    Attributes
+    ----------
+    path:
+        Location of the criterion in the definition, e.g.
+        ``inclusion_criteria[0].values[2]``. The root is ``$``.
+    type:
+        Criterion ``type`` (``criterion`` for groups), or ``definition``,
+        ``inclusion_criteria`` and ``exclusion_criteria`` for the top levels.
+    name:
+        Criterion name with its code, attribute comparison or logical operator.
+    rows:
+        Rows matching the node on its own, or ``None`` if it was not evaluated.
+    selectivity:
+        ``rows`` as a fraction of all rows.
+    seconds:
+        Time spent evaluating the node, including its children and, for lazy
+        frames, reading the columns it needs.
+    error:
+        Why the node could not be compiled (e.g. no column mapped to its
+        concept, or an invalid regex). Such nodes are left out of their
+        parent, as with ``skip_unresolvable=True``.
+    children:
+        Nested criteria.
+    """
+
+    path: str
+    type: str
+    name: str
+    rows: int | None = None
+    selectivity: float | None = None
+    seconds: float | None = None
+    error: str | None = None
+    children: list[ExplainNode] = field(default_factory=list)
+    expr: pl.Expr | None = field(default=None, repr=False)
+
+    def walk(self, depth: int = 0) -> Iterator[tuple[int, ExplainNode]]:
+        """Yield ``(depth, node)`` for this node and its descendants, depth first."""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "path": self.path,
+            "type": self.type,
+            "name": self.name,
+            "rows": self.rows,
+            "selectivity": self.selectivity,
+            "seconds": self.seconds,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+@dataclass(eq=False)
+class Explanation:
+    """Result of :meth:`OSDEngine.explain`.
+
+    Attributes
+    ----------
+    total_rows:
+        Number of rows in the dataset.
+    root:
+        Node of the whole definition, with the inclusion and exclusion criteria
+        as children.
+    """
+
+    total_rows: int
+    root: ExplainNode
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"total_rows": self.total_rows, "root": self.root.to_dict()}
+
+    def to_json(self, **kwargs) -> str:
+        """Serialize to JSON; keyword arguments are passed to :func:`json.dumps`."""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_frame(self) -> pl.DataFrame:
+        """One row per node, depth first, with a ``depth`` column."""
+        return pl.DataFrame(
+            [
+                {"depth": depth, **node.to_dict(), "children": None}
+                for depth, node in self.root.walk()
+            ],
+            schema={
+                "depth": pl.Int64,
+                "path": pl.String,
+                "type": pl.String,
+                "name": pl.String,
+                "rows": pl.Int64,
+                "selectivity": pl.Float64,
+                "seconds": pl.Float64,
+                "error": pl.String,
+            },
+            strict=False,
+        )
+
+    def format(self) -> str:
+        """Render the tree as a text table, one indented line per node."""
+        lines = [f"{'rows':>10} {'selectivity':>11} {'seconds':>9}  criterion"]
+        for depth, node in self.root.walk():
+            if node.rows is None:
+                rows, selectivity, seconds = "-", "-", "-"
+            else:
+                rows = f"{node.rows:,}"
+                selectivity = (
+                    "-" if node.selectivity is None else f"{node.selectivity:.2%}"
+                )
+                seconds = f"{node.seconds:.4f}"
+            label = f"{node.type}: {node.name}" if node.name else node.type
+            line = f"{rows:>10} {selectivity:>11} {seconds:>9}  {'  ' * depth}{label}"
+            if depth > 1:
+                line += f"  [{node.path}]"
+            if node.error:
+                line += f"  (skipped: {node.error})"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.format()
+
+
+class SelectivityEstimate(NamedTuple):
+    """Cost and selectivity of a predicate, measured on a sample of a dataset.
+
+    Attributes
+    ----------
+    selectivity:
+        Fraction of the sampled rows for which the predicate is true.
+    seconds:
+        Time taken to evaluate the predicate on the sample.
+    """
+
+    selectivity: float
+    seconds: float
+
+    @property
+    def rank(self) -> float:
+        """Cost per discarded row; filters run in increasing order of rank.
+
+        Running conjunctive filters in this order minimizes the total work
+        when their selectivities are independent.
+        """
+        return self.seconds / max(1.0 - self.selectivity, 1e-9)
+
+
+class _Registry(NamedTuple):
+    """Definitions ``syndrome`` criteria can refer to, and their content hash."""
+
+    definitions: dict[str, dict]
+    key: str
+
+
+def _with_stages(df: FrameT, stages: list[dict[str, pl.Expr]]) -> FrameT:
+    """Add the columns of each stage in turn, so a stage can read earlier ones."""
+    for stage in stages:
+        df = df.with_columns(expr.alias(alias) for alias, expr in stage.items())
+    return df
+
+
+class CacheInfo(NamedTuple):
+    """Compiled-definition cache statistics, as returned by :meth:`OSDEngine.cache_info`."""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
 class OSDEngine:
     """Compile an OSD definition into Polars filter expressions and apply them.
 
+    An engine can be shared by threads: its caches are guarded by a lock.
+    With concurrent fused labelling, :attr:`last_fusion_report` holds the
+    report of whichever call compiled last.
+
     Parameters
     ----------
     profile:
@@ -338,6 +1246,38 @@ class OSDEngine:
     skip_unresolvable:
         When ``True``, criteria that cannot be evaluated against structured data
         are silently skipped instead of raising :exc:`UnresolvableCriterion`.
+    cache_size:
+        Maximum number of :class:`CompiledDefinition` objects kept in the
+        least-recently-used cache. ``0`` disables caching.
+    code_index:
+        When ``True``, :meth:`filter` and :meth:`label` first normalize every
+        ``diagnosis`` column once into a Categorical code index (see
+        :meth:`add_code_index`) that all code criteria match against, and drop
+        it from the result.
+    dictionary_max_values:
+        Number of distinct values at or below which a string column is
+        considered low-cardinality. Text, code and regex criteria on such
+        columns are evaluated once per distinct value and mapped back to the
+        rows. The number is estimated from the first rows of the frame, lazy
+        or eager (see :meth:`dictionary_columns`); Categorical and Enum
+        columns always qualify. ``None``, the default, disables the strategy.
+        Finding the columns reads the first rows of lazy frames, and the
+        predicates read the distinct values of the whole column, so they are
+        not pushed down into scans: this is meant for eager frames or
+        expensive criteria (e.g. regexes) on long scans, not for cheap ones.
+    short_circuit:
+        When ``True``, :meth:`filter` applies the top-level criteria of a
+        definition as successive filters, cheapest and most selective first
+        (see :meth:`estimate_selectivity`), so expensive predicates such as
+        regexes only run on the rows that survived the earlier ones.
+    multi_pattern_threshold:
+        Number of distinct literal terms (text criteria, and regex attribute
+        criteria, without regex syntax or flags) searched in the same column
+        at or above which fused labelling (see :meth:`fuse`) finds them all
+        with a single multi-pattern scan of the column, instead of one scan
+        per term. ``None`` disables the strategy.
+    definitions:
+        Definitions ``syndrome`` criteria can refer to, see :meth:`register`.
     """
 
     def __init__(
@@ -345,6 +1285,12 @@ class OSDEngine:
         profile: ProfileData | list[ColumnSpec],
         *,
         skip_unresolvable: bool = False,
+        cache_size: int = 128,
+        code_index: bool = False,
+        dictionary_max_values: int | None = None,
+        short_circuit: bool = False,
+        multi_pattern_threshold: int | None = 16,
+        definitions: dict[str, dict] | None = None,
     ) -> None:
         if isinstance(profile, ProfileData):
             self.columns = profile.columns
@@ -353,15 +1299,34 @@ class OSDEngine:
             self.columns = profile
             self.value_encodings = {}
         self.skip_unresolvable = skip_unresolvable
+        self.cache_size = cache_size
+        self.code_index = code_index
+        self.dictionary_max_values = dictionary_max_values
+        self.short_circuit = short_circuit
+        self.multi_pattern_threshold = multi_pattern_threshold
+        self._cache: OrderedDict[str, CompiledDefinition | FusedLabels] = OrderedDict()
+        self._estimates: OrderedDict[str, dict[str, SelectivityEstimate]] = (
+            OrderedDict()
+        )
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # guards the caches and their counters, the engine being shared by the
+        # workers of process_partitions
+        self._lock = threading.Lock()
+        self.last_fusion_report: FusionReport | None = None
+        self._registry = _Registry({}, stable_hash({}))
+        if definitions:
+            self.register(definitions)
 
     def _safe_parse(
         self,
         criterion: dict,
         df_schema: dict[str, pl.DataType],
+        context: _CompileContext | None = None,
     ) -> pl.Expr | None:
         try:
             return _parse_criterion(
-                criterion, self.columns, self.value_encodings, df_schema
+                criterion, self.columns, self.value_encodings, df_schema, context
             )
         except UnresolvableCriterion:
             if self.skip_unresolvable:
@@ -372,15 +1337,527 @@ class OSDEngine:
         self,
         criteria: list[dict],
         df_schema: dict[str, pl.DataType],
+        context: _CompileContext | None = None,
     ) -> pl.Expr | None:
         """Compile a list of top-level criteria into a single AND expression."""
         exprs = [
-            e for c in criteria if (e := self._safe_parse(c, df_schema)) is not None
+            e
+            for c in criteria
+            if (e := self._safe_parse(c, df_schema, context)) is not None
         ]
         if not exprs:
             return None
         return pl.all_horizontal(exprs)
 
+    def _conjuncts(
+        self,
+        criterion: dict,
+        df_schema: dict[str, pl.DataType],
+        context: _CompileContext | None = None,
+    ) -> list[pl.Expr]:
+        """Split a top-level criterion into expressions that must all hold."""
+        expr = self._safe_parse(criterion, df_schema, context)
+        if expr is None:
+            return []
+        operator = (criterion.get("logical_operator") or "AND").upper().strip()
+        if criterion.get("type") == "criterion" and operator == "AND":
+            # the group compiled, so every child does too
+            return [
+                e
+                for c in criterion.get("values", [])
+                for e in self._conjuncts(c, df_schema, context)
+            ]
+        return [expr]
+
+    def _compile_definition(
+        self,
+        key: str,
+        osd_definition: dict,
+        df_schema: dict[str, pl.DataType],
+        context: _CompileContext | None = None,
+    ) -> CompiledDefinition:
+        return CompiledDefinition(
+            key=key,
+            inclusion=self._compile(
+                osd_definition.get("inclusion_criteria", []), df_schema, context
+            ),
+            exclusion=self._compile(
+                osd_definition.get("exclusion_criteria", []), df_schema, context
+            ),
+        )
+
+    def _cache_key(
+        self,
+        content: Any,
+        df_schema: dict[str, pl.DataType],
+        dictionary_columns: frozenset[str],
+        references: _Registry,
+    ) -> str:
+        return stable_hash(
+            content,
+            [asdict(c) for c in self.columns],
+            self.value_encodings,
+            _schema_fingerprint(df_schema),
+            sorted(dictionary_columns),
+            self.skip_unresolvable,
+            references.key,
+        )
+
+    @property
+    def definitions(self) -> dict[str, dict]:
+        """Definitions registered for ``syndrome`` criteria, by name."""
+        return dict(self._registry.definitions)
+
+    def register(self, definitions: dict[str, dict]) -> None:
+        """Make *definitions* available to ``syndrome`` criteria.
+
+        A ``syndrome`` criterion refers to another definition through its
+        ``name``, matched against the keys of *definitions* first and their
+        ``title`` second; the criterion holds for the rows the referenced
+        definition matches. Registering a name again replaces its definition.
+        Criteria naming no known definition are matched as text, as before.
+        """
+        registered = {**self._registry.definitions, **definitions}
+        self._registry = _Registry(registered, stable_hash(registered))
+
+    def _references(self, definitions: dict[str, dict]) -> _Registry:
+        """The registry, extended with *definitions* labelled together."""
+        merged = {**self._registry.definitions, **definitions}
+        return _Registry(merged, stable_hash(merged))
+
+    def _syndrome_resolver(
+        self,
+        references: _Registry,
+        df_schema: dict[str, pl.DataType],
+        *,
+        shared: bool = False,
+    ) -> _SyndromeResolver:
+        return _SyndromeResolver(
+            references.definitions,
+            lambda osd_def, context: self._compile_definition(
+                "", osd_def, df_schema, context
+            ).predicate,
+            shared=shared,
+        )
+
+    def _cache_get(self, key: str) -> CompiledDefinition | FusedLabels | None:
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                self._cache_misses += 1
+                return None
+            self._cache_hits += 1
+            self._cache.move_to_end(key)
+            return cached
+
+    def _cache_put(self, key: str, value: CompiledDefinition | FusedLabels) -> None:
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+    def compile(
+        self,
+        osd_definition: dict,
+        df_schema: dict[str, pl.DataType],
+        *,
+        dictionary_columns: frozenset[str] = frozenset(),
+    ) -> CompiledDefinition:
+        """Compile *osd_definition* for datasets with schema *df_schema*.
+
+        Results are cached by the content of the definition, the engine profile
+        and the schema, so repeated calls on batches sharing a schema only walk
+        the criteria tree once. String predicates on *dictionary_columns* are
+        evaluated per distinct value. ``syndrome`` criteria are replaced by
+        the predicate of the registered definition they refer to.
+        """
+        return self._compile_referencing(
+            osd_definition, df_schema, dictionary_columns, self._registry
+        )
+
+    def _compile_referencing(
+        self,
+        osd_definition: dict,
+        df_schema: dict[str, pl.DataType],
+        dictionary_columns: frozenset[str],
+        references: _Registry,
+        name: str | None = None,
+    ) -> CompiledDefinition:
+        """Compile a definition whose ``syndrome`` criteria refer to *references*.
+
+        *name* is the definition's own name among *references*, if any.
+        """
+        key = self._cache_key(osd_definition, df_schema, dictionary_columns, references)
+        compiled = self._cache_get(key)
+        if compiled is None:
+            resolver = self._syndrome_resolver(references, df_schema)
+            context = _CompileContext(
+                dictionary_columns=dictionary_columns, syndromes=resolver
+            )
+            with resolver.compiling(name) if name else nullcontext():
+                compiled = self._compile_definition(
+                    key, osd_definition, df_schema, context
+                )
+                compiled.conjuncts = [
+                    e
+                    for c in osd_definition.get("inclusion_criteria", [])
+                    for e in self._conjuncts(c, df_schema, context)
+                ]
+            self._cache_put(key, compiled)
+        return compiled
+
+    def fuse(
+        self,
+        definitions: dict[str, dict],
+        df_schema: dict[str, pl.DataType],
+        *,
+        dictionary_columns: frozenset[str] = frozenset(),
+    ) -> FusedLabels:
+        """Compile *definitions* together, sharing identical leaf predicates.
+
+        Every distinct leaf (a code, attribute or text match) becomes one
+        temporary column, and each definition's label combines those columns.
+        Literal terms searched in the same column are matched together when
+        there are at least ``multi_pattern_threshold`` of them. ``syndrome``
+        criteria may refer to registered definitions as well as to
+        *definitions*; each referenced definition is computed once, as a
+        temporary column. Shares the compiled-definition cache with
+        :meth:`compile`.
+        """
+        references = self._references(definitions)
+        key = self._cache_key(
+            ["fused", definitions, self.multi_pattern_threshold],
+            df_schema,
+            dictionary_columns,
+            references,
+        )
+        fused = self._cache_get(key)
+        if fused is not None:
+            return fused
+
+        terms = None
+        if self.multi_pattern_threshold is not None:
+            # a first pass finds the terms searched in each column
+            terms = _TermPool(self.multi_pattern_threshold)
+            resolver = self._syndrome_resolver(references, df_schema)
+            context = _CompileContext(
+                dictionary_columns=dictionary_columns, terms=terms, syndromes=resolver
+            )
+            for name, osd_def in definitions.items():
+                with resolver.compiling(name):
+                    self._compile_definition(key, osd_def, df_schema, context)
+            terms.freeze()
+
+        pool = _LeafPool()
+        resolver = self._syndrome_resolver(references, df_schema, shared=True)
+        context = _CompileContext(
+            leaf_hook=pool,
+            dictionary_columns=dictionary_columns,
+            terms=terms,
+            syndromes=resolver,
+        )
+        labels = {}
+        for name, osd_def in definitions.items():
+            with resolver.compiling(name):
+                expr = self._compile_definition(
+                    key, osd_def, df_schema, context
+                ).predicate
+            labels[name] = expr if expr is not None else pl.lit(False)
+        # definitions referred to by others are only computed once
+        labels.update(
+            (name, resolver.resolved[name])
+            for name in labels
+            if name in resolver.resolved
+        )
+
+        # leaves of criteria that were skipped as unresolvable are never read
+        referenced = {col for expr in labels.values() for col in expr.meta.root_names()}
+        syndromes = resolver.stages(referenced)
+        leaves = {
+            alias: expr for alias, expr in pool.leaves.values() if alias in referenced
+        }
+        read = {col for expr in leaves.values() for col in expr.meta.root_names()}
+        bitsets = {
+            alias: expr
+            for alias, expr in (terms.columns() if terms else {}).items()
+            if alias in read
+        }
+        fused = FusedLabels(
+            key=key,
+            leaves=leaves,
+            labels=labels,
+            report=FusionReport(
+                total_leaves=pool.total,
+                unique_leaves=len(leaves),
+                scanned_terms=sum(len(t) for t in terms.terms.values()) if terms else 0,
+            ),
+            terms=bitsets,
+            syndromes=syndromes,
+        )
+        self._cache_put(key, fused)
+        return fused
+
+    def cache_info(self) -> CacheInfo:
+        """Return hit/miss counters and size of the compiled-definition cache."""
+        with self._lock:
+            return CacheInfo(
+                self._cache_hits, self._cache_misses, self.cache_size, len(self._cache)
+            )
+
+    def cache_clear(self) -> None:
+        """Empty the compiled-definition cache and reset its counters.
+
+        Cached selectivity estimates are dropped as well.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._estimates.clear()
+            self._cache_hits = 0
+            self._cache_misses = 0
+
+    def add_code_index(self, df: FrameT) -> FrameT:
+        """Add a normalized Categorical copy of every ``diagnosis`` column to *df*.
+
+        Values are stripped of surrounding whitespace, and upper-cased when the
+        column's ``system`` is an ICD/CID coding system. Code criteria compiled
+        against a frame carrying these columns match against them, evaluating
+        each pattern once per distinct code. Index columns already present are
+        kept as they are, so a frame can be indexed once and labelled many times.
+        """
+        return df.with_columns(self._missing_code_index(df))
+
+    def dictionary_columns(self, df: pl.DataFrame | pl.LazyFrame) -> frozenset[str]:
+        """Profile columns of *df* whose string predicates run per distinct value.
+
+        Categorical and Enum columns always qualify. String columns qualify
+        when their first rows (up to 100,000, read from lazy frames too) hold
+        at most :attr:`dictionary_max_values` distinct values, each appearing
+        at least twice on average. A column still revealing a new value every
+        other row is not bounded by the sample and never qualifies.
+        """
+        if self.dictionary_max_values is None:
+            return frozenset()
+        schema = df.collect_schema()
+        names = {c.col_name for c in self.columns if c.col_name in schema}
+        selected = {
+            name
+            for name in names
+            if isinstance(schema[name], (pl.Categorical, pl.Enum))
+        }
+        strings = sorted(name for name in names if schema[name] == pl.String)
+        if not strings:
+            return frozenset(selected)
+        sample = df.select(strings).head(_DICTIONARY_SAMPLE_SIZE)
+        if isinstance(sample, pl.LazyFrame):
+            sample = sample.collect()
+        if sample.height:
+            counts = sample.select(pl.col(strings).n_unique()).row(0, named=True)
+            limit = min(
+                self.dictionary_max_values,
+                sample.height * _DICTIONARY_MAX_SAMPLE_RATIO,
+            )
+            selected.update(name for name, count in counts.items() if count <= limit)
+        return frozenset(selected)
+
+    def _with_code_index(self, df: FrameT) -> tuple[FrameT, list[str]]:
+        """Add the code index when ``code_index`` is enabled.
+
+        Returns the frame and the names of the index columns that were added,
+        which are temporary and dropped from results.
+        """
+        index = self._missing_code_index(df) if self.code_index else []
+        if not index:
+            return df, []
+        return df.with_columns(index), [expr.meta.output_name() for expr in index]
+
+    def _missing_code_index(self, df: pl.DataFrame | pl.LazyFrame) -> list[pl.Expr]:
+        present = set(df.collect_schema().names())
+        index = {}
+        for spec in self.columns:
+            name = code_index_name(spec.col_name)
+            if spec.concept == "diagnosis" and name not in present:
+                index.setdefault(name, _normalize_code_expr(spec))
+        return list(index.values())
+
+    def _explain_criterion(
+        self,
+        criterion: dict,
+        path: str,
+        df_schema: dict[str, pl.DataType],
+        context: _CompileContext,
+    ) -> ExplainNode:
+        children = []
+        if criterion.get("type") == "criterion":
+            children = [
+                self._explain_criterion(c, f"{path}.values[{i}]", df_schema, context)
+                for i, c in enumerate(criterion.get("values", []))
+            ]
+        node = ExplainNode(
+            path=path,
+            type=str(criterion.get("type")),
+            name=_describe_criterion(criterion),
+            children=children,
+        )
+        try:
+            if criterion.get("type") == "criterion":
+                # built from the children that compiled, so that one skipped
+                # child does not take its whole group (and ancestors) with it
+                n_args = criterion.get("logical_operator_arguments")
+                node.expr = _combine(
+                    [child.expr for child in children if child.expr is not None],
+                    criterion.get("logical_operator", "AND"),
+                    n_args[0] if n_args else None,
+                )
+            else:
+                node.expr = _parse_criterion(
+                    criterion, self.columns, self.value_encodings, df_schema, context
+                )
+        except (
+            UnresolvableCriterion,
+            InvalidOperator,
+            InvalidPattern,
+            CircularReference,
+        ) as e:
+            node.error = str(e)
+        return node
+
+    def explain(
+        self, df: pl.DataFrame | pl.LazyFrame, osd_definition: dict
+    ) -> Explanation:
+        """Evaluate every node of *osd_definition* separately over *df*.
+
+        Each criterion, nested ``criterion`` groups included, is compiled and
+        evaluated on its own, reporting the rows it matches, its selectivity
+        and the time it took, so a slow or overly strict criterion can be
+        traced back by its path in the definition. Criteria that cannot be
+        compiled are reported with an ``error`` and left out of their parent
+        group, which is evaluated on its other criteria.
+
+        Every node is a separate pass over the data, so this is meant for
+        diagnosing a definition, not for production runs.
+
+        Parameters
+        ----------
+        df:
+            The dataset. A ``pl.LazyFrame`` is scanned once per node.
+        osd_definition:
+            Parsed OSD JSON definition dict.
+
+        Returns
+        -------
+        Explanation
+            The statistics tree; see :meth:`Explanation.format`,
+            :meth:`Explanation.to_json` and :meth:`Explanation.to_frame`.
+        """
+        indexed, _ = self._with_code_index(df)
+        df_schema = dict(indexed.collect_schema())
+        context = _CompileContext(
+            dictionary_columns=self.dictionary_columns(df),
+            syndromes=self._syndrome_resolver(self._registry, df_schema),
+        )
+
+        sections = {}
+        for section in ("inclusion_criteria", "exclusion_criteria"):
+            criteria = osd_definition.get(section, [])
+            if not criteria:
+                continue
+            children = [
+                self._explain_criterion(c, f"{section}[{i}]", df_schema, context)
+                for i, c in enumerate(criteria)
+            ]
+            exprs = [child.expr for child in children if child.expr is not None]
+            sections[section] = ExplainNode(
+                path=section,
+                type=section,
+                name=f"AND of {len(criteria)}",
+                children=children,
+                expr=pl.all_horizontal(exprs) if exprs else None,
+            )
+        predicate = CompiledDefinition(
+            key="",
+            inclusion=getattr(sections.get("inclusion_criteria"), "expr", None),
+            exclusion=getattr(sections.get("exclusion_criteria"), "expr", None),
+        ).predicate
+        root = ExplainNode(
+            path="$",
+            type="definition",
+            name=osd_definition.get("title", ""),
+            children=list(sections.values()),
+            expr=predicate,
+        )
+
+        total_rows = collect(indexed.select(pl.len())).item()
+        for _, node in root.walk():
+            if node.expr is None:
+                continue
+            start = time.perf_counter()
+            node.rows = collect(indexed.select(node.expr.sum())).item()
+            node.seconds = time.perf_counter() - start
+            node.selectivity = node.rows / total_rows if total_rows else None
+        return Explanation(total_rows, root)
+
+    def _sample(self, df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+        if isinstance(df, pl.LazyFrame):
+            return df.head(_SELECTIVITY_SAMPLE_SIZE).collect()
+        return df.sample(min(_SELECTIVITY_SAMPLE_SIZE, df.height), seed=0)
+
+    def estimate_selectivity(
+        self, df: pl.DataFrame | pl.LazyFrame, exprs: list[pl.Expr]
+    ) -> list[SelectivityEstimate]:
+        """Measure the selectivity and cost of each of *exprs* on a sample of *df*.
+
+        The sample is a random sample of eager frames and the first rows of
+        lazy ones, so no full scan is needed. Estimates are cached per dataset,
+        identified by the content of its sample, and per expression.
+        """
+        sample = self._sample(df)
+        dataset_key = stable_hash(
+            _schema_fingerprint(dict(sample.schema)),
+            sample.hash_rows(seed=0).to_list(),
+        )
+        with self._lock:
+            cached = self._estimates.setdefault(dataset_key, {})
+            self._estimates.move_to_end(dataset_key)
+            if len(self._estimates) > max(self.cache_size, 1):
+                self._estimates.popitem(last=False)
+
+        estimates = []
+        for expr in exprs:
+            key = expr.meta.serialize(format="json")
+            estimate = cached.get(key)
+            if estimate is None:
+                # measured outside the lock; concurrent calls may both measure
+                # an expression, storing equivalent estimates
+                start = time.perf_counter()
+                matched = sample.select(expr.sum()).item() or 0
+                estimate = cached.setdefault(
+                    key,
+                    SelectivityEstimate(
+                        selectivity=matched / sample.height if sample.height else 1.0,
+                        seconds=time.perf_counter() - start,
+                    ),
+                )
+            estimates.append(estimate)
+        return estimates
+
+    def _order_stages(
+        self, df: pl.DataFrame | pl.LazyFrame, stages: list[pl.Expr]
+    ) -> list[pl.Expr]:
+        """*stages* in the order they are applied: cheapest, most selective first."""
+        estimates = self.estimate_selectivity(df, stages)
+        order = sorted(range(len(stages)), key=lambda i: estimates[i].rank)
+        return [stages[i] for i in order]
+
+    def _filter_staged(self, df: FrameT, stages: list[pl.Expr]) -> FrameT:
+        for position, stage in enumerate(self._order_stages(df, stages)):
+            if position and isinstance(df, pl.LazyFrame):
+                # the optimizer would otherwise merge consecutive filters into
+                # one predicate evaluated on every row
+                df = df.slice(0)
+            df = df.filter(stage)
+        return df
+
     @staticmethod
     def display_expression(exprs):
         """Display expression tree."""
@@ -388,9 +1865,11 @@ class OSDEngine:
 
     def label(
         self,
-        df: pl.DataFrame,
+        df: FrameT,
         definitions: dict[str, dict],
-    ) -> pl.DataFrame:
+        *,
+        fuse: bool = False,
+    ) -> FrameT:
         """Annotate *df* with one boolean column per definition.
 
         Each added column is named after the definition key and contains
@@ -399,28 +1878,55 @@ class OSDEngine:
         Parameters
         ----------
         df:
-            The dataset to annotate.
+            The dataset to annotate. A ``pl.LazyFrame`` is annotated lazily, so
+            nothing is read until the result is collected (see :func:`collect`),
+            except for the first rows sampled by :meth:`dictionary_columns`
+            when :attr:`dictionary_max_values` is set.
         definitions:
             Mapping of definition name → parsed OSD JSON definition dict.
+        fuse:
+            When ``True``, identical leaf predicates across all definitions are
+            evaluated once as temporary columns (see :meth:`fuse`). The
+            deduplication report is stored in :attr:`last_fusion_report`.
 
         Returns
         -------
-        pl.DataFrame
-            Original DataFrame with extra boolean columns added.
+        pl.DataFrame | pl.LazyFrame
+            Original frame with extra boolean columns added, of the same kind
+            as *df*.
         """
-        schema = dict(df.schema)
+        df, temporary = self._with_code_index(df)
+        schema = dict(df.collect_schema())
+        dictionary_columns = self.dictionary_columns(df)
+        if fuse:
+            fused = self.fuse(
+                definitions, schema, dictionary_columns=dictionary_columns
+            )
+            self.last_fusion_report = fused.report
+            return (
+                df.with_columns(
+                    expr.alias(alias) for alias, expr in fused.terms.items()
+                )
+                .with_columns(expr.alias(alias) for alias, expr in fused.leaves.items())
+                .pipe(_with_stages, fused.syndromes)
+                .with_columns(expr.alias(name) for name, expr in fused.labels.items())
+                .drop(
+                    list(fused.terms)
+                    + list(fused.leaves)
+                    + [alias for stage in fused.syndromes for alias in stage]
+                    + temporary
+                )
+            )
+        references = self._references(definitions)
         new_cols = []
         for name, osd_def in definitions.items():
-            inclusion = self._compile(osd_def.get("inclusion_criteria", []), schema)
-            exclusion = self._compile(osd_def.get("exclusion_criteria", []), schema)
-            expr = inclusion
-            if exclusion is not None:
-                negated = ~exclusion
-                expr = negated if expr is None else expr & negated
+            expr = self._compile_referencing(
+                osd_def, schema, dictionary_columns, references, name
+            ).predicate
             new_cols.append((expr if expr is not None else pl.lit(False)).alias(name))
-        return df.with_columns(new_cols)
+        return df.with_columns(new_cols).drop(temporary)
 
-    def filter(self, df: pl.DataFrame, osd_definition: dict) -> pl.DataFrame:
+    def filter(self, df: FrameT, osd_definition: dict) -> FrameT:
         """Filter *df* according to *osd_definition* inclusion and exclusion criteria.
 
         Rows must satisfy all inclusion criteria AND fail all exclusion criteria.
@@ -430,29 +1936,29 @@ class OSDEngine:
         Parameters
         ----------
         df:
-            The dataset to filter.
+            The dataset to filter. A ``pl.LazyFrame`` is filtered lazily, which
+            lets Polars push the predicate and column selection down into
+            ``scan_parquet``/``scan_csv``. With ``short_circuit`` enabled, a
+            sample of *df* is read right away to order the filters; with
+            :attr:`dictionary_max_values` set, its first rows are read to find
+            the dictionary columns, and their predicates are not pushed down.
         osd_definition:
             Parsed OSD JSON definition dict.
 
         Returns
         -------
-        pl.DataFrame
-            Filtered DataFrame.
+        pl.DataFrame | pl.LazyFrame
+            Filtered frame, of the same kind as *df*.
         """
-        schema = dict(df.schema)
-        inclusion_expr = self._compile(
-            osd_definition.get("inclusion_criteria", []), schema
+        indexed, temporary = self._with_code_index(df)
+        compiled = self.compile(
+            osd_definition,
+            dict(indexed.collect_schema()),
+            dictionary_columns=self.dictionary_columns(df),
         )
-        exclusion_expr = self._compile(
-            osd_definition.get("exclusion_criteria", []), schema
-        )
-
-        if inclusion_expr is None and exclusion_expr is None:
+        if compiled.predicate is None:
             return df
-
-        final_expr = inclusion_expr
-        if exclusion_expr is not None:
-            negated = ~exclusion_expr
-            final_expr = negated if final_expr is None else final_expr & negated
-
-        return df.filter(final_expr)
+        stages = compiled.stages
+        if self.short_circuit and len(stages) > 1:
+            return self._filter_staged(indexed, stages).drop(temporary)
+        return indexed.filter(compiled.predicate).drop(temporary)
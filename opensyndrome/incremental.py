@@ -0,0 +1,255 @@
+from __future__ import annotations
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+from opensyndrome.artifacts import atomic_path, write_atomic
+from opensyndrome.filter import OSDEngine, stable_hash
+
+
+@dataclass
+class IncrementalState:
+    """Progress of an incremental labelling run, persisted as JSON.
+
+    Attributes
+    ----------
+    watermark_column:
+        Column whose values only grow as rows are appended to the feed.
+    watermark:
+        Largest value of *watermark_column* already labelled, or ``None``
+        before the first run. Dates and datetimes are stored as strings.
+    profile:
+        Hash of the engine's mapping profile the output was labelled with.
+    definitions:
+        Maps definition name → ``{"version": ..., "hash": ...}`` for every
+        definition in the output.
+    parts:
+        Names of the Parquet files of the output directory written by the
+        runs so far, in order. Other part files were left by interrupted runs.
+    """
+
+    watermark_column: str
+    watermark: Any = None
+    profile: str | None = None
+    definitions: dict[str, dict[str, Any]] = field(default_factory=dict)
+    parts: list[str] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: str | Path) -> IncrementalState | None:
+        """Read a state file, returning ``None`` if it does not exist."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        return cls(**json.loads(path.read_text()))
+
+    def save(self, path: str | Path) -> None:
+        """Write the state to *path*, replacing it atomically."""
+        write_atomic(
+            Path(path), json.dumps(asdict(self), indent=2, default=str).encode()
+        )
+
+
+@dataclass(frozen=True)
+class IncrementalResult:
+    """Outcome of :func:`label_incremental`.
+
+    Attributes
+    ----------
+    rows:
+        Number of rows labelled in this run.
+    watermark:
+        Watermark stored after the run.
+    refreshed:
+        ``True`` when the whole dataset was relabelled instead of appended to.
+    reason:
+        Why a full refresh happened, or ``None`` for an incremental run.
+    """
+
+    rows: int
+    watermark: Any
+    refreshed: bool
+    reason: str | None = None
+
+
+def definition_fingerprints(definitions: dict[str, dict]) -> dict[str, dict[str, Any]]:
+    """Version and content hash of every definition, as stored in the state."""
+    return {
+        name: {"version": osd_def.get("version"), "hash": stable_hash(osd_def)}
+        for name, osd_def in definitions.items()
+    }
+
+
+def _profile_hash(engine: OSDEngine) -> str:
+    return stable_hash(
+        [asdict(c) for c in engine.columns],
+        engine.value_encodings,
+        engine.skip_unresolvable,
+    )
+
+
+def default_state_path(output: str | Path) -> Path:
+    """State file kept next to *output*, e.g. ``labels.state.json``."""
+    output = Path(output)
+    return output.with_name(f"{output.name}.state.json")
+
+
+def _refresh_reason(
+    state: IncrementalState | None,
+    output: Path,
+    watermark_column: str,
+    profile: str,
+    definitions: dict[str, dict[str, Any]],
+) -> str | None:
+    if state is None:
+        return "no previous state"
+    if not output.exists():
+        return f"{output} does not exist"
+    if not output.is_dir():
+        return f"{output} is not a directory of part files"
+    missing = [part for part in state.parts if not (output / part).exists()]
+    if missing:
+        return f"{output / missing[0]} does not exist"
+    if state.watermark_column != watermark_column:
+        return (
+            f"watermark column changed from '{state.watermark_column}' "
+            f"to '{watermark_column}'"
+        )
+    if state.profile != profile:
+        return "mapping profile changed"
+    changed = sorted(set(state.definitions) ^ set(definitions)) + sorted(
+        name
+        for name in set(state.definitions) & set(definitions)
+        if state.definitions[name] != definitions[name]
+    )
+    if changed:
+        return f"definitions changed: {', '.join(changed)}"
+    return None
+
+
+def _watermark_literal(value: Any, dtype: pl.DataType) -> pl.Expr:
+    """Restore a watermark read from JSON as a literal of the column's type."""
+    literal = pl.lit(value)
+    if isinstance(dtype, pl.Datetime):
+        return literal.str.to_datetime(
+            time_unit=dtype.time_unit, time_zone=dtype.time_zone
+        )
+    if isinstance(dtype, pl.Date):
+        return literal.str.to_date()
+    return literal.cast(dtype)
+
+
+def _next_part(output: Path) -> Path:
+    numbers = [
+        int(number)
+        for path in output.glob("part-*.parquet")
+        if (number := path.stem.removeprefix("part-")).isdigit()
+    ]
+    return output / f"part-{max(numbers, default=-1) + 1:05d}.parquet"
+
+
+def label_incremental(
+    engine: OSDEngine,
+    df: pl.DataFrame | pl.LazyFrame,
+    definitions: dict[str, dict],
+    output: str | Path,
+    *,
+    watermark_column: str,
+    state_path: str | Path | None = None,
+    fuse: bool = False,
+) -> IncrementalResult:
+    """Label only the rows of an append-only dataset added since the last run.
+
+    Rows whose *watermark_column* is greater than the stored watermark, up to
+    the largest value read when the run starts, are labelled with
+    :meth:`OSDEngine.label` and written to a new Parquet part file of the
+    directory *output*; the watermark then moves to that value. Rows appended
+    while the run is labelling are left to the next run. Each run only reads
+    the new rows and writes their part, never the previous output.
+
+    The whole dataset is relabelled into a single part replacing the previous
+    ones when there is no state yet, a part of *output* is missing, or the
+    watermark column, mapping profile or any definition (its ``version`` or
+    content hash) changed since the state was written.
+
+    Rows arriving later with a watermark equal to or lower than the stored
+    one, or with a null watermark, are not picked up, so the column must be
+    monotonic in the feed (e.g. an ingestion timestamp).
+
+    Parameters
+    ----------
+    engine:
+        Engine used for labelling.
+    df:
+        The full dataset, preferably a ``pl.LazyFrame`` scan so only new rows
+        are read.
+    definitions:
+        Mapping of definition name → parsed OSD JSON definition dict.
+    output:
+        Directory of labelled Parquet part files (``part-00000.parquet``...),
+        read back with ``pl.scan_parquet(output)``. Parts are written through
+        a temporary file and only recorded in the state once complete; a part
+        left by an interrupted run is deleted by the next one.
+    watermark_column:
+        Column used to find new rows.
+    state_path:
+        JSON state file. Defaults to :func:`default_state_path` of *output*.
+    fuse:
+        Passed to :meth:`OSDEngine.label`.
+
+    Returns
+    -------
+    IncrementalResult
+    """
+    output = Path(output)
+    state_path = Path(state_path) if state_path else default_state_path(output)
+    frame = df.lazy()
+    dtype = frame.collect_schema()[watermark_column]
+
+    profile = _profile_hash(engine)
+    fingerprints = definition_fingerprints(definitions)
+    state = IncrementalState.load(state_path)
+    reason = _refresh_reason(state, output, watermark_column, profile, fingerprints)
+
+    if reason is None and state.watermark is not None:
+        previous = _watermark_literal(state.watermark, dtype)
+        frame = frame.filter(pl.col(watermark_column) > previous)
+    watermark = frame.select(pl.col(watermark_column).max()).collect().item()
+    if reason is None and watermark is None:
+        if state.watermark is not None:
+            watermark = pl.select(previous).item()
+        return IncrementalResult(0, watermark, refreshed=False)
+    if watermark is not None:
+        # rows appended from now on are past the watermark saved below
+        frame = frame.filter(
+            (pl.col(watermark_column) <= pl.lit(watermark, dtype=dtype))
+            | pl.col(watermark_column).is_null()
+        )
+
+    if output.is_file():
+        output.unlink()
+    output.mkdir(parents=True, exist_ok=True)
+    part = _next_part(output)
+    # written outside the output, where readers of the directory would see it
+    with atomic_path(part, tmp_dir=output.parent) as tmp:
+        engine.label(frame, definitions, fuse=fuse).sink_parquet(tmp)
+    rows = pl.scan_parquet(part).select(pl.len()).collect().item()
+
+    parts = [] if reason is not None else state.parts
+    parts = [*parts, part.name]
+    IncrementalState(
+        watermark_column=watermark_column,
+        watermark=watermark,
+        profile=profile,
+        definitions=fingerprints,
+        parts=parts,
+    ).save(state_path)
+    # parts replaced by a refresh, or left by interrupted runs
+    for path in output.glob("part-*.parquet"):
+        if path.name not in parts:
+            path.unlink()
+    return IncrementalResult(
+        rows, watermark, refreshed=reason is not None, reason=reason
+    )
@@ -6,7 +6,7 @@ from __future__ import annotations
 
 from datetime import date, datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, Set, Union
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import AnyUrl, BaseModel, ConfigDict, Field, RootModel, constr
 
@@ -236,7 +236,7 @@ class Criterion1(BaseModel):
         examples=["i"],
     )
     code: Optional[Code] = Field(None, description="System agnostic diagnosis code.")
-    values: Optional[Set[Criterion]] = None
+    values: Optional[List[Criterion]] = None
 
 
 class Criterion2(BaseModel):
@@ -283,7 +283,7 @@ class Criterion2(BaseModel):
         examples=["i"],
     )
     code: Optional[Code] = Field(None, description="System agnostic diagnosis code.")
-    values: Set[Criterion]
+    values: List[Criterion]
 
 
 class Criterion(RootModel[Union[Criterion1, Criterion2]]):
@@ -1,24 +1,384 @@
+from __future__ import annotations
+import functools
+import glob
+import itertools
 import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
 import jsonschema
 from dotenv import load_dotenv
 
 from opensyndrome.artifacts import get_schema_filepath
+from opensyndrome.bundle import is_bundle, iter_bundle
 
 load_dotenv()
 
+# resolved schema path -> ((mtime_ns, size), validator)
+_VALIDATORS: dict[str, tuple[tuple[int, int], jsonschema.protocols.Validator]] = {}
+_VALIDATORS_LOCK = threading.Lock()
+# files validated by each task sent to a worker process of validate_files
+_CHUNK_SIZE = 64
+# "jsonschema" validates against the JSON Schema file, "pydantic" against the
+# models of opensyndrome.schema generated from it, compiled by pydantic-core
+BACKENDS = ("jsonschema", "pydantic")
+
+
+@dataclass(frozen=True)
+class ValidationIssue:
+    """A reason a definition is invalid.
+
+    Attributes
+    ----------
+    message:
+        Human-readable description of the problem.
+    path:
+        JSON path of the offending value in the definition (``$`` for the
+        whole definition).
+    validator:
+        The failing JSON Schema keyword (e.g. ``required``) or pydantic error
+        type (e.g. ``missing``), or ``json`` when the definition is not valid
+        JSON.
+    """
+
+    message: str
+    path: str = "$"
+    validator: str = "json"
+
+
+@dataclass(frozen=True)
+class ValidationResult:
+    """Every issue found in one definition by :func:`validate_many`.
+
+    Attributes
+    ----------
+    source:
+        Path of the definition, ``<bundle>#<packed path>`` for a definition
+        read from a bundle, or ``#<position>`` for a loaded definition.
+    errors:
+        Every issue found, empty when the definition is valid.
+    seconds:
+        Time taken to read and validate the definition.
+    """
+
+    source: str
+    errors: tuple[ValidationIssue, ...]
+    seconds: float = field(default=0.0, compare=False)
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+def get_validator(schema_file=None) -> jsonschema.protocols.Validator:
+    """Validator of the schema in *schema_file*, built once per version of the file.
+
+    The schema is checked against its metaschema and compiled into the
+    validator class of its draft when first used, then cached until the
+    file's modification time or size changes. Validators are immutable and
+    can be shared between threads.
+
+    Parameters
+    ----------
+    schema_file:
+        Path of the JSON Schema. Defaults to the downloaded schema.
+
+    Raises
+    ------
+    jsonschema.exceptions.SchemaError
+        The schema itself is invalid.
+    """
+    path = Path(schema_file or get_schema_filepath())
+    key = os.path.realpath(path)
+    stat = path.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _VALIDATORS_LOCK:
+        cached = _VALIDATORS.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    schema = json.loads(path.read_text())
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+    with _VALIDATORS_LOCK:
+        _VALIDATORS[key] = (version, validator)
+    return validator
+
+
+def _load(machine_readable_definition):
+    if isinstance(machine_readable_definition, dict):
+        return machine_readable_definition
+    try:
+        return json.loads(Path(machine_readable_definition).read_text())
+    except OSError:
+        return json.loads(machine_readable_definition)
+
 
 def validate_machine_readable_format(machine_readable_definition, schema_file=None):
-    if not schema_file:
-        schema_file = get_schema_filepath()
-    if not isinstance(machine_readable_definition, dict):
+    """Validate a definition (dict, JSON file or JSON string) against the schema.
+
+    Raises
+    ------
+    json.JSONDecodeError
+        The definition is not valid JSON.
+    jsonschema.exceptions.ValidationError
+        The most relevant of the definition's errors, as ``jsonschema.validate``.
+    """
+    validator = get_validator(schema_file)
+    error = jsonschema.exceptions.best_match(
+        validator.iter_errors(_load(machine_readable_definition))
+    )
+    if error is not None:
+        raise error
+
+
+def _jsonschema_checker(schema_file) -> Callable:
+    validator = get_validator(schema_file)
+
+    def check(definition: bytes | dict) -> tuple[ValidationIssue, ...]:
+        if not isinstance(definition, dict):
+            try:
+                definition = json.loads(definition)
+            except ValueError as e:
+                return (ValidationIssue(str(e)),)
+        return tuple(
+            ValidationIssue(error.message, error.json_path, str(error.validator))
+            for error in validator.iter_errors(definition)
+        )
+
+    return check
+
+
+@functools.cache
+def _model():
+    from opensyndrome.schema import OpenSyndromeCaseDefinitionSchema
+
+    return OpenSyndromeCaseDefinitionSchema
+
+
+def _json_path(location: tuple, document) -> str:
+    """JSON path in *document* of the location of a pydantic error.
+
+    Pydantic locations also name the member of a union that was tried (e.g.
+    ``Criterion1``); such parts are not in the document and are left out,
+    except for the last one, the field in error, which may be missing.
+    """
+    path = "$"
+    for position, part in enumerate(location):
+        last = position == len(location) - 1
+        if isinstance(part, int) and isinstance(document, list):
+            path += f"[{part}]"
+            document = document[part] if part < len(document) else None
+        elif isinstance(document, dict) and (part in document or last):
+            path += f".{part}"
+            document = document.get(part)
+    return path
+
+
+def _pydantic_checker() -> Callable:
+    import pydantic
+
+    model = _model()
+
+    def check(definition: bytes | dict) -> tuple[ValidationIssue, ...]:
         try:
-            json_data = json.loads(Path(machine_readable_definition).read_text())
-        except OSError:
-            json_data = json.loads(machine_readable_definition)
-    else:
-        json_data = machine_readable_definition
-    schema_data = json.loads(Path(schema_file).read_text())
-
-    jsonschema.validate(json_data, schema_data)
+            if isinstance(definition, dict):
+                model.model_validate(definition)
+            else:
+                # parsed by pydantic-core straight from the bytes
+                model.model_validate_json(definition)
+            return ()
+        except pydantic.ValidationError as e:
+            errors = e.errors(include_url=False)
+        if errors[0]["type"] == "json_invalid":
+            return (ValidationIssue(f"Invalid JSON: {errors[0]['ctx']['error']}"),)
+        # only invalid definitions are parsed, to report paths in the document
+        document = (
+            definition if isinstance(definition, dict) else json.loads(definition)
+        )
+        # every member of a union reports the errors of the fields they share
+        issues = dict.fromkeys(
+            ValidationIssue(
+                error["msg"], _json_path(error["loc"], document), error["type"]
+            )
+            for error in errors
+        )
+        return tuple(issues)
+
+    return check
+
+
+def _checker(backend: str, schema_file=None) -> Callable:
+    """Function listing the issues of a definition (JSON bytes or dict)."""
+    if backend == "jsonschema":
+        return _jsonschema_checker(schema_file)
+    if backend == "pydantic":
+        return _pydantic_checker()
+    raise ValueError(
+        f"Unknown validation backend '{backend}', expected one of {BACKENDS}."
+    )
+
+
+def validate_many(
+    definitions: Iterable[str | Path | dict],
+    schema_file=None,
+    backend: str = "jsonschema",
+) -> Iterator[ValidationResult]:
+    """Validate many definitions with one validator, reporting every error.
+
+    Unlike :func:`validate_machine_readable_format`, nothing is raised for an
+    invalid definition: each one yields a :class:`ValidationResult` listing
+    all its errors, so a whole collection is checked in a single pass.
+
+    Parameters
+    ----------
+    definitions:
+        Paths of JSON files or bundles, or definitions already loaded. Results
+        of loaded definitions are named after their position in
+        *definitions*. Bundles are streamed, yielding a result per definition;
+        an unreadable line is reported as an issue of the bundle and ends it.
+    schema_file:
+        Path of the JSON Schema. Defaults to the downloaded schema. Only used
+        by the ``jsonschema`` backend.
+    backend:
+        ``jsonschema`` validates against the JSON Schema. ``pydantic``
+        validates files straight from their bytes with the compiled models of
+        :mod:`opensyndrome.schema`, several times faster; those models are
+        generated from the schema, so they only follow it as closely as they
+        were last regenerated.
+
+    Yields
+    ------
+    ValidationResult
+        One per definition, in order.
+    """
+    check = _checker(backend, schema_file)
+    for position, definition in enumerate(definitions):
+        start = time.perf_counter()
+        if not isinstance(definition, dict) and is_bundle(definition):
+            yield from _validate_bundle(Path(definition), check)
+            continue
+        if isinstance(definition, dict):
+            source = f"#{position}"
+        else:
+            source = str(definition)
+            try:
+                definition = Path(definition).read_bytes()
+            except OSError as e:
+                issue = ValidationIssue(str(e))
+                yield ValidationResult(source, (issue,), time.perf_counter() - start)
+                continue
+        yield ValidationResult(source, check(definition), time.perf_counter() - start)
+
+
+def _validate_bundle(path: Path, check: Callable) -> Iterator[ValidationResult]:
+    bundled = iter_bundle(path)
+    while True:
+        start = time.perf_counter()
+        try:
+            definition = next(bundled)
+        except StopIteration:
+            return
+        except (OSError, ImportError, ValueError) as e:
+            issue = ValidationIssue(str(e))
+            yield ValidationResult(str(path), (issue,), time.perf_counter() - start)
+            return
+        yield ValidationResult(
+            f"{path}#{definition.path}",
+            check(definition.definition),
+            time.perf_counter() - start,
+        )
+
+
+def find_definitions(sources: Iterable[str | Path]) -> list[Path]:
+    """Expand files, directories and glob patterns into definition files.
+
+    Directories are searched recursively for ``*.json`` files. Glob patterns
+    (``**`` is supported) are expanded, keeping ``*.json`` files and bundles
+    (see :mod:`opensyndrome.bundle`); files given explicitly are kept
+    whatever their extension. Each source's files are
+    sorted by path, and a file found twice is only returned once.
+    """
+    files = {}
+    for source in sources:
+        path = Path(source)
+        if path.is_file():
+            files.setdefault(path, None)
+            continue
+        if path.is_dir():
+            candidates = path.rglob("*.json")
+        else:
+            candidates = map(Path, glob.glob(str(source), recursive=True))
+        for candidate in sorted(candidates):
+            definition = candidate.suffix.lower() == ".json" or is_bundle(candidate)
+            if definition and candidate.is_file():
+                files.setdefault(candidate, None)
+    return list(files)
+
+
+def _validate_chunk(
+    paths: list[str], schema_file: str | None, backend: str
+) -> list[ValidationResult]:
+    return list(validate_many(paths, schema_file, backend))
+
+
+def validate_files(
+    paths: Iterable[str | Path],
+    schema_file=None,
+    workers: int | None = None,
+    backend: str = "jsonschema",
+) -> Iterator[ValidationResult]:
+    """Validate definition files in a pool of processes, see :func:`validate_many`.
+
+    Files are sent to the workers in chunks, and each worker compiles the
+    schema (or the models) once. Results are yielded in the order of *paths*
+    as their chunk is done; a bundle is validated by a single worker. A
+    single chunk or worker runs in the current process.
+
+    Parameters
+    ----------
+    paths:
+        Definition files, e.g. from :func:`find_definitions`.
+    schema_file:
+        Path of the JSON Schema. Defaults to the downloaded schema. Only used
+        by the ``jsonschema`` backend.
+    workers:
+        Number of processes. Defaults to the number of CPUs.
+    backend:
+        ``jsonschema`` or ``pydantic``, see :func:`validate_many`.
+
+    Raises
+    ------
+    jsonschema.exceptions.SchemaError
+        The schema itself is invalid, raised before any file is validated.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if backend == "jsonschema":
+        schema_file = str(schema_file or get_schema_filepath())
+    # fail early on an invalid schema, rather than in every worker
+    _checker(backend, schema_file)
+    paths = [str(path) for path in paths]
+    chunks = [
+        paths[start : start + _CHUNK_SIZE]
+        for start in range(0, len(paths), _CHUNK_SIZE)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        yield from validate_many(paths, schema_file, backend)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_checker, initargs=(backend, schema_file)
+    ) as executor:
+        for results in executor.map(
+            _validate_chunk,
+            chunks,
+            itertools.repeat(schema_file),
+            itertools.repeat(backend),
+        ):
+            yield from results
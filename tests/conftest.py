@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    """Keep the indexes of definition catalogs out of the real home directory."""
+    path = tmp_path / "index"
+    monkeypatch.setattr("opensyndrome.catalog.INDEX_DIR", path)
+    return path
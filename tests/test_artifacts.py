@@ -1,129 +1,442 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import mock
-from unittest.mock import Mock, call
+from unittest.mock import Mock
+
+import pytest
 
 from opensyndrome.artifacts import (
+    DownloadManifest,
+    DownloadResult,
+    atomic_path,
+    write_atomic,
     download_definitions,
+    is_complete,
+    manifest_path,
     get_definition_dir,
     download_schema,
     get_schema_filepath,
 )
 
 
-@mock.patch("opensyndrome.artifacts.DEFINITIONS_DIR")
+@pytest.fixture
+def definitions_dir(tmp_path):
+    directory = tmp_path / "v1" / "definitions"
+    directory.mkdir(parents=True)
+    with mock.patch("opensyndrome.artifacts.DEFINITIONS_DIR", directory):
+        yield directory
+
+
 @mock.patch("opensyndrome.artifacts.download_definitions")
 class TestGetDefinitionsDir:
-    def test_return_definitions_dir_if_not_empty(self, mock_download, mock_dir):
-        mock_dir.iterdir.return_value = ["schema.json", "v1/"]
+    def test_return_definitions_dir_if_not_empty(self, mock_download, definitions_dir):
+        (definitions_dir / "dengue.json").write_text("{}")
 
-        get_definition_dir()
-
-        assert mock_dir.iterdir.called
+        assert get_definition_dir() == definitions_dir
         assert mock_download.called is False
 
     def test_download_definitions_from_repo_if_dir_is_empty(
-        self, mock_download, mock_dir
+        self, mock_download, definitions_dir
     ):
-        mock_dir.iterdir.return_value = []
+        get_definition_dir()
+
+        assert mock_download.called is True
+
+    def test_download_again_if_interrupted(self, mock_download, definitions_dir):
+        (definitions_dir / "dengue.json").write_text("{}")
+        DownloadManifest(complete=False).save(manifest_path(definitions_dir))
 
         get_definition_dir()
 
-        assert mock_dir.iterdir.called
         assert mock_download.called is True
 
+    def test_download_again_if_corrupted(self, mock_download, definitions_dir):
+        (definitions_dir / "dengue.json").write_text("{")
+        DownloadManifest(files={"dengue.json": "0" * 40}).save(
+            manifest_path(definitions_dir)
+        )
+
+        get_definition_dir()
+
+        assert mock_download.called is True
+
+    def test_download_again_if_pinned_to_another_ref(
+        self, mock_download, definitions_dir
+    ):
+        (definitions_dir / "dengue.json").write_text("{}")
+
+        get_definition_dir(ref="v1.0")
+
+        mock_download.assert_called_once_with(definitions_dir, version=None, ref="v1.0")
+
+    def test_other_versions_are_kept_apart(self, mock_download, tmp_path):
+        with mock.patch("opensyndrome.artifacts.OPEN_SYNDROME_HOME", tmp_path):
+            directory = get_definition_dir(version="v2")
+
+        assert directory == tmp_path / "v2" / "definitions"
+        mock_download.assert_called_once_with(directory, version="v2", ref=None)
+
+
+@pytest.fixture
+def schema_path(tmp_path):
+    path = tmp_path / "schema.json"
+    with mock.patch("opensyndrome.artifacts.SCHEMA_DIR", path):
+        yield path
+
+
+class TestAtomicPath:
+    def test_renamed_once_complete(self, tmp_path):
+        path = tmp_path / "out" / "state.json"
+        with atomic_path(path) as tmp:
+            tmp.write_text("{}")
+            assert not path.exists()
+        assert path.read_text() == "{}"
+        assert list(path.parent.iterdir()) == [path]
+
+    def test_unique_per_thread(self, tmp_path):
+        path = tmp_path / "state.json"
+        temporaries = []
+        both_writing = threading.Barrier(2)
+
+        def write():
+            with atomic_path(path) as tmp:
+                tmp.write_text("{}")
+                temporaries.append(tmp)
+                both_writing.wait()
+
+        threads = [threading.Thread(target=write) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(temporaries)) == 2
+
+    def test_failure_keeps_previous_content(self, tmp_path):
+        path = tmp_path / "state.json"
+        write_atomic(path, b"old")
+        with pytest.raises(RuntimeError):
+            with atomic_path(path, tmp_dir=tmp_path) as tmp:
+                tmp.write_text("new")
+                raise RuntimeError
+        assert path.read_bytes() == b"old"
+        assert list(tmp_path.iterdir()) == [path]
+
+
+class TestIsComplete:
+    @pytest.fixture
+    def artifact(self, tmp_path):
+        artifact = tmp_path / "definitions"
+        artifact.mkdir()
+        (artifact / "dengue.json").write_bytes(b"{}")
+        sha = hashlib.sha1(b"blob 2\0{}").hexdigest()
+        DownloadManifest(files={"dengue.json": sha}).save(manifest_path(artifact))
+        return artifact
+
+    def test_unchanged_artifact_is_not_hashed_again(self, artifact):
+        assert is_complete(artifact)
+        with mock.patch("opensyndrome.artifacts._local_sha") as local_sha:
+            assert is_complete(artifact)
+        assert local_sha.called is False
+
+    def test_file_changed_after_a_check(self, artifact):
+        assert is_complete(artifact)
+        (artifact / "dengue.json").write_bytes(b"[]")
+        os.utime(artifact / "dengue.json", ns=(0, 0))
+
+        assert not is_complete(artifact)
+
 
 class TestDownloadSchema:
-    @mock.patch("opensyndrome.artifacts.SCHEMA_DIR")
-    @mock.patch("opensyndrome.artifacts.requests")
-    def test_download_schema_from_github_repo(self, mock_requests, mock_dir):
+    @mock.patch("requests.get")
+    def test_download_schema_from_github_repo(self, mock_get, schema_path):
         response = Mock()
         response.json.return_value = {"version": "1.0.0"}  # fake schema
-        mock_requests.get.return_value = response
+        mock_get.return_value = response
 
+        assert download_schema() == schema_path
+
+        url = mock_get.call_args.args[0]
+        assert url.endswith("/main/schemas/v1/schema.json")
+        assert schema_path.read_text() == '{"version": "1.0.0"}'
+        assert is_complete(schema_path)
+        assert list(schema_path.parent.glob("*.tmp")) == []
+
+    @mock.patch("requests.get")
+    def test_invalid_schema_is_not_written(self, mock_get, schema_path):
+        schema_path.write_text('{"version": "1.0.0"}')
+        mock_get.return_value.json.side_effect = ValueError
+
+        with pytest.raises(ValueError):
+            download_schema()
+
+        assert schema_path.read_text() == '{"version": "1.0.0"}'
+
+    @mock.patch("requests.get")
+    def test_pinned_ref_is_kept(self, mock_get, schema_path):
+        mock_get.return_value.json.return_value = {}
+
+        download_schema(ref="v1.0")
         download_schema()
 
-        assert mock_requests.get.called
-        assert mock_dir.mock_calls == [call.write_text('{"version": "1.0.0"}')]
+        assert mock_get.call_args.args[0].endswith("/v1.0/schemas/v1/schema.json")
 
 
-@mock.patch("opensyndrome.artifacts.SCHEMA_DIR")
 @mock.patch("opensyndrome.artifacts.download_schema")
 class TestGetSchemaFilepath:
-    def test_return_schema_filepath_if_exists(self, mock_download, mock_dir):
-        mock_dir.exists.return_value = True
+    def test_return_schema_filepath_if_exists(self, mock_download, schema_path):
+        schema_path.write_text("{}")
 
-        get_schema_filepath()
-
-        assert mock_dir.exists.called
+        assert get_schema_filepath() == schema_path
         assert mock_download.called is False
 
     def test_download_schema_from_repo_if_dir_does_not_exist(
-        self, mock_download, mock_dir
+        self, mock_download, schema_path
     ):
-        mock_dir.exists.return_value = False
+        get_schema_filepath()
+
+        assert mock_download.called is True
+
+    def test_download_again_if_corrupted(self, mock_download, schema_path):
+        schema_path.write_text("{}")
+        DownloadManifest(files={"schema.json": "0" * 40}).save(
+            manifest_path(schema_path)
+        )
 
         get_schema_filepath()
 
-        assert mock_dir.exists.called
         assert mock_download.called is True
 
 
-@mock.patch("opensyndrome.artifacts.requests")
-@mock.patch("opensyndrome.artifacts.DEFINITIONS_DIR")
+class _GitHub:
+    """Stand-in for the GitHub API, serving the files of a definitions repo."""
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        self.tarball_available = True
+        handler = type("Handler", (_Handler,), {"github": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def etag(self, body: bytes) -> str:
+        return f'"{hashlib.sha1(body).hexdigest()}"'
+
+    def tarball(self) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for path, content in sorted(self.files.items()):
+                info = tarfile.TarInfo(f"OpenSyndrome-definitions-abc123/{path}")
+                info.size = len(content)
+                info.mtime = 0
+                archive.addfile(info, io.BytesIO(content))
+        return buffer.getvalue()
+
+    def listing(self, directory: str) -> bytes:
+        items = {}
+        for path, content in self.files.items():
+            if not path.startswith(f"{directory}/"):
+                continue
+            name = path[len(directory) + 1 :].split("/")[0]
+            child = f"{directory}/{name}"
+            if child == path:
+                items[name] = {
+                    "type": "file",
+                    "path": path,
+                    "url": f"{self.url}/repos/x/contents/{path}?ref=main",
+                    "download_url": f"{self.url}/raw/{path}",
+                    "sha": hashlib.sha1(
+                        b"blob %d\0" % len(content) + content
+                    ).hexdigest(),
+                }
+            else:
+                items[name] = {
+                    "type": "dir",
+                    "path": child,
+                    "url": f"{self.url}/repos/OpenSyndrome/definitions/contents/"
+                    f"{child}?ref=main",
+                    "download_url": None,
+                    "sha": "tree",
+                }
+        return json.dumps(list(items.values())).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    github: _GitHub
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        github = self.github
+        path = self.path.split("?")[0]
+        github.requests.append(path)
+        contents = "/repos/OpenSyndrome/definitions/contents/"
+        if path.startswith("/repos/OpenSyndrome/definitions/tarball/"):
+            if not github.tarball_available:
+                return self._send(404, b"")
+            body = github.tarball()
+        elif path.startswith(contents):
+            body = github.listing(path[len(contents) :])
+        elif path[len("/raw/") :] in github.files:
+            body = github.files[path[len("/raw/") :]]
+        else:
+            return self._send(404, b"")
+        if self.headers.get("If-None-Match") == github.etag(body):
+            return self._send(304, b"")
+        self._send(200, body, {"ETag": github.etag(body)})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def github():
+    github = _GitHub(
+        {
+            "definitions/v1/a/afp_kenya.json": b'{"title": "AFP"}',
+            "definitions/v1/a/arbo/dengue.json": b'{"title": "Dengue"}',
+            "definitions/v1/influenza.json": b'{"title": "Influenza"}',
+            "definitions/v2/other.json": b"{}",
+            "README.md": b"readme",
+        }
+    )
+    thread = threading.Thread(target=github.server.serve_forever, daemon=True)
+    thread.start()
+    yield github
+    github.server.shutdown()
+    github.server.server_close()
+
+
+def _downloaded(destination):
+    return {
+        path.relative_to(destination).as_posix(): path.read_bytes()
+        for path in destination.rglob("*")
+        if path.is_file()
+    }
+
+
+EXPECTED = {
+    "a/afp_kenya.json": b'{"title": "AFP"}',
+    "a/arbo/dengue.json": b'{"title": "Dengue"}',
+    "influenza.json": b'{"title": "Influenza"}',
+}
+
+
 class TestDownloadDefinitions:
-    def test_download_definitions_recursively(self, mock_path, mock_requests):
-        mock_response_v1 = Mock()
-        mock_response_v1.json.return_value = [
-            # some keys were omitted from the response due to its size
-            {
-                "name": "a",
-                "path": "definitions/v1/a",
-                "url": "https://api.github.com/repos/OpenSyndrome/definitions/contents/definitions/v1/a?ref=main",
-                "type": "dir",
-            }
-        ]
-        mock_response_a = Mock()
-        mock_response_a.json.return_value = [
-            {
-                "name": "acuteflaccidparalysis_kenya.json",
-                "path": "definitions/v1/a/acuteflaccidparalysis_kenya.json",
-                "url": "https://api.github.com/repos/OpenSyndrome/definitions/contents/definitions/v1/a/acuteflaccidparalysis_kenya.json?ref=main",
-                "download_url": "https://raw.githubusercontent.com/OpenSyndrome/definitions/main/definitions/v1/a/acuteflaccidparalysis_kenya.json",
-                "type": "file",
-            }
+    @pytest.fixture
+    def destination(self, tmp_path):
+        return tmp_path / "definitions"
+
+    def test_downloads_definitions_from_tarball(self, github, destination):
+        result = download_definitions(destination, api_url=github.url)
+
+        assert result == DownloadResult("tarball", 3, 0, 0)
+        assert _downloaded(destination) == EXPECTED
+        assert github.requests == ["/repos/OpenSyndrome/definitions/tarball/main"]
+
+    def test_unchanged_tarball_is_not_downloaded_again(self, github, destination):
+        download_definitions(destination, api_url=github.url)
+
+        result = download_definitions(destination, api_url=github.url)
+
+        assert result == DownloadResult("tarball", 0, 3, 0)
+        assert len(github.requests) == 2
+
+    def test_only_changed_files_are_rewritten(self, github, destination):
+        download_definitions(destination, api_url=github.url)
+        untouched = (destination / "influenza.json").stat().st_mtime_ns
+        github.files["definitions/v1/a/afp_kenya.json"] = b'{"title": "AFP 2"}'
+        del github.files["definitions/v1/a/arbo/dengue.json"]
+        (destination / "mine.json").write_bytes(b"{}")
+
+        result = download_definitions(destination, api_url=github.url)
+
+        assert result == DownloadResult("tarball", 1, 1, 1)
+        assert _downloaded(destination) == {
+            "a/afp_kenya.json": b'{"title": "AFP 2"}',
+            "influenza.json": b'{"title": "Influenza"}',
+            "mine.json": b"{}",
+        }
+        assert (destination / "influenza.json").stat().st_mtime_ns == untouched
+
+    def test_locally_modified_files_are_restored(self, github, destination):
+        download_definitions(destination, api_url=github.url)
+        (destination / "influenza.json").write_bytes(b"edited")
+
+        result = download_definitions(destination, api_url=github.url)
+
+        assert result == DownloadResult("tarball", 1, 2, 0)
+        assert _downloaded(destination) == EXPECTED
+
+    def test_falls_back_to_contents_api(self, github, destination):
+        github.tarball_available = False
+
+        result = download_definitions(destination, api_url=github.url, workers=2)
+
+        assert result == DownloadResult("contents", 3, 0, 0)
+        assert _downloaded(destination) == EXPECTED
+        assert sorted(path for path in github.requests if "/raw/" in path) == [
+            "/raw/definitions/v1/a/afp_kenya.json",
+            "/raw/definitions/v1/a/arbo/dengue.json",
+            "/raw/definitions/v1/influenza.json",
         ]
-        mock_response_file = Mock()
-        mock_response_file.content = b'{"key": "value"}'
 
-        mock_requests.get.side_effect = [
-            mock_response_v1,
-            mock_response_a,
-            mock_response_file,
+    def test_contents_api_skips_files_already_downloaded(self, github, destination):
+        download_definitions(destination, api_url=github.url, tarball=False)
+        github.requests.clear()
+        github.files["definitions/v1/influenza.json"] = b'{"title": "Flu"}'
+
+        result = download_definitions(destination, api_url=github.url, tarball=False)
+
+        assert result == DownloadResult("contents", 1, 2, 0)
+        assert [path for path in github.requests if "/raw/" in path] == [
+            "/raw/definitions/v1/influenza.json"
         ]
+        assert (destination / "influenza.json").read_bytes() == b'{"title": "Flu"}'
+
+    def test_interrupted_download_is_not_complete(self, github, destination):
+        download_definitions(destination, api_url=github.url)
+        github.files["definitions/v1/influenza.json"] = b'{"title": "Flu"}'
+        write = write_atomic
+
+        def interrupted(path, content):
+            if path.parent == destination:
+                raise KeyboardInterrupt
+            write(path, content)
+
+        with mock.patch("opensyndrome.artifacts.write_atomic", interrupted):
+            with pytest.raises(KeyboardInterrupt):
+                download_definitions(destination, api_url=github.url)
+
+        assert not is_complete(destination)
+        download_definitions(destination, api_url=github.url)
+        assert is_complete(destination)
 
-        mock_path.return_value.write_bytes.return_value = None
-        mock_path.return_value.mkdir.return_value = None
-
-        download_definitions()
-
-        assert mock_requests.get.call_count == 3
-        calls = [
-            call(
-                "https://api.github.com/repos/OpenSyndrome/definitions/contents/definitions/v1?ref=main"
-            ),
-            call(
-                "https://api.github.com/repos/OpenSyndrome/definitions/contents/definitions/v1/a?ref=main"
-            ),
-            call(
-                "https://raw.githubusercontent.com/OpenSyndrome/definitions/main/definitions/v1/a/acuteflaccidparalysis_kenya.json"
-            ),
+    def test_ref_is_pinned(self, github, destination):
+        download_definitions(destination, api_url=github.url, ref="v1.0")
+        download_definitions(destination, api_url=github.url)
+
+        assert github.requests == [
+            "/repos/OpenSyndrome/definitions/tarball/v1.0",
+            "/repos/OpenSyndrome/definitions/tarball/v1.0",
         ]
-        mock_requests.get.assert_has_calls(calls, any_order=True)
+        assert DownloadManifest.load(manifest_path(destination)).ref == "v1.0"
 
-        assert (
-            call.__truediv__().mkdir(parents=True, exist_ok=True)
-            in mock_path.mock_calls
-        )
-        assert (
-            call.__truediv__().__truediv__().write_bytes(b'{"key": "value"}')
-            in mock_path.mock_calls
-        )
+    def test_manifest_is_kept_outside_definitions(self, github, destination):
+        download_definitions(destination, api_url=github.url, tarball=False)
+
+        manifest = json.loads(manifest_path(destination).read_text())
+
+        assert manifest_path(destination).parent == destination.parent
+        assert set(manifest["files"]) == set(EXPECTED)
+        assert len(manifest["listings"]) == 3
@@ -0,0 +1,191 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from opensyndrome.batch import (
+    filter_partitions,
+    find_partitions,
+    hive_columns,
+    label_partitions,
+    scan,
+    scan_partitions,
+)
+from opensyndrome.filter import ColumnSpec, OSDEngine
+
+DENGUE = {
+    "inclusion_criteria": [
+        {"type": "diagnosis", "code": {"system": "ICD-10", "code": "A90"}}
+    ]
+}
+
+
+@pytest.fixture
+def fake_dataset():
+    return pl.read_csv("tests/fixtures/fake_dataset.csv")
+
+
+@pytest.fixture
+def engine():
+    return OSDEngine([ColumnSpec("icd_code", concept="diagnosis")])
+
+
+@pytest.fixture
+def hive_dir(tmp_path, fake_dataset):
+    """Fixture dataset split into one hive partition per sex.
+
+    The ``sex`` column is only in the folder names, not in the files.
+    """
+    root = tmp_path / "visits"
+    for (sex,), partition in fake_dataset.group_by("sex"):
+        directory = root / f"sex={sex}"
+        directory.mkdir(parents=True)
+        partition.drop("sex").write_parquet(directory / "part-0.parquet")
+    (root / "_SUCCESS").touch()
+    return root
+
+
+class TestScan:
+    @pytest.mark.parametrize("suffix", [".csv", ".parquet", ".ndjson"])
+    def test_scans_by_extension(self, tmp_path, fake_dataset, suffix):
+        path = tmp_path / f"data{suffix}"
+        {
+            ".csv": fake_dataset.write_csv,
+            ".parquet": fake_dataset.write_parquet,
+            ".ndjson": fake_dataset.write_ndjson,
+        }[suffix](path)
+        assert scan(path).collect().height == fake_dataset.height
+
+    def test_raises_for_unsupported_extension(self):
+        with pytest.raises(ValueError, match=".xlsx"):
+            scan("data.xlsx")
+
+
+class TestFindPartitions:
+    def test_directory_is_searched_recursively(self, hive_dir):
+        partitions = find_partitions(hive_dir)
+        assert [p.parent.name for p in partitions] == [
+            "sex=D",
+            "sex=F",
+            "sex=M",
+        ]
+
+    def test_glob_pattern(self, hive_dir):
+        assert len(find_partitions(f"{hive_dir}/sex=M/*.parquet")) == 1
+        assert len(find_partitions(f"{hive_dir}/**/*.parquet")) == 3
+
+    def test_single_file(self):
+        path = "tests/fixtures/fake_dataset.csv"
+        assert [str(p) for p in find_partitions(path)] == [path]
+
+
+MALE = {
+    "inclusion_criteria": [
+        {
+            "type": "demographic_criteria",
+            "attribute": "sex",
+            "operator": "==",
+            "value": "M",
+        }
+    ]
+}
+
+
+class TestHiveColumns:
+    def test_keys_below_root_are_typed(self, tmp_path):
+        path = (
+            tmp_path / "year=2025" / "day=2025-01-31" / "city=S%C3%A3o Paulo" / "x.csv"
+        )
+        assert hive_columns(path, tmp_path) == {
+            "year": 2025,
+            "day": date(2025, 1, 31),
+            "city": "São Paulo",
+        }
+        assert hive_columns(path, tmp_path / "year=2025") == {
+            "day": date(2025, 1, 31),
+            "city": "São Paulo",
+        }
+        assert hive_columns(tmp_path / "x.csv", tmp_path) == {}
+
+    @pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+    def test_scan_adds_keys(self, tmp_path, fake_dataset, suffix):
+        path = tmp_path / "location=Berlin" / f"part-0{suffix}"
+        path.parent.mkdir()
+        data = fake_dataset.drop("location")
+        (data.write_csv if suffix == ".csv" else data.write_parquet)(path)
+
+        frame = scan(path, tmp_path).collect()
+
+        assert frame["location"].unique().to_list() == ["Berlin"]
+        assert "location" not in scan(path).collect_schema()
+
+
+class TestFilterPartitions:
+    def test_criteria_on_partition_keys(self, hive_dir):
+        engine = OSDEngine(
+            [ColumnSpec("sex", concept="demographic_criteria", attribute="sex")]
+        )
+        results = filter_partitions(engine, hive_dir, MALE)
+        assert [result.rows for result in results] == [0, 0, 171]
+
+    def test_counts_matching_rows_per_partition(self, hive_dir, engine):
+        results = filter_partitions(engine, hive_dir, DENGUE, workers=2)
+        assert len(results) == 3
+        assert sum(result.rows for result in results) == 52
+        assert all(result.output is None for result in results)
+
+    def test_compiles_definition_once(self, hive_dir, engine):
+        filter_partitions(engine, hive_dir, DENGUE)
+        assert engine.cache_info().misses == 1
+
+    def test_writes_partitions_mirroring_hive_layout(self, tmp_path, hive_dir, engine):
+        output_dir = tmp_path / "dengue"
+        results = filter_partitions(engine, hive_dir, DENGUE, output_dir=output_dir)
+        assert [r.output.relative_to(output_dir).as_posix() for r in results] == [
+            "sex=D/part-0.parquet",
+            "sex=F/part-0.parquet",
+            "sex=M/part-0.parquet",
+        ]
+        written = pl.read_parquet(output_dir / "**" / "*.parquet")
+        assert written.height == 52
+        assert written["icd_code"].eq("A90").all()
+
+    def test_reports_progress(self, hive_dir, engine):
+        seen = []
+        results = filter_partitions(engine, hive_dir, DENGUE, progress=seen.append)
+        assert sorted(seen, key=lambda result: result.path) == results
+        assert all(result.seconds >= 0 for result in results)
+
+    def test_raises_without_partitions(self, tmp_path, engine):
+        with pytest.raises(FileNotFoundError):
+            filter_partitions(engine, tmp_path, DENGUE)
+
+
+class TestScanPartitions:
+    def test_concatenates_partitions(self, hive_dir):
+        frame = scan_partitions(hive_dir).collect()
+        assert frame.height == 500
+        assert frame["sex"].value_counts(sort=True).rows() == [
+            ("M", 171),
+            ("F", 167),
+            ("D", 162),
+        ]
+
+    def test_keys_below_the_glob_pattern(self, hive_dir):
+        frame = scan_partitions(f"{hive_dir}/sex=F/*.parquet").collect()
+        assert frame["sex"].unique().to_list() == ["F"]
+
+    def test_raises_without_partitions(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            scan_partitions(tmp_path)
+
+
+class TestLabelPartitions:
+    def test_writes_label_columns(self, tmp_path, hive_dir, engine):
+        output_dir = tmp_path / "labelled"
+        results = label_partitions(
+            engine, hive_dir, {"dengue": DENGUE}, output_dir=output_dir
+        )
+        assert sum(result.rows for result in results) == 500
+        written = pl.read_parquet(output_dir / "**" / "*.parquet")
+        assert written["dengue"].sum() == 52
@@ -0,0 +1,150 @@
+import builtins
+import json
+import os
+import time
+
+import pytest
+
+from opensyndrome.bundle import (
+    BundledDefinition,
+    is_bundle,
+    iter_bundle,
+    pack,
+    write_bundle,
+)
+
+DENGUE = {"title": "Dengue", "inclusion_criteria": [{"type": "diagnosis"}]}
+ZIKA = {"title": "Zika – PAHO", "inclusion_criteria": [{"type": "symptom"}]}
+
+
+def _has_zstd() -> bool:
+    try:
+        from compression import zstd  # noqa: F401
+    except ImportError:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+needs_zstd = pytest.mark.skipif(not _has_zstd(), reason="zstd is not available")
+
+
+@pytest.fixture
+def definitions_dir(tmp_path):
+    root = tmp_path / "definitions"
+    (root / "b").mkdir(parents=True)
+    (root / "b" / "zika.json").write_text(json.dumps(ZIKA))
+    (root / "a.json").write_text(json.dumps(DENGUE))
+    (root / "empty.json").write_text("")
+    past = time.time() - 60
+    for path in root.rglob("*.json"):
+        os.utime(path, (past, past))
+    return root
+
+
+class TestIsBundle:
+    @pytest.mark.parametrize(
+        "name, expected",
+        [
+            ("defs.ndjson", True),
+            ("defs.NDJSON.zst", True),
+            ("defs.json", False),
+            ("defs.zst", False),
+            ("defs.csv", False),
+        ],
+    )
+    def test_by_name(self, name, expected):
+        assert is_bundle(name) is expected
+
+
+class TestWriteBundle:
+    @pytest.mark.parametrize(
+        "name", ["defs.ndjson", pytest.param("defs.ndjson.zst", marks=needs_zstd)]
+    )
+    def test_round_trip(self, tmp_path, name):
+        path = tmp_path / name
+        definitions = [
+            BundledDefinition("dengue", "br/dengue.json", DENGUE),
+            BundledDefinition("zika", "zika.json", ZIKA),
+        ]
+
+        assert write_bundle(iter(definitions), path) == 2
+
+        assert list(iter_bundle(path)) == [
+            BundledDefinition("dengue", "br/dengue.json", DENGUE, line=1),
+            BundledDefinition("zika", "zika.json", ZIKA, line=2),
+        ]
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_one_definition_per_line(self, tmp_path):
+        path = tmp_path / "defs.ndjson"
+        write_bundle([BundledDefinition("zika", "zika.json", ZIKA)], path)
+
+        (line,) = path.read_text(encoding="utf-8").splitlines()
+        assert json.loads(line) == {
+            "name": "zika",
+            "path": "zika.json",
+            "definition": ZIKA,
+        }
+
+    def test_failure_keeps_previous_bundle(self, tmp_path):
+        path = tmp_path / "defs.ndjson"
+        write_bundle([BundledDefinition("zika", "zika.json", ZIKA)], path)
+
+        def definitions():
+            yield BundledDefinition("dengue", "dengue.json", DENGUE)
+            raise RuntimeError("interrupted")
+
+        with pytest.raises(RuntimeError):
+            write_bundle(definitions(), path)
+
+        assert [bundled.name for bundled in iter_bundle(path)] == ["zika"]
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_compression_without_zstd(self, tmp_path, monkeypatch):
+        real_import = builtins.__import__
+
+        def no_zstd(name, *args, **kwargs):
+            if name in ("compression", "zstandard"):
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, "__import__", no_zstd)
+
+        with pytest.raises(ImportError, match=r"opensyndrome\[zstd\]"):
+            write_bundle([], tmp_path / "defs.ndjson.zst")
+
+
+class TestIterBundle:
+    def test_is_lazy_and_skips_blank_lines(self, tmp_path):
+        path = tmp_path / "defs.ndjson"
+        path.write_text(
+            '{"name": "dengue", "definition": {}}\n\n{"name": "zika"}\n',
+            encoding="utf-8",
+        )
+        bundled = iter_bundle(path)
+
+        assert next(bundled) == BundledDefinition("dengue", "dengue.json", {}, 1)
+        with pytest.raises(ValueError, match=r"defs.ndjson:3: invalid bundle line"):
+            next(bundled)
+
+    def test_invalid_json(self, tmp_path):
+        path = tmp_path / "defs.ndjson"
+        path.write_text("{\n")
+
+        with pytest.raises(ValueError, match=r"defs.ndjson:1"):
+            list(iter_bundle(path))
+
+
+class TestPack:
+    def test_packs_non_empty_definitions_in_path_order(self, definitions_dir, tmp_path):
+        path = tmp_path / "out" / "defs.ndjson"
+
+        assert pack(definitions_dir, path) == 2
+
+        assert [(b.name, b.path, b.definition) for b in iter_bundle(path)] == [
+            ("a", "a.json", DENGUE),
+            ("zika", "b/zika.json", ZIKA),
+        ]
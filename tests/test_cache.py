@@ -0,0 +1,65 @@
+import pytest
+
+from opensyndrome.cache import ResponseCache, request_key
+
+MESSAGES = [{"role": "user", "content": "Any person with fever and rash"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ResponseCache(tmp_path / "responses.sqlite", max_bytes=10) as cache:
+        yield cache
+
+
+class TestRequestKey:
+    def test_depends_on_every_argument(self):
+        key = request_key(messages=MESSAGES, model="mistral", options={"seed": 1})
+
+        assert key == request_key(
+            options={"seed": 1}, model="mistral", messages=MESSAGES
+        )
+        assert key != request_key(messages=MESSAGES, model="llama3", options={})
+        assert key != request_key(
+            messages=MESSAGES, model="mistral", options={"seed": 1}, format="json"
+        )
+
+
+class TestResponseCache:
+    def test_miss_then_hit(self, cache, tmp_path):
+        assert cache.get("a") is None
+
+        cache.put("a", "mistral", "fever")
+
+        assert cache.get("a") == "fever"
+        with ResponseCache(tmp_path / "responses.sqlite") as reopened:
+            assert reopened.get("a") == "fever"
+
+    def test_evicts_least_recently_used_beyond_max_bytes(self, cache, mocker):
+        clock = mocker.patch("opensyndrome.cache.time.time")
+        clock.return_value = 1
+        cache.put("a", "mistral", "aaaa")
+        clock.return_value = 2
+        cache.put("b", "mistral", "bbbb")
+        clock.return_value = 3
+        assert cache.get("a") == "aaaa"
+        clock.return_value = 4
+
+        cache.put("c", "mistral", "cccc")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "aaaa"
+        assert cache.get("c") == "cccc"
+
+    def test_sizes_are_counted_in_bytes(self, cache):
+        cache.put("a", "mistral", "é" * 4)
+        cache.put("b", "mistral", "é" * 2)
+
+        assert cache.get("a") is None
+        assert cache.get("b") == "é" * 2
+
+    def test_in_memory_when_the_file_cannot_be_written(self, tmp_path):
+        (tmp_path / "file").write_text("")
+
+        with ResponseCache(tmp_path / "file" / "responses.sqlite") as cache:
+            cache.put("a", "mistral", "fever")
+            assert cache.get("a") == "fever"
@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+from opensyndrome.catalog import (
+    CatalogEntry,
+    DefinitionCatalog,
+    RefreshResult,
+    default_index_path,
+    prune_indexes,
+)
+
+DENGUE = {
+    "title": "Dengue",
+    "location": "Brazil",
+    "version": "1.0.0",
+    "keywords": ["arbovirus"],
+    "inclusion_criteria": [{"type": "diagnosis", "code": {"code": "A90"}}],
+}
+INFLUENZA = {
+    "title": "Influenza",
+    "inclusion_criteria": [{"type": "diagnosis", "code": {"code": "J1%"}}],
+}
+
+
+def _write(path: Path, content: str, age: float = 60) -> None:
+    """Write *content* and backdate the file, out of the racy mtime window."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    past = time.time() - age
+    os.utime(path, (past, past))
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "definitions"
+    _write(root / "d" / "dengue.json", json.dumps(DENGUE))
+    _write(root / "influenza.json", json.dumps(INFLUENZA))
+    _write(root / "empty.json", "")
+    _write(root / "notes.txt", "not a definition")
+    return root
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return tmp_path / "index.sqlite"
+
+
+@pytest.fixture
+def catalog(root, index_path):
+    with DefinitionCatalog(root, index_path) as catalog:
+        yield catalog
+
+
+class TestDefinitionCatalog:
+    def test_loads_non_empty_definitions_by_file_name(self, catalog):
+        assert catalog.load() == {"dengue": DENGUE, "influenza": INFLUENZA}
+
+    def test_lists_metadata(self, catalog, root):
+        dengue, influenza = catalog.entries()
+        assert dengue == CatalogEntry(
+            name="dengue",
+            path=root / "d" / "dengue.json",
+            title="Dengue",
+            location="Brazil",
+            version="1.0.0",
+            keywords=("arbovirus",),
+            hash=dengue.hash,
+        )
+        assert (influenza.title, influenza.location, influenza.keywords) == (
+            "Influenza",
+            None,
+            (),
+        )
+
+    def test_get(self, catalog):
+        assert catalog.get("influenza") == INFLUENZA
+        with pytest.raises(KeyError, match="empty"):
+            catalog.get("empty")
+
+    def test_unchanged_files_are_not_read_again(self, catalog, root, index_path):
+        assert catalog.refresh() == RefreshResult(
+            added=3, updated=0, removed=0, unchanged=0
+        )
+        with DefinitionCatalog(root, index_path) as reopened:
+            assert reopened.refresh() == RefreshResult(
+                added=0, updated=0, removed=0, unchanged=3
+            )
+            assert reopened.load() == catalog.load()
+
+    def test_refresh_picks_up_changes(self, catalog, root):
+        catalog.refresh()
+        _write(root / "influenza.json", json.dumps({**INFLUENZA, "version": "2.0.0"}))
+        (root / "d" / "dengue.json").unlink()
+        _write(root / "new" / "zika.json", json.dumps({"title": "Zika"}))
+
+        assert catalog.refresh() == RefreshResult(
+            added=1, updated=1, removed=1, unchanged=1
+        )
+        assert [(e.name, e.version) for e in catalog.entries()] == [
+            ("influenza", "2.0.0"),
+            ("zika", None),
+        ]
+
+    def test_recently_written_files_are_checked_again(self, catalog, root):
+        (root / "influenza.json").write_text(json.dumps(INFLUENZA))
+        catalog.refresh()
+        assert catalog.refresh().updated == 1
+
+    def test_invalid_json_leaves_index_unchanged(self, catalog, root):
+        catalog.refresh()
+        _write(root / "broken.json", "{")
+        with pytest.raises(json.JSONDecodeError, match="broken.json"):
+            catalog.refresh()
+        assert set(catalog.load()) == {"dengue", "influenza"}
+
+    def test_outdated_index_is_rebuilt(self, root, index_path):
+        with DefinitionCatalog(root, index_path) as catalog:
+            catalog.refresh()
+        with sqlite3.connect(index_path) as connection:
+            connection.execute("PRAGMA user_version = 0")
+        with DefinitionCatalog(root, index_path) as catalog:
+            assert catalog.refresh().added == 3
+
+    def test_falls_back_to_memory_when_index_is_not_writable(self, root, tmp_path):
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        with DefinitionCatalog(root, blocker / "index.sqlite") as catalog:
+            assert set(catalog.load()) == {"dengue", "influenza"}
+
+    def test_default_index_path_depends_on_directory(self, tmp_path):
+        assert default_index_path(tmp_path / "a") != default_index_path(tmp_path / "b")
+        assert default_index_path(tmp_path / "a").suffix == ".sqlite"
+
+
+class TestPruneIndexes:
+    def test_default_index_is_kept_in_index_dir(self, root, index_dir):
+        with DefinitionCatalog(root) as catalog:
+            catalog.load()
+        assert list(index_dir.iterdir()) == [default_index_path(root)]
+
+    def test_keeps_most_recently_used(self, index_dir):
+        index_dir.mkdir()
+        for age, name in enumerate(["c", "b", "a"]):
+            _write(index_dir / f"{name}.sqlite", "", age=60 * (age + 1))
+        _write(index_dir / "notes.txt", "", age=600)
+
+        assert prune_indexes(keep=1) == [index_dir / "b.sqlite", index_dir / "a.sqlite"]
+        assert sorted(p.name for p in index_dir.iterdir()) == ["c.sqlite", "notes.txt"]
+
+    def test_opening_an_index_prunes_the_others(self, root, index_dir, monkeypatch):
+        monkeypatch.setattr("opensyndrome.catalog.MAX_INDEXES", 1)
+        index_dir.mkdir()
+        _write(index_dir / "other.sqlite", "")
+
+        with DefinitionCatalog(root) as catalog:
+            catalog.load()
+
+        assert list(index_dir.iterdir()) == [default_index_path(root)]
+
+    def test_indexes_elsewhere_do_not_prune(self, root, index_path, index_dir):
+        index_dir.mkdir()
+        _write(index_dir / "other.sqlite", "")
+
+        with DefinitionCatalog(root, index_path) as catalog:
+            catalog.load()
+
+        assert list(index_dir.iterdir()) == [index_dir / "other.sqlite"]
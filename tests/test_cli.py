@@ -1,5 +1,10 @@
+import json
+import os
+import subprocess
+import sys
 from unittest.mock import Mock
 
+import polars as pl
 from click.testing import CliRunner
 
 from opensyndrome.cli import cli, is_ollama_available
@@ -10,15 +15,15 @@ from ollama._types import ResponseError
 class TestIsOllamaAvailable:
     @pytest.fixture
     def mock_ollama(self, mocker):
-        _mock_ollama = mocker.patch("opensyndrome.cli.ollama")
+        _mock_list = mocker.patch("ollama.list")
         list_response = Mock(models=[Mock(model="mistral")])
 
         def make_mock(return_value=None, side_effect=None):
             if side_effect:
-                _mock_ollama.list.side_effect = side_effect
+                _mock_list.side_effect = side_effect
             else:
-                _mock_ollama.list.return_value = return_value or list_response
-            return _mock_ollama
+                _mock_list.return_value = return_value or list_response
+            return _mock_list
 
         return make_mock
 
@@ -43,7 +48,7 @@ class TestConvertToJson:
     @pytest.fixture
     def mock_convert(self, mocker):
         return mocker.patch(
-            "opensyndrome.cli.generate_machine_readable_format",
+            "opensyndrome.converters.generate_machine_readable_format",
             return_value={"name": "Pneumonia"},
         )
 
@@ -57,7 +62,7 @@ class TestConvertToJson:
         result = runner.invoke(cli, ["convert", "-hr", "Any person with pneumonia"])
         assert result.exit_code == 0
         mock_convert.assert_called_once_with(
-            "Any person with pneumonia", "mistral", "American English"
+            "Any person with pneumonia", "mistral", "American English", cache=True
         )
 
     def test_convert_with_human_readable_file(
@@ -68,7 +73,14 @@ class TestConvertToJson:
         result = runner.invoke(cli, ["convert", "-hf", str(definition_file)])
         assert result.exit_code == 0
         mock_convert.assert_called_once_with(
-            "Any person with pneumonia", "mistral", "American English"
+            "Any person with pneumonia", "mistral", "American English", cache=True
+        )
+
+    def test_convert_without_cache(self, runner, mock_convert, mock_ollama_available):
+        result = runner.invoke(cli, ["convert", "-hr", "Pneumonia", "--no-cache"])
+        assert result.exit_code == 0
+        mock_convert.assert_called_once_with(
+            "Pneumonia", "mistral", "American English", cache=False
         )
 
     def test_convert_with_hr_and_hf_raises_error(
@@ -94,3 +106,471 @@ class TestConvertToJson:
     ):
         result = runner.invoke(cli, ["convert", "-hf", "nonexistent.txt"])
         assert result.exit_code == 2
+
+
+@pytest.fixture
+def definition_file(tmp_path):
+    path = tmp_path / "dengue.json"
+    path.write_text(
+        '{"inclusion_criteria": [{"type": "diagnosis", "code": {"code": "A90"}}]}'
+    )
+    return str(path)
+
+
+@pytest.fixture
+def definitions_dir(tmp_path, definition_file):
+    directory = tmp_path / "definitions"
+    (directory / "j").mkdir(parents=True)
+    (directory / "j" / "influenza.json").write_text(
+        '{"inclusion_criteria": [{"type": "diagnosis", "code": {"code": "J1%"}}]}'
+    )
+    (directory / "empty.json").write_text("")
+    return str(directory)
+
+
+PROFILE_ARGS = ["-m", "tests/fixtures/mapping.yaml", "-p", "fake_dataset"]
+
+
+class TestFilterDataset:
+    def test_writes_matching_rows_to_parquet(self, tmp_path, definition_file):
+        output = tmp_path / "dengue.parquet"
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", definition_file, "-o", str(output)],
+        )
+        assert result.exit_code == 0, result.output
+        filtered = pl.read_parquet(output)
+        assert filtered.height == 52
+        assert filtered.columns == [
+            "recording_ts",
+            "icd_code",
+            "sex",
+            "age",
+            "location",
+        ]
+
+    def test_keeps_rows_matching_any_definition(
+        self, tmp_path, definition_file, definitions_dir
+    ):
+        output = tmp_path / "cases.csv"
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", definition_file, "-d", definitions_dir, "-o", str(output)]
+            + ["--in-memory"],
+        )
+        assert result.exit_code == 0, result.output
+        filtered = pl.read_csv(output)
+        assert filtered.height == 52 + 38
+        assert filtered.columns == [
+            "recording_ts",
+            "icd_code",
+            "sex",
+            "age",
+            "location",
+        ]
+
+    def test_reads_definitions_from_bundle(self, tmp_path, definitions_dir):
+        bundle = tmp_path / "definitions.ndjson"
+        packed = CliRunner().invoke(cli, ["pack", definitions_dir, "-o", str(bundle)])
+        assert packed.exit_code == 0, packed.output
+        output = tmp_path / "cases.csv"
+
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", str(bundle), "-o", str(output)],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert pl.read_csv(output).height == 38
+
+    def test_writes_one_file_per_partition_to_directory(
+        self, tmp_path, definition_file
+    ):
+        partitions = tmp_path / "partitions"
+        partitions.mkdir()
+        dataset = pl.read_csv("tests/fixtures/fake_dataset.csv")
+        dataset.head(250).write_parquet(partitions / "a.parquet")
+        dataset.tail(250).write_ndjson(partitions / "b.ndjson")
+        output = tmp_path / "out"
+        result = CliRunner().invoke(
+            cli,
+            ["filter", str(partitions), *PROFILE_ARGS]
+            + ["-d", definition_file, "-o", str(output), "-w", "2"],
+        )
+        assert result.exit_code == 0, result.output
+        assert sorted(p.name for p in output.iterdir()) == ["a.parquet", "b.parquet"]
+        assert pl.read_parquet(output / "*.parquet").height == 52
+
+    def test_missing_input_is_a_usage_error(self, tmp_path, definition_file):
+        result = CliRunner().invoke(
+            cli,
+            ["filter", str(tmp_path / "*.parquet"), *PROFILE_ARGS]
+            + ["-d", definition_file, "-o", str(tmp_path / "out.parquet")],
+        )
+        assert result.exit_code == 2
+
+    def test_unresolvable_criteria(self, tmp_path):
+        definition = tmp_path / "fever.json"
+        definition.write_text(
+            '{"inclusion_criteria": [{"type": "symptom", "name": "fever"}]}'
+        )
+        args = ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+        args += ["-d", str(definition), "-o", str(tmp_path / "out.parquet")]
+
+        failed = CliRunner().invoke(cli, args)
+        assert failed.exit_code == 1
+        assert "Cannot evaluate definition" in failed.output
+
+        skipped = CliRunner().invoke(cli, args + ["--skip-unresolvable"])
+        assert skipped.exit_code == 0, skipped.output
+        assert pl.read_parquet(tmp_path / "out.parquet").height == 500
+
+    @pytest.mark.parametrize("in_directory", [False, True])
+    def test_invalid_definition_is_a_usage_error(self, tmp_path, in_directory):
+        broken = tmp_path / "definitions" / "broken.json"
+        broken.parent.mkdir()
+        broken.write_text("{")
+        definition = broken.parent if in_directory else broken
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", str(definition), "--count"],
+        )
+        assert result.exit_code == 2
+        assert "Invalid JSON" in result.output
+        assert "broken.json" in result.output
+
+    def test_dictionary_evaluation_is_opt_in(self, tmp_path, definition_file):
+        args = ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+        args += ["-d", definition_file, "--count"]
+        result = CliRunner().invoke(cli, args + ["--dictionary-max-values", "100"])
+        assert result.exit_code == 0, result.output
+        assert "1 partitions, 52 matching rows" in result.output
+
+    def test_counts_matching_rows_per_partition(self, tmp_path, definition_file):
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/*.csv", *PROFILE_ARGS]
+            + ["-d", definition_file, "--count", "-w", "2"],
+        )
+        assert result.exit_code == 0, result.output
+        assert "tests/fixtures/fake_dataset.csv: 52 rows" in result.output
+        assert "1 partitions, 52 matching rows" in result.output
+        assert [str(path) for path in tmp_path.iterdir()] == [definition_file]
+
+    def test_count_does_not_take_an_output(self, tmp_path, definition_file):
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", definition_file, "--count", "-o", str(tmp_path / "out.csv")],
+        )
+        assert result.exit_code == 2
+        assert "Cannot use --count and --output" in result.output
+
+    def test_output_is_required_without_count(self, definition_file):
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", definition_file],
+        )
+        assert result.exit_code == 2
+        assert "Missing option '-o' / '--output'" in result.output
+
+    def test_unknown_profile_is_a_usage_error(self, definition_file):
+        result = CliRunner().invoke(
+            cli,
+            ["filter", "tests/fixtures/fake_dataset.csv"]
+            + ["-m", "tests/fixtures/mapping.yaml", "-p", "missing"]
+            + ["-d", definition_file, "--count"],
+        )
+        assert result.exit_code == 2
+        assert "Profile 'missing' not found" in result.output
+
+
+class TestLabelDataset:
+    def test_adds_one_column_per_definition(
+        self, tmp_path, definition_file, definitions_dir
+    ):
+        output = tmp_path / "labeled.parquet"
+        result = CliRunner().invoke(
+            cli,
+            ["label", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", definition_file, "-d", definitions_dir, "-o", str(output)],
+        )
+        assert result.exit_code == 0, result.output
+        labeled = pl.read_parquet(output)
+        assert labeled.height == 500
+        assert labeled["dengue"].sum() == 52
+        assert labeled["influenza"].sum() == 38
+
+    def test_syndrome_criteria_refer_to_other_definitions(
+        self, tmp_path, definition_file
+    ):
+        elderly_dengue = tmp_path / "elderly_dengue.json"
+        elderly_dengue.write_text(
+            '{"inclusion_criteria": [{"type": "syndrome", "name": "dengue"}, '
+            '{"type": "demographic_criteria", "name": "elderly", '
+            '"attribute": "age", "operator": ">=", "value": 65}]}'
+        )
+        output = tmp_path / "labeled.parquet"
+        result = CliRunner().invoke(
+            cli,
+            ["label", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", definition_file, "-d", str(elderly_dengue), "-o", str(output)],
+        )
+        assert result.exit_code == 0, result.output
+        labeled = pl.read_parquet(output)
+        assert labeled.filter("elderly_dengue")["dengue"].all()
+        assert 0 < labeled["elderly_dengue"].sum() < labeled["dengue"].sum()
+
+    def test_circular_syndrome_references_fail(self, tmp_path):
+        for name, other in (("a", "b"), ("b", "a")):
+            (tmp_path / f"{name}.json").write_text(
+                f'{{"inclusion_criteria": [{{"type": "syndrome", "name": "{other}"}}]}}'
+            )
+        result = CliRunner().invoke(
+            cli,
+            ["label", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", str(tmp_path / "a.json"), "-d", str(tmp_path / "b.json")]
+            + ["-o", str(tmp_path / "out.parquet")],
+        )
+        assert result.exit_code == 1
+        assert "a -> b -> a" in result.output
+
+    def test_without_definitions_is_a_usage_error(self, tmp_path, definitions_dir):
+        empty = tmp_path / "none"
+        empty.mkdir()
+        result = CliRunner().invoke(
+            cli,
+            ["label", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+            + ["-d", str(empty), "-o", str(tmp_path / "out.parquet")],
+        )
+        assert result.exit_code == 2
+        assert "No definitions found" in result.output
+
+
+class TestLabelIncremental:
+    def test_appends_new_rows(self, tmp_path, definition_file):
+        source = tmp_path / "feed.parquet"
+        feed = pl.read_csv("tests/fixtures/fake_dataset.csv")
+        feed.filter(pl.col("recording_ts") < "2025").write_parquet(source)
+        output = tmp_path / "labels"
+        args = ["label", str(source), *PROFILE_ARGS, "-d", str(definition_file)]
+        args += ["-o", str(output), "--watermark", "recording_ts"]
+
+        first = CliRunner().invoke(cli, args)
+        assert first.exit_code == 0, first.output
+        assert "Relabelled all 366 rows (no previous state)" in first.output
+
+        feed.write_parquet(source)
+        second = CliRunner().invoke(cli, args)
+        assert second.exit_code == 0, second.output
+        assert "Appended 134 new rows" in second.output
+        assert pl.read_parquet(output).height == 500
+
+    def test_requires_parquet_output(self, tmp_path, definition_file):
+        args = ["label", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+        args += ["-d", str(definition_file), "-o", str(tmp_path / "out.csv")]
+        result = CliRunner().invoke(cli, args + ["--watermark", "recording_ts"])
+        assert result.exit_code == 2
+        assert "directory of Parquet files" in result.output
+
+
+class TestExplain:
+    def test_prints_table(self, definition_file):
+        args = ["explain", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+        result = CliRunner().invoke(cli, args + ["-d", str(definition_file)])
+        assert result.exit_code == 0, result.output
+        assert "selectivity" in result.output
+        assert "[inclusion_criteria[0]]" in result.output
+        assert "10.40%" in result.output
+
+    def test_prints_json(self, definition_file):
+        args = ["explain", "tests/fixtures/fake_dataset.csv", *PROFILE_ARGS]
+        args += ["-d", str(definition_file), "--json"]
+        result = CliRunner().invoke(cli, args)
+        assert result.exit_code == 0, result.output
+        report = json.loads(result.output)
+        assert report["total_rows"] == 500
+        assert report["root"]["rows"] == 52
+
+
+class TestListDefinitions:
+    def test_lists_title_location_and_version(self):
+        result = CliRunner().invoke(cli, ["list", "tests/definitions"])
+        assert result.exit_code == 0, result.output
+        assert (
+            "dengue_usa: Open Syndrome Dengue (United States, 1.0.0)" in result.output
+        )
+
+    def test_json(self):
+        result = CliRunner().invoke(cli, ["list", "tests/definitions", "--json"])
+        assert result.exit_code == 0, result.output
+        entries = json.loads(result.output)
+        assert {entry["name"] for entry in entries} >= {"dengue_usa", "zika_paho"}
+
+
+class TestPack:
+    def test_packs_directory(self, tmp_path):
+        bundle = tmp_path / "definitions.ndjson"
+
+        result = CliRunner().invoke(cli, ["pack", "tests/definitions", "-o", bundle])
+
+        assert result.exit_code == 0, result.output
+        assert f"11 definitions packed into {bundle}" in result.output
+        assert len(bundle.read_text().splitlines()) == 11
+
+    def test_invalid_definition(self, tmp_path):
+        (tmp_path / "broken.json").write_text("{")
+        output = str(tmp_path / "definitions.ndjson")
+        result = CliRunner().invoke(cli, ["pack", str(tmp_path), "-o", output])
+        assert result.exit_code == 1
+        assert "Invalid definition in" in result.output
+
+    def test_output_must_be_a_bundle(self, tmp_path):
+        output = str(tmp_path / "definitions.json")
+        result = CliRunner().invoke(cli, ["pack", "tests/definitions", "-o", output])
+        assert result.exit_code == 2
+        assert "Expected a file ending with .ndjson or .ndjson.zst" in result.output
+
+
+class TestStartup:
+    @pytest.mark.parametrize("args", [[], ["--help"], ["list", "tests/definitions"]])
+    def test_heavy_dependencies_are_not_imported(self, args, tmp_path):
+        heavy = ["polars", "ollama", "pydantic", "jsonschema", "pygments", "requests"]
+        code = (
+            "import sys; from opensyndrome.cli import cli\n"
+            f"try: cli({args!r})\n"
+            "except SystemExit: pass\n"
+            f"print([m for m in {heavy!r} if m in sys.modules], file=sys.stderr)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "OPEN_SYNDROME_HOME": str(tmp_path)},
+        )
+        assert result.stderr.splitlines()[-1] == "[]"
+        # download folders are only created when downloading
+        assert not (tmp_path / "v1" / "definitions").exists()
+
+
+VALIDATION_SCHEMA = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "type": "object",
+    "required": ["title"],
+    "properties": {"title": {"type": "string"}},
+}
+
+
+class TestValidate:
+    @pytest.fixture
+    def definitions(self, tmp_path):
+        (tmp_path / "schema.json").write_text(json.dumps(VALIDATION_SCHEMA))
+        directory = tmp_path / "definitions"
+        (directory / "a").mkdir(parents=True)
+        (directory / "a" / "dengue.json").write_text('{"title": "Dengue"}')
+        (directory / "zika.json").write_text('{"title": 1}')
+        (directory / "broken.json").write_text("{")
+        return directory
+
+    def invoke(self, definitions, *args):
+        schema = str(definitions.parent / "schema.json")
+        return CliRunner().invoke(cli, ["validate", *args, "--schema-file", schema])
+
+    def test_single_valid_file(self, definitions):
+        result = self.invoke(definitions, str(definitions / "a" / "dengue.json"))
+        assert result.exit_code == 0, result.output
+        assert "✅" in result.output
+        assert "1 definitions, 1 valid, 0 invalid" in result.output
+
+    def test_directory_reports_every_file_and_fails(self, definitions):
+        result = self.invoke(definitions, str(definitions))
+        assert result.exit_code == 1
+        assert f"❌ {definitions / 'zika.json'}" in result.output
+        assert "$.title: 1 is not of type 'string'" in result.output
+        assert "3 definitions, 1 valid, 2 invalid" in result.output
+
+    def test_json_lines(self, definitions):
+        result = CliRunner().invoke(
+            cli,
+            [
+                "validate",
+                f"{definitions}/**/*.json",
+                "--format",
+                "jsonl",
+                "--schema-file",
+                str(definitions.parent / "schema.json"),
+            ],
+        )
+        assert result.exit_code == 1
+        lines = [json.loads(line) for line in result.stdout.splitlines()]
+        assert [(line["source"], line["valid"]) for line in lines] == [
+            (str(definitions / "a" / "dengue.json"), True),
+            (str(definitions / "broken.json"), False),
+            (str(definitions / "zika.json"), False),
+        ]
+        assert lines[2]["errors"] == [
+            {
+                "path": "$.title",
+                "validator": "type",
+                "message": "1 is not of type 'string'",
+            }
+        ]
+        assert "3 definitions" in result.stderr
+
+    def test_junit(self, definitions):
+        from xml.etree import ElementTree
+
+        result = CliRunner().invoke(
+            cli,
+            [
+                "validate",
+                str(definitions),
+                "--format",
+                "junit",
+                "--schema-file",
+                str(definitions.parent / "schema.json"),
+            ],
+        )
+        assert result.exit_code == 1
+        suite = ElementTree.fromstring(result.stdout).find("testsuite")
+        assert suite.attrib["tests"] == "3"
+        assert suite.attrib["failures"] == "1"
+        assert suite.attrib["errors"] == "1"
+        cases = {case.attrib["name"]: case for case in suite.iter("testcase")}
+        assert cases[str(definitions / "zika.json")].find("failure") is not None
+        assert cases[str(definitions / "broken.json")].find("error") is not None
+
+    def test_bundle(self, definitions, tmp_path):
+        bundle = tmp_path / "definitions.ndjson"
+        (definitions / "broken.json").unlink()
+        packed = CliRunner().invoke(cli, ["pack", str(definitions), "-o", str(bundle)])
+        assert packed.exit_code == 0, packed.output
+
+        result = self.invoke(definitions, str(bundle), str(definitions))
+
+        assert result.exit_code == 1
+        assert f"✅ {bundle}#a/dengue.json" in result.output
+        assert f"❌ {bundle}#zika.json" in result.output
+        assert "4 definitions, 2 valid, 2 invalid" in result.output
+
+    def test_no_definitions_found(self, definitions, tmp_path):
+        result = self.invoke(definitions, f"{tmp_path}/nothing/*.json")
+        assert result.exit_code == 2
+        assert "No definitions found" in result.output
+
+    def test_pydantic_backend(self, definitions):
+        result = CliRunner().invoke(
+            cli, ["validate", str(definitions / "zika.json"), "--backend", "pydantic"]
+        )
+        assert result.exit_code == 1
+        assert "$.title: Input should be a valid string" in result.output
+
+    def test_schema_file_is_only_for_jsonschema(self, definitions):
+        result = self.invoke(definitions, str(definitions), "--backend", "pydantic")
+        assert result.exit_code == 2
+        assert "Only used by the jsonschema backend" in result.output
@@ -1,11 +1,15 @@
 from pathlib import Path
+from unittest.mock import Mock
 
 import pytest
 
+from opensyndrome.bundle import pack
 from opensyndrome.converters import (
     _add_first_level_required_fields,
     load_examples,
     _fill_automatic_fields,
+    generate_human_readable_format,
+    generate_machine_readable_format,
 )
 
 
@@ -41,6 +45,17 @@ class TestLoadExamples:
         assert examples.count('"inclusion_criteria"') == expected_number_of_definitions
         assert examples.count("- {") == expected_number_of_definitions
 
+    def test_load_examples_from_bundle(self, tmp_path):
+        bundle = tmp_path / "definitions.ndjson"
+        pack(Path("tests/definitions/"), bundle)
+
+        examples = load_examples(bundle)
+
+        assert examples.count("- {") == 11
+        assert sorted(examples.splitlines()) == sorted(
+            load_examples(Path("tests/definitions/")).splitlines()
+        )
+
     @pytest.mark.parametrize("k", range(1, 4))
     def test_load_examples_with_k_random_samples(self, k):
         examples_dir = Path("tests/definitions/")
@@ -104,3 +119,51 @@ class TestFillAutomaticFields:
             definition_with_automatic_fields["human_readable_definition"]
             == human_readable_definition
         )
+
+
+class TestResponseCache:
+    @pytest.fixture(autouse=True)
+    def cache_path(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            "opensyndrome.cache.CACHE_PATH", tmp_path / "responses.sqlite"
+        )
+
+    @pytest.fixture
+    def mock_chat(self, mocker):
+        return mocker.patch(
+            "opensyndrome.converters.chat",
+            return_value=Mock(message=Mock(content='{"title": "Dengue"}')),
+        )
+
+    def test_same_request_runs_the_model_once(self, mock_chat, mocker):
+        mocker.patch(
+            "opensyndrome.converters._fill_automatic_fields",
+            side_effect=lambda definition, _: definition,
+        )
+
+        first = generate_machine_readable_format("Fever and rash", "mistral")
+        second = generate_machine_readable_format("Fever and rash", "mistral")
+
+        assert first == second == {"title": "Dengue"}
+        assert mock_chat.call_count == 1
+        assert mock_chat.call_args.kwargs["format"]["title"]
+
+    def test_model_language_and_prompt_are_part_of_the_key(self, mock_chat):
+        definition = {"inclusion_criteria": [{"type": "symptom", "name": "fever"}]}
+
+        generate_human_readable_format(definition, "mistral")
+        generate_human_readable_format(definition, "llama3")
+        generate_human_readable_format(definition, "mistral", "Portuguese")
+        generate_human_readable_format({"inclusion_criteria": []}, "mistral")
+        generate_human_readable_format(definition, "mistral")
+
+        assert mock_chat.call_count == 4
+
+    def test_without_cache_the_model_is_always_run(self, mock_chat):
+        definition = {"inclusion_criteria": [{"type": "symptom", "name": "fever"}]}
+        generate_human_readable_format(definition)
+        mock_chat.return_value = Mock(message=Mock(content="Fever."))
+
+        assert generate_human_readable_format(definition, cache=False) == "Fever."
+        assert generate_human_readable_format(definition) == "Fever."
+        assert mock_chat.call_count == 2
@@ -1,4 +1,8 @@
+import json
 import re
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 import polars as pl
 
@@ -7,15 +11,27 @@ from opensyndrome.filter import (
     load_profile,
     ProfileData,
     InvalidOperator,
+    InvalidPattern,
     UnresolvableCriterion,
     OSDEngine,
+    CircularReference,
+    CompiledDefinition,
+    Explanation,
+    FusionReport,
+    SelectivityEstimate,
+    collect,
+    code_index_name,
+    compile_pattern,
     _code_to_regex,
     _apply_flags,
     _cast,
     _combine,
     _build_code_expr,
+    _code_predicate,
+    _build_codes_expr,
     _build_text_expr,
     _build_attr_expr,
+    _match_dictionary,
     _parse_criterion,
 )
 
@@ -191,6 +207,92 @@ class TestApplyFlags:
     def test_ignores_unsupported_flags(self):
         assert _apply_flags("dengue", "z") == "dengue"
 
+    def test_drops_global_and_unicode_flags(self):
+        assert _apply_flags("dengue", "gu") == "dengue"
+        assert _apply_flags("dengue", "gi") == "(?i)dengue"
+
+    def test_translates_multiline_and_dotall_flags(self):
+        assert _apply_flags("a.b", "ms") == "(?m)(?s)a.b"
+
+    def test_sticky_flag_anchors_at_start(self):
+        pattern = _apply_flags("deng|zika", "y")
+        assert pattern == r"\A(?:deng|zika)"
+        values = pl.Series(["dengue", "zika", "suspected dengue"])
+        assert values.str.contains(pattern).to_list() == [True, True, False]
+
+
+class TestCompilePattern:
+    @pytest.mark.parametrize(
+        "pattern, literal, match",
+        [
+            ("dengue", "dengue", "contains"),
+            ("Frankfurt am Main", "Frankfurt am Main", "contains"),
+            (r"A\.90", "A.90", "contains"),
+            ("^fever", "fever", "starts_with"),
+            (r"\Afever", "fever", "starts_with"),
+            ("fever$", "fever", "ends_with"),
+            (r"US\$", "US$", "contains"),
+            (r"fever\z", "fever", "ends_with"),
+            (r"^A90\z", "A90", "equals"),
+            (r"C:\\z", "C:\\z", "contains"),
+            ("^A90$", "A90", "equals"),
+            ("deng[u]?e", None, "regex"),
+            (r"\d+", None, "regex"),
+            ("^a|b$", None, "regex"),
+        ],
+    )
+    def test_detects_literal_patterns(self, pattern, literal, match):
+        compiled = compile_pattern(pattern)
+        assert (compiled.literal, compiled.match) == (literal, match)
+
+    def test_flags(self):
+        assert compile_pattern("dengue", "i").match == "regex"
+        assert compile_pattern("dengue", "x").match == "regex"
+        assert compile_pattern("dengue", "y").match == "starts_with"
+        assert compile_pattern("dengue$", "y").match == "equals"
+        assert compile_pattern("dengue", "gu").match == "contains"
+        assert compile_pattern("^dengue", "m").match == "regex"
+
+    @pytest.mark.parametrize(
+        "pattern, flags",
+        [
+            ("Frankfurt", ""),
+            ("^Frank", ""),
+            ("furt$", ""),
+            (r"furt\z", ""),
+            ("^Frankfurt$", ""),
+            ("Frank", "y"),
+            ("^Frank", "m"),
+            ("frankfurt", "i"),
+        ],
+    )
+    def test_fast_paths_match_like_regex(self, fake_dataset, pattern, flags):
+        compiled = compile_pattern(pattern, flags)
+        regex = pl.col("location").str.contains(compiled.pattern)
+        assert fake_dataset.select(compiled.contains(pl.col("location"))).equals(
+            fake_dataset.select(regex)
+        )
+
+    @pytest.mark.parametrize("pattern", ["deng(ue", r"(?<=a)b", r"(a)\1"])
+    def test_invalid_patterns_raise(self, pattern):
+        with pytest.raises(InvalidPattern, match="Invalid regex pattern"):
+            compile_pattern(pattern)
+
+    def test_patterns_are_cached(self):
+        compile_pattern.cache_clear()
+        first = compile_pattern("zika", "i")
+        assert compile_pattern("zika", "i") is first
+        assert compile_pattern.cache_info().hits == 1
+
+    def test_literal_contains_matches_like_regex(self):
+        values = pl.Series(["A.90", "A190", None])
+        compiled = compile_pattern(r"A\.90")
+        assert pl.select(compiled.contains(pl.lit(values))).to_series().to_list() == [
+            True,
+            False,
+            None,
+        ]
+
 
 class TestCast:
     def test_skips_cast_when_column_is_any_integer_type(self):
@@ -348,6 +450,74 @@ class TestBuildCodeExpr:
         with pytest.raises(UnresolvableCriterion, match="diagnosis"):
             _build_code_expr(criterion, columns)
 
+    @pytest.mark.parametrize("code", ["J1%", "A90", "J%.%", "J1_"])
+    def test_code_predicate_matches_like_regex(self, fake_dataset, code):
+        values = pl.col("icd_code").str.strip_chars()
+        regex = values.str.contains(_code_to_regex(code))
+        assert fake_dataset.select(_code_predicate(code)(values)).equals(
+            fake_dataset.select(regex)
+        )
+
+
+class TestBuildCodesExpr:
+    _values = [
+        "A90",
+        " A90 ",
+        "A90.1",
+        "A90.",
+        "A90..",
+        "A900",
+        "A91",
+        "J10",
+        "J1X.9",
+        "J20",
+        "B50-1",
+        "a90",
+        None,
+    ]
+
+    @staticmethod
+    def _criteria(*codes):
+        return [
+            {"type": "diagnosis", "code": {"system": "ICD-10", "code": code}}
+            for code in codes
+        ]
+
+    @pytest.mark.parametrize(
+        "codes",
+        [
+            ("A90", "A91"),
+            ("J1%", "A9%"),
+            ("A90", "J1%", "B50-1"),
+            ("A90.1", "J10"),
+        ],
+    )
+    def test_equivalent_to_or_of_single_codes(self, icd_columns, codes):
+        df = pl.DataFrame({"icd_code": self._values})
+        criteria = self._criteria(*codes)
+        expected = df.select(
+            pl.any_horizontal(_build_code_expr(c, icd_columns) for c in criteria)
+        )
+        merged = df.select(_build_codes_expr(criteria, icd_columns))
+        assert merged.to_series().to_list() == expected.to_series().to_list()
+
+    def test_plain_codes_use_a_set_lookup(self, icd_columns):
+        expr = str(_build_codes_expr(self._criteria("A90", "A91"), icd_columns))
+        assert expr.count("strip_chars") == 1
+        assert "is_in" in expr
+        assert "str.contains" not in expr
+
+    def test_wildcards_use_a_single_alternation(self, icd_columns):
+        criteria = self._criteria("A90", "A91", "J1%", "A9%")
+        expr = str(_build_codes_expr(criteria, icd_columns))
+        assert expr.count("strip_chars") == 1
+        assert expr.count("str.contains") == 1
+
+    def test_raises_when_no_diagnosis_column_exists(self):
+        columns = [ColumnSpec("age", concept="demographic_criteria", attribute="age")]
+        with pytest.raises(UnresolvableCriterion, match="diagnosis"):
+            _build_codes_expr(self._criteria("A90", "A91"), columns)
+
 
 class TestBuildTextExpr:
     def test_matches_rows_containing_name_pattern(
@@ -392,6 +562,22 @@ class TestBuildTextExpr:
         with pytest.raises(UnresolvableCriterion, match="epidemiological_history"):
             _build_text_expr(criterion, icd_columns, "epidemiological_history")
 
+    def test_literal_pattern_uses_literal_search(self, epidemiological_history_columns):
+        criterion = {"type": "symptom", "name": "Frankfurt"}
+        expr = _build_text_expr(
+            criterion, epidemiological_history_columns, "epidemiological_history"
+        )
+        assert '"literal":true' in expr.meta.serialize(format="json")
+
+    def test_invalid_pattern_raises_at_compile_time(
+        self, epidemiological_history_columns
+    ):
+        criterion = {"type": "symptom", "regex_pattern": "Frank(furt"}
+        with pytest.raises(InvalidPattern, match="unclosed group"):
+            _build_text_expr(
+                criterion, epidemiological_history_columns, "epidemiological_history"
+            )
+
 
 class TestBuildAttrExpr:
     def test_numeric_greater_than(self, fake_dataset, demographic_columns):
@@ -560,6 +746,36 @@ class TestParseCriterion:
         with pytest.raises(InvalidOperator, match="logical_operator_arguments"):
             _parse_criterion(criterion, all_columns)
 
+    def test_or_group_of_codes_is_merged(self, fake_dataset, all_columns):
+        criterion = {
+            "type": "criterion",
+            "logical_operator": "OR",
+            "values": [
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "A90"}},
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "J1%"}},
+                {"type": "epidemiological_history", "name": "Frankfurt"},
+            ],
+        }
+        expr = _parse_criterion(criterion, all_columns)
+        assert str(expr).count("strip_chars") == 1
+        expected = (
+            pl.col("icd_code").str.starts_with("J1")
+            | pl.col("icd_code").eq("A90")
+            | pl.col("location").eq("Frankfurt")
+        )
+        assert fake_dataset.filter(expr).equals(fake_dataset.filter(expected))
+
+    def test_and_group_of_codes_is_not_merged(self, all_columns):
+        criterion = {
+            "type": "criterion",
+            "logical_operator": "AND",
+            "values": [
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "A90"}},
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "J1%"}},
+            ],
+        }
+        assert str(_parse_criterion(criterion, all_columns)).count("strip_chars") == 2
+
     def test_missing_type_raises_with_clear_message(self, all_columns):
         with pytest.raises(UnresolvableCriterion, match="missing.*type"):
             _parse_criterion({"name": "no type here"}, all_columns)
@@ -881,3 +1097,832 @@ class TestOSDEngine:
         }
         with pytest.raises(UnresolvableCriterion):
             engine.filter(fake_dataset, definition)
+
+
+class TestOSDEngineLazyFrame:
+    _definition = {
+        "inclusion_criteria": [
+            {"type": "diagnosis", "code": {"system": "ICD-10", "code": "J1%"}}
+        ],
+        "exclusion_criteria": [
+            {
+                "type": "demographic_criteria",
+                "attribute": "age",
+                "operator": ">",
+                "value": 60,
+            }
+        ],
+    }
+
+    def test_filter_returns_lazy_frame(self, fake_dataset, engine):
+        result = engine.filter(fake_dataset.lazy(), self._definition)
+        assert isinstance(result, pl.LazyFrame)
+
+    def test_filter_matches_eager_result(self, fake_dataset, engine):
+        eager = engine.filter(fake_dataset, self._definition)
+        lazy = engine.filter(fake_dataset.lazy(), self._definition)
+        assert collect(lazy).equals(eager)
+
+    def test_label_matches_eager_result(self, fake_dataset, engine):
+        eager = engine.label(fake_dataset, {"influenza": self._definition})
+        lazy = engine.label(fake_dataset.lazy(), {"influenza": self._definition})
+        assert isinstance(lazy, pl.LazyFrame)
+        assert collect(lazy, streaming=False).equals(eager)
+
+    def test_label_reads_nothing_before_collect(self, engine, tmp_path):
+        path = tmp_path / "cases.csv"
+        shutil.copy("tests/fixtures/fake_dataset.csv", path)
+        scan = pl.scan_csv(path)
+        scan.collect_schema()
+        path.unlink()
+
+        engine.label(scan, {"influenza": self._definition})
+        engine.filter(scan, self._definition)
+
+    def test_filter_pushes_predicate_into_scan(self, engine):
+        scan = pl.scan_csv("tests/fixtures/fake_dataset.csv")
+        plan = engine.filter(scan, self._definition).explain()
+        assert "SELECTION" in plan
+        assert "FILTER" not in plan
+
+    def test_filter_without_criteria_returns_same_lazy_frame(self, engine):
+        scan = pl.scan_csv("tests/fixtures/fake_dataset.csv")
+        assert engine.filter(scan, {}) is scan
+
+    def test_collect_returns_eager_frames_unchanged(self, fake_dataset):
+        assert collect(fake_dataset) is fake_dataset
+
+
+class TestOSDEngineCompileCache:
+    _definition = {
+        "inclusion_criteria": [
+            {"type": "diagnosis", "code": {"system": "ICD-10", "code": "A90"}}
+        ]
+    }
+
+    def test_compile_returns_compiled_definition(self, fake_dataset, engine):
+        compiled = engine.compile(self._definition, dict(fake_dataset.schema))
+        assert isinstance(compiled, CompiledDefinition)
+        assert compiled.exclusion is None
+        assert fake_dataset.filter(compiled.predicate).height == 52
+
+    def test_predicate_is_none_without_criteria(self, fake_dataset, engine):
+        assert engine.compile({}, dict(fake_dataset.schema)).predicate is None
+
+    def test_repeated_filter_hits_cache(self, fake_dataset, engine):
+        engine.filter(fake_dataset.lazy(), self._definition)
+        engine.filter(fake_dataset.lazy().reverse(), self._definition)
+        info = engine.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    def test_equal_definition_content_shares_entry(self, fake_dataset, engine):
+        schema = dict(fake_dataset.schema)
+        first = engine.compile(self._definition, schema)
+        second = engine.compile(dict(reversed(self._definition.items())), schema)
+        assert first is second
+
+    def test_schema_change_is_a_miss(self, fake_dataset, engine):
+        engine.filter(fake_dataset, self._definition)
+        engine.filter(fake_dataset.with_columns(pl.col("age").cast(pl.Int32)), {})
+        engine.filter(fake_dataset.drop("location"), self._definition)
+        assert engine.cache_info().misses == 3
+
+    def test_profile_change_is_a_miss(self, fake_dataset, engine):
+        schema = dict(fake_dataset.schema)
+        first = engine.compile(self._definition, schema)
+        engine.value_encodings = {}
+        assert engine.compile(self._definition, schema) is not first
+
+    def test_evicts_least_recently_used(self, fake_dataset, profile):
+        engine = OSDEngine(profile, cache_size=1)
+        schema = dict(fake_dataset.schema)
+        engine.compile(self._definition, schema)
+        engine.compile({}, schema)
+        engine.compile(self._definition, schema)
+        info = engine.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (0, 3, 1)
+
+    def test_cache_size_zero_disables_cache(self, fake_dataset, profile):
+        engine = OSDEngine(profile, cache_size=0)
+        engine.filter(fake_dataset, self._definition)
+        engine.filter(fake_dataset, self._definition)
+        assert engine.cache_info() == (0, 2, 0, 0)
+
+    def test_cache_clear_resets_counters(self, fake_dataset, engine):
+        engine.filter(fake_dataset, self._definition)
+        engine.cache_clear()
+        assert engine.cache_info() == (0, 0, 128, 0)
+
+    def test_shared_by_threads(self, fake_dataset, profile):
+        engine = OSDEngine(profile, cache_size=2)
+        schema = dict(fake_dataset.schema)
+        definitions = [
+            {"inclusion_criteria": [{"type": "diagnosis", "code": {"code": code}}]}
+            for code in ["A90", "J1%", "A9%", "J%"]
+        ]
+
+        def compile_all(_):
+            for _ in range(50):
+                for definition in definitions:
+                    engine.compile(definition, schema)
+
+        interval = sys.getswitchinterval()
+        # switch threads as often as possible to expose races
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                list(executor.map(compile_all, range(8)))
+        finally:
+            sys.setswitchinterval(interval)
+
+        info = engine.cache_info()
+        assert info.hits + info.misses == 8 * 50 * len(definitions)
+        assert info.currsize == 2
+
+
+class TestOSDEngineFusedLabel:
+    _elderly = {
+        "type": "demographic_criteria",
+        "attribute": "age",
+        "operator": ">=",
+        "value": 65,
+    }
+    _definitions = {
+        "influenza": {
+            "inclusion_criteria": [
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "J1%"}}
+            ]
+        },
+        "influenza_elderly": {
+            "inclusion_criteria": [
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "J1%"}},
+                _elderly,
+            ]
+        },
+        "not_elderly": {"exclusion_criteria": [_elderly]},
+        "everything": {},
+    }
+
+    def test_matches_unfused_labels(self, fake_dataset, engine):
+        fused = engine.label(fake_dataset, self._definitions, fuse=True)
+        unfused = engine.label(fake_dataset, self._definitions)
+        assert fused.equals(unfused)
+
+    def test_matches_unfused_labels_on_lazy_frame(self, fake_dataset, engine):
+        fused = engine.label(fake_dataset.lazy(), self._definitions, fuse=True)
+        unfused = engine.label(fake_dataset, self._definitions)
+        assert collect(fused).equals(unfused)
+
+    def test_reports_deduplicated_leaves(self, fake_dataset, engine):
+        engine.label(fake_dataset, self._definitions, fuse=True)
+        report = engine.last_fusion_report
+        assert report == FusionReport(total_leaves=4, unique_leaves=2)
+        assert report.deduplicated == 2
+
+    def test_each_unique_leaf_becomes_one_column(self, fake_dataset, engine):
+        fused = engine.fuse(self._definitions, dict(fake_dataset.schema))
+        assert len(fused.leaves) == 2
+        assert set(fused.labels) == set(self._definitions)
+
+    def test_does_not_leak_temporary_columns(self, fake_dataset, engine):
+        labeled = engine.label(fake_dataset, self._definitions, fuse=True)
+        assert labeled.columns == fake_dataset.columns + list(self._definitions)
+
+    def test_fused_plan_is_cached(self, fake_dataset, engine):
+        engine.label(fake_dataset, self._definitions, fuse=True)
+        engine.label(fake_dataset, self._definitions, fuse=True)
+        assert engine.cache_info().hits == 1
+
+    def test_skipped_criteria_leave_no_orphan_leaves(self, fake_dataset, profile):
+        engine = OSDEngine(profile, skip_unresolvable=True)
+        definitions = {
+            "partly_unresolvable": {
+                "inclusion_criteria": [
+                    {
+                        "type": "criterion",
+                        "values": [self._elderly, {"type": "unknown", "name": "x"}],
+                    }
+                ]
+            }
+        }
+        fused = engine.fuse(definitions, dict(fake_dataset.schema))
+        assert fused.leaves == {}
+
+
+class TestMultiPatternLabel:
+    _terms = ["Berlin", "furt", "Frankfurt", "am", "Köln", "Nowhere"]
+    _definitions = {
+        **{
+            term: {
+                "inclusion_criteria": [
+                    {"type": "epidemiological_history", "name": term}
+                ]
+            }
+            for term in _terms
+        },
+        "berlin_or_regex": {
+            "inclusion_criteria": [
+                {
+                    "type": "criterion",
+                    "logical_operator": "OR",
+                    "values": [
+                        {"type": "epidemiological_history", "name": "Berlin"},
+                        {
+                            "type": "epidemiological_history",
+                            "name": "Hamburg",
+                            "regex_pattern": "^Ham",
+                        },
+                    ],
+                }
+            ]
+        },
+    }
+
+    @pytest.fixture
+    def multi_pattern_engine(self, profile):
+        return OSDEngine(profile, multi_pattern_threshold=2)
+
+    def test_matches_separate_scans(self, fake_dataset, profile, multi_pattern_engine):
+        separate = OSDEngine(profile, multi_pattern_threshold=None)
+        assert multi_pattern_engine.label(
+            fake_dataset, self._definitions, fuse=True
+        ).equals(separate.label(fake_dataset, self._definitions))
+
+    def test_overlapping_terms_all_match(self, multi_pattern_engine):
+        df = pl.DataFrame({"location": ["Frankfurt am Main", None, ""]})
+        labeled = multi_pattern_engine.label(df, self._definitions, fuse=True)
+        assert labeled.row(0, named=True) == {
+            "location": "Frankfurt am Main",
+            "Berlin": False,
+            "furt": True,
+            "Frankfurt": True,
+            "am": True,
+            "Köln": False,
+            "Nowhere": False,
+            "berlin_or_regex": False,
+        }
+        assert labeled["furt"].to_list() == [True, None, False]
+
+    def test_terms_of_a_column_share_one_scan(self, fake_dataset, multi_pattern_engine):
+        fused = multi_pattern_engine.fuse(self._definitions, dict(fake_dataset.schema))
+        assert len(fused.terms) == 1
+        assert fused.report.scanned_terms == len(self._terms)
+        labeled = multi_pattern_engine.label(fake_dataset, self._definitions, fuse=True)
+        assert labeled.columns == fake_dataset.columns + list(self._definitions)
+
+    def test_large_vocabularies_use_several_bitsets(self, multi_pattern_engine):
+        terms = [f"term{i:03d}" for i in range(150)]
+        definitions = {
+            term: {
+                "inclusion_criteria": [
+                    {"type": "epidemiological_history", "name": term}
+                ]
+            }
+            for term in terms
+        }
+        df = pl.DataFrame({"location": ["term000 term149", "term070", "none"]})
+        fused = multi_pattern_engine.fuse(definitions, dict(df.schema))
+        assert len(fused.terms) == 3
+        labeled = multi_pattern_engine.label(df, definitions, fuse=True)
+        assert labeled.select(terms).sum().sum_horizontal().item() == 3
+        assert labeled.row(0, named=True)["term149"]
+        assert labeled.row(1, named=True)["term070"]
+
+    def test_below_threshold_keeps_separate_scans(self, fake_dataset, profile):
+        engine = OSDEngine(profile, multi_pattern_threshold=10)
+        fused = engine.fuse(self._definitions, dict(fake_dataset.schema))
+        assert fused.terms == {}
+        assert fused.report.scanned_terms == 0
+
+    def test_dictionary_columns_are_not_scanned(self, fake_dataset, profile):
+        engine = OSDEngine(profile, multi_pattern_threshold=2)
+        fused = engine.fuse(
+            self._definitions,
+            dict(fake_dataset.schema),
+            dictionary_columns=frozenset({"location"}),
+        )
+        assert fused.terms == {}
+
+
+class TestSyndromeReferences:
+    _elderly = {
+        "type": "demographic_criteria",
+        "name": "elderly",
+        "attribute": "age",
+        "operator": ">=",
+        "value": 65,
+    }
+    _definitions = {
+        "influenza": {
+            "title": "Influenza",
+            "inclusion_criteria": [
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "J1%"}}
+            ],
+        },
+        "influenza_elderly": {
+            "inclusion_criteria": [{"type": "syndrome", "name": "influenza"}, _elderly]
+        },
+        "influenza_or_dengue": {
+            "inclusion_criteria": [
+                {
+                    "type": "criterion",
+                    "logical_operator": "OR",
+                    "values": [
+                        {"type": "syndrome", "name": "Influenza"},
+                        {"type": "diagnosis", "code": {"code": "A90"}},
+                    ],
+                }
+            ]
+        },
+    }
+
+    def test_resolves_registered_definitions_by_name_and_title(
+        self, fake_dataset, profile
+    ):
+        engine = OSDEngine(
+            profile, definitions={"influenza": self._definitions["influenza"]}
+        )
+        influenza = engine.filter(fake_dataset, self._definitions["influenza"])
+        elderly = engine.filter(fake_dataset, self._definitions["influenza_elderly"])
+        assert elderly.equals(influenza.filter(pl.col("age") >= 65))
+        either = engine.filter(fake_dataset, self._definitions["influenza_or_dengue"])
+        assert either.height == influenza.height + 52
+
+    def test_unknown_syndromes_stay_unresolvable(self, fake_dataset, engine):
+        with pytest.raises(UnresolvableCriterion, match="syndrome"):
+            engine.filter(fake_dataset, self._definitions["influenza_elderly"])
+
+    def test_register_invalidates_compiled_definitions(self, fake_dataset, engine):
+        engine.register({"influenza": self._definitions["influenza"]})
+        before = engine.filter(fake_dataset, self._definitions["influenza_elderly"])
+        engine.register(
+            {
+                "influenza": {
+                    "inclusion_criteria": [
+                        {"type": "diagnosis", "code": {"code": "A90"}}
+                    ]
+                }
+            }
+        )
+        after = engine.filter(fake_dataset, self._definitions["influenza_elderly"])
+        assert after["icd_code"].str.starts_with("A90").all()
+        assert not before.equals(after)
+        assert engine.definitions.keys() == {"influenza"}
+
+    def test_label_refers_to_labelled_definitions(self, fake_dataset, engine):
+        fused = engine.label(fake_dataset, self._definitions, fuse=True)
+        unfused = engine.label(fake_dataset, self._definitions)
+        assert fused.equals(unfused)
+        assert fused.columns == fake_dataset.columns + list(self._definitions)
+        assert fused.filter("influenza_elderly")["influenza"].all()
+        assert engine.definitions == {}
+
+    def test_referenced_definition_is_computed_once(self, fake_dataset, engine):
+        fused = engine.fuse(self._definitions, dict(fake_dataset.schema))
+        assert len(fused.syndromes) == 1
+        ((alias, _),) = fused.syndromes[0].items()
+        assert fused.labels["influenza"].meta.root_names() == [alias]
+
+    def test_nested_references_are_computed_in_stages(self, fake_dataset, engine):
+        definitions = {
+            **self._definitions,
+            "elderly_either": {
+                "inclusion_criteria": [
+                    {"type": "syndrome", "name": "influenza_or_dengue"},
+                    self._elderly,
+                ]
+            },
+        }
+        fused = engine.fuse(definitions, dict(fake_dataset.schema))
+        assert [len(stage) for stage in fused.syndromes] == [1, 1]
+        labeled = engine.label(fake_dataset, definitions, fuse=True)
+        assert labeled.equals(engine.label(fake_dataset, definitions))
+
+    @pytest.mark.parametrize("fuse", [False, True])
+    def test_detects_cycles(self, fake_dataset, engine, fuse):
+        definitions = {
+            "a": {"inclusion_criteria": [{"type": "syndrome", "name": "b"}]},
+            "b": {"inclusion_criteria": [{"type": "syndrome", "name": "c"}]},
+            "c": {"inclusion_criteria": [{"type": "syndrome", "name": "a"}]},
+        }
+        with pytest.raises(CircularReference, match="a -> b -> c -> a"):
+            engine.label(fake_dataset, definitions, fuse=fuse)
+
+    def test_detects_self_references(self, fake_dataset, engine):
+        definitions = {
+            "a": {
+                "title": "A",
+                "inclusion_criteria": [{"type": "syndrome", "name": "A"}],
+            }
+        }
+        with pytest.raises(CircularReference, match="a -> a"):
+            engine.label(fake_dataset, definitions, fuse=True)
+
+    def test_unresolvable_referenced_definition(self, fake_dataset, profile):
+        engine = OSDEngine(profile, skip_unresolvable=True)
+        definitions = {
+            "fever": {"inclusion_criteria": [{"type": "symptom", "name": "fever"}]},
+            "fever_elderly": {
+                "inclusion_criteria": [
+                    {"type": "syndrome", "name": "fever"},
+                    self._elderly,
+                ]
+            },
+        }
+        labeled = engine.label(fake_dataset, definitions, fuse=True)
+        assert labeled["fever_elderly"].sum() == (fake_dataset["age"] >= 65).sum()
+
+
+class TestOSDEngineCodeIndex:
+    _definitions = {
+        "dengue": {
+            "inclusion_criteria": [
+                {"type": "diagnosis", "code": {"system": "ICD-10", "code": "A90"}}
+            ]
+        },
+        "respiratory": {
+            "inclusion_criteria": [
+                {
+                    "type": "criterion",
+                    "logical_operator": "OR",
+                    "values": [
+                        {"type": "diagnosis", "code": {"code": "J1%"}},
+                        {"type": "diagnosis", "code": {"code": "J20"}},
+                    ],
+                }
+            ]
+        },
+    }
+
+    @pytest.fixture
+    def indexed_engine(self, profile):
+        return OSDEngine(profile, code_index=True)
+
+    def test_add_code_index_strips_and_categorizes(self, engine):
+        df = pl.DataFrame({"icd_code": [" A90 ", "J10"]})
+        indexed = engine.add_code_index(df)
+        index = indexed[code_index_name("icd_code")]
+        assert index.dtype == pl.Categorical
+        assert index.cast(pl.String).to_list() == ["A90", "J10"]
+
+    def test_add_code_index_upper_cases_icd_systems(self):
+        engine = OSDEngine([ColumnSpec("icd_code", "diagnosis", system="ICD-10")])
+        df = pl.DataFrame({"icd_code": ["a90.1 "]})
+        index = engine.add_code_index(df)[code_index_name("icd_code")]
+        assert index.cast(pl.String).to_list() == ["A90.1"]
+
+    def test_add_code_index_keeps_existing_index(self, engine, fake_dataset):
+        indexed = engine.add_code_index(fake_dataset)
+        assert engine.add_code_index(indexed).equals(indexed)
+
+    def test_label_matches_unindexed_engine(self, fake_dataset, engine, indexed_engine):
+        expected = engine.label(fake_dataset, self._definitions)
+        assert indexed_engine.label(fake_dataset, self._definitions).equals(expected)
+        fused = indexed_engine.label(fake_dataset, self._definitions, fuse=True)
+        assert fused.equals(expected)
+
+    def test_filter_matches_unindexed_engine(
+        self, fake_dataset, engine, indexed_engine
+    ):
+        for definition in self._definitions.values():
+            expected = engine.filter(fake_dataset, definition)
+            indexed = indexed_engine.filter(fake_dataset.lazy(), definition)
+            assert collect(indexed).equals(expected)
+
+    def test_code_predicates_read_from_index(self, fake_dataset, engine):
+        indexed = engine.add_code_index(fake_dataset)
+        compiled = engine.compile(self._definitions["dengue"], dict(indexed.schema))
+        assert set(compiled.predicate.meta.root_names()) == {
+            code_index_name("icd_code")
+        }
+        labeled = engine.label(indexed, self._definitions)
+        assert labeled["dengue"].sum() == 52
+
+
+class TestDictionaryEvaluation:
+    @pytest.fixture
+    def engine(self, profile):
+        return OSDEngine(profile, dictionary_max_values=50_000)
+
+    def test_match_dictionary_equals_row_wise_match(self):
+        df = pl.DataFrame({"location": ["Bonn", "Berlin", None, "Bonn", "Köln"] * 3})
+        predicate = lambda values: values.str.contains("^B")  # noqa: E731
+        expected = df.select(predicate(pl.col("location")))
+        for frame in (df, df.lazy()):
+            result = frame.select(_match_dictionary(pl.col("location"), predicate))
+            assert collect(result).equals(expected)
+
+    def test_match_dictionary_supports_categorical_columns(self):
+        df = pl.DataFrame({"location": ["Bonn", "Berlin", "Bonn"]})
+        df = df.with_columns(pl.col("location").cast(pl.Categorical))
+        expr = _match_dictionary(pl.col("location"), lambda v: v.str.contains("^Bo"))
+        assert df.select(expr).to_series().to_list() == [True, False, True]
+
+    def test_low_cardinality_columns_are_selected(self, fake_dataset, engine):
+        assert engine.dictionary_columns(fake_dataset) == {
+            "icd_code",
+            "sex",
+            "location",
+        }
+
+    def test_max_values_controls_selection(self, fake_dataset, profile):
+        engine = OSDEngine(profile, dictionary_max_values=10)
+        assert engine.dictionary_columns(fake_dataset) == {"icd_code", "sex"}
+
+    def test_disabled_by_default(self, fake_dataset, profile):
+        assert OSDEngine(profile).dictionary_columns(fake_dataset) == frozenset()
+
+    def test_lazy_frames_are_sampled(self, fake_dataset, engine):
+        lazy = fake_dataset.lazy().with_columns(pl.col("sex").cast(pl.Categorical))
+        assert engine.dictionary_columns(lazy) == {"icd_code", "sex", "location"}
+
+    def test_thousand_codes_over_many_rows_are_selected(self, profile, tmp_path):
+        rows = 200_000
+        df = pl.DataFrame({"n": pl.int_range(rows, eager=True)}).select(
+            icd_code=pl.format("A{}", pl.col("n").hash(seed=1) % 1_000),
+            location=pl.col("n").cast(pl.String),
+            sex=pl.when(pl.col("n") % 2 == 0).then(pl.lit("M")).otherwise(pl.lit("F")),
+        )
+        df.write_parquet(tmp_path / "cases.parquet")
+        engine = OSDEngine(profile, dictionary_max_values=50_000)
+
+        for frame in (df, pl.scan_parquet(tmp_path / "cases.parquet")):
+            assert engine.dictionary_columns(frame) == {"icd_code", "sex"}
+
+    def test_compiled_text_criterion_runs_on_distinct_values(
+        self, fake_dataset, engine
+    ):
+        definition = {
+            "inclusion_criteria": [
+                {"type": "epidemiological_history", "name": "Frankfurt"}
+            ]
+        }
+        schema = dict(fake_dataset.schema)
+        compiled = engine.compile(
+            definition, schema, dictionary_columns=frozenset({"location"})
+        )
+        assert "unique" in str(compiled.predicate)
+        assert fake_dataset.filter(compiled.predicate).height == 33
+
+    def test_results_match_row_wise_evaluation(self, fake_dataset, profile):
+        definitions = {
+            "dengue_frankfurt": {
+                "inclusion_criteria": [
+                    {"type": "diagnosis", "code": {"code": "A9%"}},
+                    {"type": "epidemiological_history", "name": "Frank"},
+                    {
+                        "type": "demographic_criteria",
+                        "attribute": "sex",
+                        "operator": "regex",
+                        "regex_pattern": "^[MF]$",
+                    },
+                ]
+            }
+        }
+        row_wise = OSDEngine(profile)
+        dictionary = OSDEngine(profile, dictionary_max_values=1_000)
+        assert dictionary.dictionary_columns(fake_dataset) == {
+            "icd_code",
+            "sex",
+            "location",
+        }
+        assert dictionary.label(fake_dataset, definitions).equals(
+            row_wise.label(fake_dataset, definitions)
+        )
+
+
+class TestOSDEngineExplain:
+    @pytest.fixture
+    def definition(self):
+        return {
+            "title": "Dengue",
+            "inclusion_criteria": [
+                {
+                    "type": "criterion",
+                    "logical_operator": "OR",
+                    "values": [
+                        {
+                            "type": "diagnosis",
+                            "name": "Dengue",
+                            "code": {"system": "ICD-10", "code": "A90"},
+                        },
+                        {"type": "diagnosis", "code": {"code": "J1%"}},
+                    ],
+                },
+                {"type": "symptom", "name": "fever"},
+            ],
+            "exclusion_criteria": [
+                {"type": "epidemiological_history", "name": "Frankfurt"}
+            ],
+        }
+
+    def test_reports_every_node(self, fake_dataset, engine, definition):
+        explanation = engine.explain(fake_dataset, definition)
+        assert isinstance(explanation, Explanation)
+        assert explanation.total_rows == 500
+        nodes = {node.path: node for _, node in explanation.root.walk()}
+        assert list(nodes) == [
+            "$",
+            "inclusion_criteria",
+            "inclusion_criteria[0]",
+            "inclusion_criteria[0].values[0]",
+            "inclusion_criteria[0].values[1]",
+            "inclusion_criteria[1]",
+            "exclusion_criteria",
+            "exclusion_criteria[0]",
+        ]
+        assert nodes["inclusion_criteria[0].values[0]"].rows == 52
+        assert nodes["inclusion_criteria[0].values[0]"].selectivity == 52 / 500
+        assert nodes["inclusion_criteria[0].values[0]"].name == "Dengue (ICD-10 A90)"
+        assert nodes["inclusion_criteria[0].values[1]"].rows == 38
+        assert nodes["inclusion_criteria[0]"].rows == 90
+        assert nodes["inclusion_criteria[0]"].name == "OR of 2"
+        assert nodes["exclusion_criteria[0]"].rows == 33
+        assert all(n.seconds >= 0 for n in nodes.values() if n.rows is not None)
+
+    def test_root_matches_filter(self, fake_dataset, engine, definition):
+        explanation = engine.explain(fake_dataset, definition)
+        filtered = OSDEngine(engine.columns, skip_unresolvable=True).filter(
+            fake_dataset, definition
+        )
+        assert explanation.root.rows == filtered.height
+
+    def test_unresolvable_criteria_are_reported(self, fake_dataset, engine, definition):
+        explanation = engine.explain(fake_dataset, definition)
+        symptom = explanation.root.children[0].children[1]
+        assert symptom.rows is None
+        assert symptom.error == "No column mapped to concept 'symptom'."
+
+    def test_group_with_an_unresolvable_child(self, fake_dataset, engine):
+        definition = {
+            "inclusion_criteria": [
+                {
+                    "type": "criterion",
+                    "logical_operator": "AND",
+                    "values": [
+                        {
+                            "type": "criterion",
+                            "logical_operator": "OR",
+                            "values": [
+                                {"type": "diagnosis", "code": {"code": "J1%"}},
+                                {"type": "symptom", "name": "cough"},
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+        explanation = engine.explain(fake_dataset, definition)
+        nodes = {node.path: node for _, node in explanation.root.walk()}
+        symptom = nodes["inclusion_criteria[0].values[0].values[1]"]
+        assert symptom.error == "No column mapped to concept 'symptom'."
+        for path in [
+            "$",
+            "inclusion_criteria",
+            "inclusion_criteria[0]",
+            "inclusion_criteria[0].values[0]",
+        ]:
+            assert nodes[path].error is None
+            assert nodes[path].rows == 38
+
+    def test_group_without_any_resolvable_child(self, fake_dataset, engine):
+        definition = {
+            "inclusion_criteria": [
+                {"type": "diagnosis", "code": {"code": "J1%"}},
+                {
+                    "type": "criterion",
+                    "logical_operator": "OR",
+                    "values": [{"type": "symptom", "name": "cough"}],
+                },
+            ]
+        }
+        explanation = engine.explain(fake_dataset, definition)
+        group = explanation.root.children[0].children[1]
+        assert group.rows is None
+        assert group.error is not None
+        assert explanation.root.rows == 38
+
+    def test_lazy_frame(self, fake_dataset, engine, definition):
+        eager = engine.explain(fake_dataset, definition).to_frame()
+        lazy = engine.explain(fake_dataset.lazy(), definition).to_frame()
+        assert lazy.drop("seconds").equals(eager.drop("seconds"))
+
+    def test_outputs(self, fake_dataset, engine, definition):
+        explanation = engine.explain(fake_dataset, definition)
+        frame = explanation.to_frame()
+        assert frame.columns == [
+            "depth",
+            "path",
+            "type",
+            "name",
+            "rows",
+            "selectivity",
+            "seconds",
+            "error",
+        ]
+        assert frame.height == 8
+        parsed = json.loads(explanation.to_json())
+        assert parsed["root"]["children"][0]["path"] == "inclusion_criteria"
+        table = str(explanation)
+        assert "diagnosis: Dengue (ICD-10 A90)  [inclusion_criteria[0].values[0]]" in (
+            table
+        )
+        assert "(skipped: No column mapped to concept 'symptom'.)" in table
+
+
+class TestShortCircuitFilter:
+    @pytest.fixture
+    def definition(self):
+        return {
+            "inclusion_criteria": [
+                {"type": "epidemiological_history", "regex_pattern": "^Fr.*t$"},
+                {
+                    "type": "criterion",
+                    "logical_operator": "AND",
+                    "values": [
+                        {"type": "diagnosis", "code": {"code": "A9%"}},
+                        {
+                            "type": "demographic_criteria",
+                            "attribute": "age",
+                            "operator": ">=",
+                            "value": 90,
+                        },
+                    ],
+                },
+            ],
+            "exclusion_criteria": [
+                {
+                    "type": "demographic_criteria",
+                    "attribute": "sex",
+                    "operator": "==",
+                    "value": "male",
+                }
+            ],
+        }
+
+    def test_top_level_and_groups_are_flattened(self, fake_dataset, engine, definition):
+        compiled = engine.compile(definition, dict(fake_dataset.schema))
+        assert len(compiled.conjuncts) == 3
+        assert len(compiled.stages) == 4
+
+    @pytest.mark.parametrize("lazy", [False, True])
+    def test_same_rows_as_single_predicate(
+        self, fake_dataset, profile, definition, lazy
+    ):
+        frame = fake_dataset.lazy() if lazy else fake_dataset
+        expected = collect(OSDEngine(profile).filter(frame, definition))
+        staged = collect(
+            OSDEngine(profile, short_circuit=True).filter(frame, definition)
+        )
+        assert staged.equals(expected)
+
+    def test_filters_are_kept_apart_in_lazy_plan(
+        self, fake_dataset, profile, definition
+    ):
+        engine = OSDEngine(profile, short_circuit=True)
+        plan = engine.filter(fake_dataset.lazy(), definition).explain()
+        assert plan.count("FILTER") == 4
+
+    def test_cheapest_most_selective_filter_runs_first(
+        self, fake_dataset, profile, mocker
+    ):
+        engine = OSDEngine(profile, short_circuit=True)
+        definition = {
+            "inclusion_criteria": [
+                {"type": "epidemiological_history", "regex_pattern": "(?i)^.*r.*$"},
+                {
+                    "type": "demographic_criteria",
+                    "attribute": "age",
+                    "operator": ">=",
+                    "value": 95,
+                },
+            ]
+        }
+        order_stages = mocker.spy(engine, "_order_stages")
+        engine.filter(fake_dataset.lazy(), definition)
+
+        regex, age = engine.compile(definition, dict(fake_dataset.schema)).stages
+        first, last = order_stages.spy_return
+        assert first.meta.eq(age)
+        assert last.meta.eq(regex)
+
+    def test_estimates_are_cached_per_dataset(self, fake_dataset, engine):
+        exprs = [pl.col("age") >= 50, pl.col("sex") == "M"]
+        estimates = engine.estimate_selectivity(fake_dataset, exprs)
+        assert all(isinstance(e, SelectivityEstimate) for e in estimates)
+        assert estimates[0].selectivity == pytest.approx(
+            fake_dataset.filter(exprs[0]).height / 500
+        )
+        assert engine.estimate_selectivity(fake_dataset, exprs) == estimates
+        other = engine.estimate_selectivity(fake_dataset.head(100), exprs)
+        assert other[0].selectivity == pytest.approx(
+            fake_dataset.head(100).filter(exprs[0]).height / 100
+        )
+        engine.cache_clear()
+        assert not engine._estimates
+
+    def test_rank_orders_by_cost_per_discarded_row(self):
+        cheap = SelectivityEstimate(selectivity=0.5, seconds=1.0)
+        selective = SelectivityEstimate(selectivity=0.01, seconds=1.5)
+        assert selective.rank < cheap.rank
+        assert SelectivityEstimate(selectivity=1.0, seconds=0.1).rank > cheap.rank
@@ -0,0 +1,186 @@
+import json
+import shutil
+
+import polars as pl
+import pytest
+
+from opensyndrome.filter import ColumnSpec, OSDEngine
+from opensyndrome.incremental import (
+    IncrementalState,
+    default_state_path,
+    label_incremental,
+)
+
+DENGUE = {
+    "version": "1.0.0",
+    "inclusion_criteria": [
+        {"type": "diagnosis", "code": {"system": "ICD-10", "code": "A90"}}
+    ],
+}
+
+
+@pytest.fixture
+def engine():
+    return OSDEngine([ColumnSpec("icd_code", concept="diagnosis")])
+
+
+@pytest.fixture
+def feed():
+    """Fixture dataset with a parsed timestamp, ordered as it was recorded."""
+    return (
+        pl.read_csv("tests/fixtures/fake_dataset.csv")
+        .with_columns(pl.col("recording_ts").str.to_datetime())
+        .sort("recording_ts")
+    )
+
+
+@pytest.fixture
+def output(tmp_path):
+    return tmp_path / "labels"
+
+
+def run(engine, frame, output, definitions=None):
+    return label_incremental(
+        engine,
+        frame.lazy(),
+        definitions or {"dengue": DENGUE},
+        output,
+        watermark_column="recording_ts",
+    )
+
+
+class TestLabelIncremental:
+    def test_first_run_labels_everything(self, engine, feed, output):
+        result = run(engine, feed.head(366), output)
+        assert result.refreshed
+        assert result.reason == "no previous state"
+        assert result.rows == 366
+        assert result.watermark == feed["recording_ts"][365]
+        assert pl.read_parquet(output).height == 366
+
+    def test_appends_only_new_rows(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        result = run(engine, feed, output)
+        assert not result.refreshed
+        assert result.rows == 134
+        assert result.watermark == feed["recording_ts"].max()
+
+        labelled = pl.read_parquet(output)
+        assert labelled.height == 500
+        assert labelled["dengue"].sum() == 52
+        assert labelled["recording_ts"].is_unique().all()
+
+    def test_each_run_writes_its_own_part(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        first = (output / "part-00000.parquet").stat().st_mtime_ns
+        run(engine, feed, output)
+
+        assert sorted(path.name for path in output.iterdir()) == [
+            "part-00000.parquet",
+            "part-00001.parquet",
+        ]
+        assert (output / "part-00000.parquet").stat().st_mtime_ns == first
+        assert pl.read_parquet(output / "part-00001.parquet").height == 134
+
+    def test_no_new_rows(self, engine, feed, output):
+        run(engine, feed, output)
+        result = run(engine, feed, output)
+        assert result.rows == 0
+        assert result.watermark == feed["recording_ts"].max()
+        assert [path.name for path in output.iterdir()] == ["part-00000.parquet"]
+
+    def test_rows_appended_while_labelling_are_left_to_next_run(
+        self, engine, tmp_path, output, mocker
+    ):
+        source = tmp_path / "feed.csv"
+        feed = pl.read_csv("tests/fixtures/fake_dataset.csv").sort("recording_ts")
+        feed.head(366).write_csv(source)
+        label = engine.label
+
+        def append_then_label(frame, *args, **kwargs):
+            feed.write_csv(source)
+            return label(frame, *args, **kwargs)
+
+        mocker.patch.object(engine, "label", side_effect=append_then_label)
+        first = run(engine, pl.scan_csv(source), output)
+        mocker.stopall()
+        second = run(engine, pl.scan_csv(source), output)
+
+        assert (first.rows, second.rows) == (366, 134)
+        assert pl.read_parquet(output)["recording_ts"].is_unique().all()
+
+    def test_parts_of_interrupted_runs_are_removed(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        # written by a run interrupted before saving its state
+        shutil.copy(output / "part-00000.parquet", output / "part-00001.parquet")
+        result = run(engine, feed, output)
+
+        assert not result.refreshed
+        assert sorted(path.name for path in output.iterdir()) == [
+            "part-00000.parquet",
+            "part-00002.parquet",
+        ]
+        assert pl.read_parquet(output).height == 500
+
+    def test_single_file_output_is_replaced(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        shutil.rmtree(output)
+        feed.write_parquet(output)
+        result = run(engine, feed, output)
+
+        assert result.reason == f"{output} is not a directory of part files"
+        assert pl.read_parquet(output).height == 500
+
+    def test_definition_change_relabels_everything(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        changed = {**DENGUE, "version": "1.1.0"}
+        result = run(engine, feed, output, {"dengue": changed})
+        assert result.refreshed
+        assert result.reason == "definitions changed: dengue"
+        assert result.rows == 500
+        assert pl.read_parquet(output).height == 500
+
+    def test_added_definition_relabels_everything(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        result = run(engine, feed, output, {"dengue": DENGUE, "other": DENGUE})
+        assert result.refreshed
+        assert pl.read_parquet(output).columns[-2:] == ["dengue", "other"]
+
+    def test_missing_output_relabels_everything(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        (output / "part-00000.parquet").unlink()
+        result = run(engine, feed, output)
+        assert result.reason == f"{output / 'part-00000.parquet'} does not exist"
+        assert pl.read_parquet(output).height == 500
+
+    def test_refresh_replaces_previous_parts(self, engine, feed, output):
+        run(engine, feed.head(366), output)
+        run(engine, feed, output)
+        run(engine, feed, output, {"dengue": {**DENGUE, "version": "2.0.0"}})
+        assert [path.name for path in output.iterdir()] == ["part-00002.parquet"]
+        assert pl.read_parquet(output).height == 500
+
+    def test_string_watermark(self, engine, output):
+        feed = pl.scan_csv("tests/fixtures/fake_dataset.csv")
+        run(engine, feed.filter(pl.col("recording_ts") < "2025"), output)
+        result = run(engine, feed, output)
+        assert result.rows == 134
+        assert pl.read_parquet(output).height == 500
+
+
+class TestIncrementalState:
+    def test_state_is_saved_next_to_output(self, engine, feed, output):
+        run(engine, feed, output)
+        state = json.loads(default_state_path(output).read_text())
+        assert state["watermark_column"] == "recording_ts"
+        assert state["watermark"] == str(feed["recording_ts"].max())
+        assert state["definitions"]["dengue"]["version"] == "1.0.0"
+        assert state["parts"] == ["part-00000.parquet"]
+
+    def test_round_trip(self, tmp_path):
+        state = IncrementalState("ts", "2025-01-01", "abc", {"a": {"hash": "x"}})
+        state.save(tmp_path / "state.json")
+        assert IncrementalState.load(tmp_path / "state.json") == state
+
+    def test_load_missing(self, tmp_path):
+        assert IncrementalState.load(tmp_path / "state.json") is None
@@ -0,0 +1,284 @@
+import json
+import os
+
+import jsonschema
+import pytest
+
+from opensyndrome.bundle import BundledDefinition, write_bundle
+from opensyndrome.validators import (
+    BACKENDS,
+    ValidationIssue,
+    ValidationResult,
+    find_definitions,
+    get_validator,
+    validate_machine_readable_format,
+    validate_files,
+    validate_many,
+)
+
+SCHEMA = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "type": "object",
+    "required": ["title", "inclusion_criteria"],
+    "properties": {
+        "title": {"type": "string"},
+        "inclusion_criteria": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["type"],
+                "properties": {"type": {"enum": ["diagnosis", "symptom"]}},
+            },
+        },
+    },
+}
+VALID = {"title": "Dengue", "inclusion_criteria": [{"type": "diagnosis"}]}
+
+
+@pytest.fixture
+def schema_file(tmp_path):
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps(SCHEMA))
+    return path
+
+
+class TestGetValidator:
+    def test_validator_is_built_once(self, schema_file, mocker):
+        check_schema = mocker.spy(jsonschema.Draft202012Validator, "check_schema")
+
+        validator = get_validator(schema_file)
+
+        assert isinstance(validator, jsonschema.Draft202012Validator)
+        assert get_validator(str(schema_file)) is validator
+        assert check_schema.call_count == 1
+
+    def test_validator_is_rebuilt_when_schema_changes(self, schema_file):
+        validator = get_validator(schema_file)
+        schema_file.write_text(json.dumps({**SCHEMA, "required": ["title"]}))
+        stat = schema_file.stat()
+        os.utime(schema_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        assert get_validator(schema_file) is not validator
+        validate_machine_readable_format({"title": "Dengue"}, schema_file)
+
+    def test_invalid_schema(self, tmp_path):
+        path = tmp_path / "schema.json"
+        path.write_text(json.dumps({"type": 12}))
+
+        with pytest.raises(jsonschema.exceptions.SchemaError):
+            get_validator(path)
+
+
+class TestValidateMachineReadableFormat:
+    def test_valid_definition(self, schema_file, tmp_path):
+        definition_file = tmp_path / "dengue.json"
+        definition_file.write_text(json.dumps(VALID))
+
+        validate_machine_readable_format(VALID, schema_file)
+        validate_machine_readable_format(str(definition_file), schema_file)
+        validate_machine_readable_format(json.dumps(VALID), schema_file)
+
+    def test_raises_most_relevant_error(self, schema_file):
+        with pytest.raises(jsonschema.exceptions.ValidationError, match="'title'"):
+            validate_machine_readable_format({"inclusion_criteria": []}, schema_file)
+
+
+class TestValidateMany:
+    def test_reports_every_error_of_every_definition(self, schema_file, tmp_path):
+        valid_file = tmp_path / "valid.json"
+        valid_file.write_text(json.dumps(VALID))
+        broken_file = tmp_path / "broken.json"
+        broken_file.write_text("{")
+        invalid = {"inclusion_criteria": [{"type": "lab"}, {}]}
+
+        valid, broken, missing, invalid = validate_many(
+            [valid_file, broken_file, tmp_path / "missing.json", invalid],
+            schema_file,
+        )
+
+        assert valid == ValidationResult(str(valid_file), ())
+        assert valid.valid
+        assert broken.source == str(broken_file)
+        assert [error.validator for error in broken.errors] == ["json"]
+        assert not missing.valid
+        assert invalid.source == "#3"
+        assert sorted(invalid.errors, key=lambda error: error.path) == [
+            ValidationIssue("'title' is a required property", "$", "required"),
+            ValidationIssue(
+                "'lab' is not one of ['diagnosis', 'symptom']",
+                "$.inclusion_criteria[0].type",
+                "enum",
+            ),
+            ValidationIssue(
+                "'type' is a required property", "$.inclusion_criteria[1]", "required"
+            ),
+        ]
+
+    def test_bundle_yields_one_result_per_definition(self, schema_file, tmp_path):
+        bundle = tmp_path / "defs.ndjson"
+        write_bundle(
+            [
+                BundledDefinition("dengue", "br/dengue.json", VALID),
+                BundledDefinition("zika", "zika.json", {"title": 1}),
+            ],
+            bundle,
+        )
+        with bundle.open("a") as lines:
+            lines.write("{\n")
+
+        results = list(validate_many([bundle, VALID], schema_file))
+
+        assert [(result.source, result.valid) for result in results] == [
+            (f"{bundle}#br/dengue.json", True),
+            (f"{bundle}#zika.json", False),
+            (str(bundle), False),
+            ("#1", True),
+        ]
+        assert "defs.ndjson:3: invalid bundle line" in results[2].errors[0].message
+
+    def test_is_lazy(self, schema_file):
+        results = validate_many(iter([VALID, {}]), schema_file)
+
+        assert next(results).valid
+        assert not next(results).valid
+
+
+class TestFindDefinitions:
+    def test_expands_directories_and_globs(self, tmp_path):
+        for name in [
+            "a/b/dengue.json",
+            "a/zika.json",
+            "a/notes.txt",
+            "c/flu.json",
+            "c/all.ndjson",
+        ]:
+            (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / name).write_text("{}")
+        explicit = tmp_path / "a" / "notes.txt"
+
+        found = find_definitions(
+            [tmp_path / "a", f"{tmp_path}/c/*", explicit, tmp_path / "a/zika.json"]
+        )
+
+        assert found == [
+            tmp_path / "a" / "b" / "dengue.json",
+            tmp_path / "a" / "zika.json",
+            tmp_path / "c" / "all.ndjson",
+            tmp_path / "c" / "flu.json",
+            explicit,
+        ]
+
+    def test_nothing_found(self, tmp_path):
+        assert find_definitions([tmp_path, f"{tmp_path}/*.json"]) == []
+
+
+class TestValidateFiles:
+    @pytest.fixture
+    def files(self, tmp_path):
+        files = []
+        for n in range(150):
+            path = tmp_path / f"{n:03}.json"
+            path.write_text(json.dumps(VALID if n % 50 else {"title": n}))
+            files.append(path)
+        return files
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_results_are_in_order(self, files, schema_file, workers):
+        results = list(validate_files(files, schema_file, workers=workers))
+
+        assert [result.source for result in results] == list(map(str, files))
+        assert [n for n, result in enumerate(results) if not result.valid] == [
+            0,
+            50,
+            100,
+        ]
+        assert results[0].errors == (
+            ValidationIssue(
+                "'inclusion_criteria' is a required property", "$", "required"
+            ),
+            ValidationIssue("0 is not of type 'string'", "$.title", "type"),
+        )
+
+    def test_invalid_schema_is_raised_first(self, files, tmp_path):
+        path = tmp_path / "schema.json"
+        path.write_text(json.dumps({"type": 12}))
+
+        with pytest.raises(jsonschema.exceptions.SchemaError):
+            next(validate_files(files, path, workers=2))
+
+
+DEFINITION = {
+    "title": "Dengue",
+    "scope": "specific",
+    "version": "1.0.0",
+    "open_syndrome_version": "1.0.0",
+    "published_in": "https://example.org",
+    "published_at": "2025-01-01",
+    "location": "Brazil",
+    "language": "en",
+    "organization": "OSD",
+    "references": [{"url": "https://example.org"}],
+    "inclusion_criteria": [
+        {
+            "type": "criterion",
+            "name": "fever and rash",
+            "logical_operator": "AND",
+            "values": [
+                {"type": "symptom", "name": "fever"},
+                {"type": "symptom", "name": "rash"},
+            ],
+        }
+    ],
+}
+
+
+class TestPydanticBackend:
+    def test_valid_definition_with_nested_criteria(self, tmp_path):
+        path = tmp_path / "dengue.json"
+        path.write_text(json.dumps(DEFINITION))
+
+        results = list(validate_many([path, DEFINITION], backend="pydantic"))
+
+        assert [result.valid for result in results] == [True, True]
+
+    def test_reports_errors_at_their_path_in_the_definition(self):
+        criterion = DEFINITION["inclusion_criteria"][0]
+        definition = {
+            **DEFINITION,
+            "scope": "narrow",
+            "inclusion_criteria": [
+                {**criterion, "values": [{"type": "symptom"}, *criterion["values"]]}
+            ],
+        }
+        del definition["title"]
+
+        (result,) = validate_many([definition], backend="pydantic")
+
+        assert [(error.path, error.validator) for error in result.errors] == [
+            ("$.title", "missing"),
+            ("$.scope", "enum"),
+            # once per member of the union of criteria
+            ("$.inclusion_criteria[0].values[0].name", "missing"),
+            ("$.inclusion_criteria[0].values[0].values", "missing"),
+        ]
+
+    def test_invalid_json(self, tmp_path):
+        path = tmp_path / "broken.json"
+        path.write_text("{")
+
+        (result,) = validate_many([path], backend="pydantic")
+
+        assert [error.validator for error in result.errors] == ["json"]
+
+    def test_does_not_need_a_schema(self, tmp_path, mocker):
+        get_schema = mocker.patch("opensyndrome.validators.get_schema_filepath")
+        path = tmp_path / "dengue.json"
+        path.write_text(json.dumps(DEFINITION))
+
+        assert next(validate_files([path], backend="pydantic")).valid
+        assert not get_schema.called
+
+    def test_unknown_backend(self):
+        assert BACKENDS == ("jsonschema", "pydantic")
+        with pytest.raises(ValueError, match="Unknown validation backend"):
+            list(validate_many([DEFINITION], backend="fastjsonschema"))